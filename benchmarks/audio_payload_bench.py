@@ -0,0 +1,95 @@
+# Micro-benchmark of AudioPayloadPreparer against the previous pydub implementation.
+# Run from the project root: python benchmarks/audio_payload_bench.py
+
+import os
+import sys
+import base64
+import tempfile
+import timeit
+import wave
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import make_chunks
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tts.stream_audio import AudioPayloadPreparer
+
+
+class LegacyAudioPayloadPreparer:
+    """The previous implementation: pydub chunks, .rms per chunk and a wav export."""
+
+    def __init__(self, chunk_length_ms: int = 20):
+        self.chunk_length_ms = chunk_length_ms
+
+    def prepare_audio_payload(self, audio_path, display_text=None, expression_list=None):
+        audio = AudioSegment.from_file(audio_path)
+        audio_bytes = audio.export(format="wav").read()
+        audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
+        volumes = [chunk.rms for chunk in make_chunks(audio, self.chunk_length_ms)]
+        max_volume = max(volumes)
+        volumes = [volume / max_volume for volume in volumes]
+        payload = {
+            "type": "audio",
+            "audio": audio_base64,
+            "volumes": volumes,
+            "slice_length": self.chunk_length_ms,
+            "text": display_text,
+            "expressions": expression_list,
+        }
+        return payload, audio.duration_seconds
+
+
+def make_sentence_wav(path: str, seconds: float, sample_rate: int = 24000) -> None:
+    """Write a wav that sounds roughly like a spoken sentence (a modulated tone)."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    audio = (np.sin(2 * np.pi * 220 * t) * envelope * 20000).astype("<i2")
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(audio.tobytes())
+
+
+exec_round = 20
+legacy = LegacyAudioPayloadPreparer()
+preparer = AudioPayloadPreparer()
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for seconds in (2, 8, 30):
+        path = os.path.join(tmp_dir, f"sentence-{seconds}s.wav")
+        make_sentence_wav(path, seconds)
+
+        legacy_payload, _ = legacy.prepare_audio_payload(path)
+        new_payload, _ = preparer.prepare_audio_payload(path)
+        max_diff = np.max(
+            np.abs(np.array(legacy_payload["volumes"]) - np.array(new_payload["volumes"]))
+        )
+
+        result_legacy = timeit.timeit(
+            lambda: legacy.prepare_audio_payload(path), number=exec_round
+        )
+        result_new = timeit.timeit(
+            lambda: preparer.prepare_audio_payload(path), number=exec_round
+        )
+        result_stream = timeit.timeit(
+            lambda: list(preparer.stream_audio_payload(path)), number=exec_round
+        )
+
+        stream_bytes = sum(
+            len(message)
+            for message in preparer.stream_audio_payload(path)
+            if isinstance(message, bytes)
+        )
+
+        print(f"\n =======  {seconds}s sentence =======")
+        print(f"Legacy pydub:   Avg: {result_legacy / exec_round * 1000:.2f}ms")
+        print(f"NumPy:          Avg: {result_new / exec_round * 1000:.2f}ms")
+        print(f"NumPy stream:   Avg: {result_stream / exec_round * 1000:.2f}ms")
+        print(f"Max volume difference: {max_diff:.4f}")
+        print(
+            f"Wire size: base64 json {len(legacy_payload['audio']) + len(str(legacy_payload['volumes']))} bytes, "
+            f"new json {len(new_payload['audio']) + len(str(new_payload['volumes']))} bytes, "
+            f"binary stream {stream_bytes} bytes"
+        )
@@ -0,0 +1,111 @@
+# Benchmark of the RAG ingestion embedding: one request per chunk (the previous loop) against batched, concurrent requests.
+# It runs offline against a local stand-in for the Ollama embedding API, which simulates the cost of a request
+# (a fixed overhead plus a cost per text, with a limited number of requests served in parallel, like a GPU would).
+# Run from the project root: python benchmarks/embedding_ingest_bench.py
+
+import os
+import sys
+import json
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.embedder import OllamaEmbedder
+
+REQUEST_OVERHEAD = 0.004  # seconds per request
+PER_TEXT_COST = 0.0005  # seconds per embedded text
+SERVER_PARALLELISM = 4  # requests the stand-in serves at the same time
+DIMENSIONS = 768
+
+
+def fake_embedding(text: str):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    return np.random.default_rng(seed).standard_normal(DIMENSIONS).round(5).tolist()
+
+
+class StandInOllama(BaseHTTPRequestHandler):
+    slots = threading.Semaphore(SERVER_PARALLELISM)
+    requests_served = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/api/embed":
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        elif self.path == "/api/embeddings":
+            texts = [body["prompt"]]
+        else:
+            self.send_error(404)
+            return
+        with self.slots:
+            time.sleep(REQUEST_OVERHEAD + PER_TEXT_COST * len(texts))
+            StandInOllama.requests_served += 1
+        embeddings = [fake_embedding(text) for text in texts]
+        if self.path == "/api/embed":
+            response = {"model": body["model"], "embeddings": embeddings}
+        else:
+            response = {"embedding": embeddings[0]}
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def legacy_embed(base_url: str, texts):
+    """The previous ingestion loop: one /api/embeddings request per chunk, in a row."""
+    import requests
+
+    session = requests.Session()
+    embeddings = []
+    for text in texts:
+        response = session.post(
+            f"{base_url}/api/embeddings", json={"model": "bench", "prompt": text}
+        )
+        embeddings.append(response.json()["embedding"])
+    return embeddings
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StandInOllama)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+for n_chunks in (100, 1000):
+    texts = [f"chunk {i}: " + "lorem ipsum " * 80 for i in range(n_chunks)]
+    print(f"\n =======  {n_chunks} chunks =======")
+
+    StandInOllama.requests_served = 0
+    start = time.time()
+    expected = legacy_embed(base_url, texts)
+    elapsed = time.time() - start
+    print(
+        f"One per request:        {elapsed:.2f}s ({n_chunks / elapsed:.0f} chunks/s, "
+        f"{StandInOllama.requests_served} requests)"
+    )
+
+    for batch_size, concurrency in ((32, 1), (16, 4), (32, 4), (64, 8)):
+        embedder = OllamaEmbedder(
+            model="bench",
+            base_url=base_url,
+            batch_size=batch_size,
+            concurrency=concurrency,
+            on_progress=lambda done, total, seconds: None,
+        )
+        StandInOllama.requests_served = 0
+        start = time.time()
+        embeddings = embedder.embed_documents(texts)
+        elapsed = time.time() - start
+        assert embeddings == expected, "embeddings out of order"
+        print(
+            f"Batch {batch_size:>3}, {concurrency} in flight: {elapsed:.2f}s ({n_chunks / elapsed:.0f} chunks/s, "
+            f"{StandInOllama.requests_served} requests)"
+        )
+
+server.shutdown()
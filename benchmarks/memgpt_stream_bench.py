@@ -0,0 +1,97 @@
+# Benchmark of the MemGPT backend: time to the first sentence ready for TTS when the SSE stream is consumed whole
+# (like the previous `chat_iter`) against the streaming `chat_iter`, and a check of what it yields.
+# It runs offline against a local stand-in for the MemGPT messages endpoint, which streams an internal monologue,
+# then the assistant's message in pieces, as server-sent events.
+# Run from the project root: python benchmarks/memgpt_stream_bench.py
+
+import os
+import sys
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm.memGPT import LLM
+from utils.sentence_segmenter import SentenceSegmenter
+
+THINKING_SECONDS = 0.3  # before the first assistant message
+PIECE_SECONDS = 0.05  # between two pieces of the answer
+ANSWER = (
+    "Sure, the shop opens at eight. We close at six on weekdays. "
+    "On weekends we open a little later, at ten. Is there anything else I can help with?"
+)
+PIECES = ANSWER.split(" ")
+TURNS = 5
+
+
+class StandInMemGPT(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        StandInMemGPT.connections += 1
+
+    def _event(self, payload) -> None:
+        data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.path.endswith("/messages") or self.headers.get("authorization") != "Bearer token":
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._event({"internal_monologue": f"The user asked: {body['message']}"})
+        time.sleep(THINKING_SECONDS)
+        self._event({"function_call": "send_message(...)"})
+        for index, piece in enumerate(PIECES):
+            self._event({"assistant_message": piece if index == 0 else " " + piece})
+            time.sleep(PIECE_SECONDS)
+        self._event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def first_sentence_seconds(stream) -> float:
+    """Seconds until the segmenter hands the first sentence to TTS, then drain the stream."""
+    start = time.perf_counter()
+    segmenter = SentenceSegmenter()
+    first = None
+    text = ""
+    for piece in stream:
+        text += piece
+        if first is None and segmenter.feed(piece):
+            first = time.perf_counter() - start
+    if first is None:
+        first = time.perf_counter() - start
+    assert text == ANSWER, text
+    return first
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StandInMemGPT)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+llm = LLM(f"http://127.0.0.1:{server.server_address[1]}", "token", "agent")
+
+
+def whole_response(message: str):
+    # the previous chat_iter: the full response, once the stream is over
+    yield "".join(llm._stream_agent_messages(message))
+
+
+whole = [first_sentence_seconds(whole_response("when do you open?")) for _ in range(TURNS)]
+streamed = [first_sentence_seconds(llm.chat_iter("when do you open?")) for _ in range(TURNS)]
+total = THINKING_SECONDS + PIECE_SECONDS * len(PIECES)
+print(f"stand-in answer: {len(PIECES)} pieces, {total:.2f}s from request to the last piece")
+print(f"whole response (before):  first sentence for TTS after {sum(whole) / TURNS * 1000:7.1f}ms")
+print(f"streamed chat_iter:       first sentence for TTS after {sum(streamed) / TURNS * 1000:7.1f}ms")
+print(f"connections opened for {2 * TURNS} messages: {StandInMemGPT.connections}")
+server.shutdown()
@@ -0,0 +1,100 @@
+# Benchmark of SentenceSegmenter against the previous per-token `is_complete_sentence` check, over long LLM-like transcripts.
+# Run from the project root: python benchmarks/sentence_segmenter_bench.py
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.sentence_segmenter import SentenceSegmenter
+
+
+def legacy_is_complete_sentence(text: str):
+    """The previous check from OpenLLMVTuberMain, called on every streamed token."""
+    white_list = [
+        "...", "Dr.", "Mr.", "Ms.", "Mrs.", "Jr.", "Sr.", "St.", "Ave.", "Rd.", "Blvd.",
+        "Dept.", "Univ.", "Prof.", "Ph.D.", "M.D.", "U.S.", "U.K.", "U.N.", "E.U.",
+        "U.S.A.", "U.K.", "U.S.S.R.", "U.A.E.", "NY.",
+    ]
+    for item in white_list:
+        if text.strip().lower().endswith(item.lower()):
+            return False
+    punctuation_blacklist = [".", "?", "!", "。", "；", "？", "！", "…", "〰", "〜", "～", "！"]
+    return any(text.strip().endswith(punct) for punct in punctuation_blacklist)
+
+
+def legacy_segment(tokens):
+    sentences = []
+    sentence_buffer = ""
+    for token in tokens:
+        sentence_buffer += token
+        if legacy_is_complete_sentence(token):
+            sentences.append(sentence_buffer)
+            sentence_buffer = ""
+    if sentence_buffer:
+        sentences.append(sentence_buffer)
+    return sentences
+
+
+def new_segment(tokens):
+    segmenter = SentenceSegmenter(min_length=4, max_length=300)
+    sentences = []
+    for token in tokens:
+        sentences.extend(segmenter.feed(token))
+    last = segmenter.flush()
+    if last:
+        sentences.append(last)
+    return sentences
+
+
+SAMPLE_SENTENCES = [
+    "[joy] Welcome back to the cafe!",
+    "Dr. Smith said the espresso costs $3.50 in the U.S.A. this year.",
+    "Our hours are 9 a.m. to 5 p.m. on weekdays.",
+    "Hmm... let me think about that for a second.",
+    "Would you like oat milk, almond milk or regular milk?",
+    "The croissants come from St. Mary's bakery on Baker Rd. every morning.",
+    "我們的招牌是抹茶拿鐵。要試試看嗎？",
+    "That's a great choice [smirk], really.",
+    "Version 2.1 of the menu adds three new desserts!",
+]
+
+
+def make_transcript(n_sentences: int, seed: int = 0):
+    """Build a transcript and cut it into LLM-like tokens of 1 to 6 characters."""
+    rng = random.Random(seed)
+    text = " ".join(rng.choice(SAMPLE_SENTENCES) for _ in range(n_sentences))
+    tokens = []
+    index = 0
+    while index < len(text):
+        size = rng.randint(1, 6)
+        tokens.append(text[index : index + size])
+        index += size
+    return text, tokens
+
+
+exec_round = 5
+
+for n_sentences in (100, 1000, 10000):
+    text, tokens = make_transcript(n_sentences)
+
+    result_legacy = timeit.timeit(lambda: legacy_segment(tokens), number=exec_round)
+    result_new = timeit.timeit(lambda: new_segment(tokens), number=exec_round)
+
+    print(f"\n =======  {n_sentences} sentences, {len(text)} chars, {len(tokens)} tokens =======")
+    print(
+        f"Legacy: Avg: {result_legacy / exec_round * 1000:.2f}ms "
+        f"({len(tokens) * exec_round / result_legacy / 1000:.0f}k tokens/s), "
+        f"{len(legacy_segment(tokens))} sentences"
+    )
+    print(
+        f"New:    Avg: {result_new / exec_round * 1000:.2f}ms "
+        f"({len(tokens) * exec_round / result_new / 1000:.0f}k tokens/s), "
+        f"{len(new_segment(tokens))} sentences"
+    )
+
+_, tokens = make_transcript(8, seed=1)
+print("\n =======  Sample split =======")
+print("Legacy:", legacy_segment(tokens))
+print("New:   ", new_segment(tokens))
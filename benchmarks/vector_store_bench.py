@@ -0,0 +1,80 @@
+# Benchmark of the RAG vector stores: NumpyStore (memory-mapped matrix, float32 and float16) against ChromaStore.
+# Measures the time to open an existing index (start-up) and the top-k query latency, at 1k, 10k and 100k chunks.
+# Run from the project root: python benchmarks/vector_store_bench.py [--no-chroma]
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.numpy_store import NumpyStore
+
+DIMENSIONS = 768
+TOP_K = 4
+QUERIES = 50
+
+
+def make_chunks(n_chunks: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n_chunks, DIMENSIONS)).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(n_chunks)]
+    texts = [f"chunk {i} " + "lorem ipsum " * 60 for i in range(n_chunks)]
+    metadatas = [{"source": f"doc-{i % 50}.txt"} for i in range(n_chunks)]
+    return ids, embeddings, texts, metadatas
+
+
+def bench_store(name, open_store, ids, embeddings, texts, metadatas, queries):
+    store = open_store()
+    start = time.perf_counter()
+    store.upsert(ids, embeddings, texts, metadatas)
+    store.persist()
+    build_seconds = time.perf_counter() - start
+    del store
+
+    start = time.perf_counter()
+    store = open_store()
+    open_seconds = time.perf_counter() - start
+
+    store.query(queries[0], TOP_K)  # warm up
+    start = time.perf_counter()
+    results = [store.query(query, TOP_K) for query in queries]
+    query_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(
+        f"{name:<18} build {build_seconds:7.2f}s   open {open_seconds * 1000:8.1f}ms   "
+        f"query {query_ms:7.2f}ms"
+    )
+    return [[chunk.page_content for chunk, _ in result] for result in results]
+
+
+run_chroma = "--no-chroma" not in sys.argv
+if run_chroma:
+    from rag.chroma_store import ChromaStore
+
+for n_chunks in (1000, 10000, 100000):
+    ids, embeddings, texts, metadatas = make_chunks(n_chunks)
+    queries = list(np.random.default_rng(1).standard_normal((QUERIES, DIMENSIONS)))
+    print(f"\n =======  {n_chunks} chunks of {DIMENSIONS} dimensions =======")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        exact = bench_store(
+            "NumPy float32",
+            lambda: NumpyStore(os.path.join(tmp_dir, "f32"), dtype="float32"),
+            ids, embeddings, texts, metadatas, queries,
+        )
+        half = bench_store(
+            "NumPy float16",
+            lambda: NumpyStore(os.path.join(tmp_dir, "f16"), dtype="float16"),
+            ids, embeddings, texts, metadatas, queries,
+        )
+        recall = np.mean([len(set(a) & set(b)) / TOP_K for a, b in zip(exact, half)])
+        print(f"float16 recall@{TOP_K} against float32: {recall:.3f}")
+        if run_chroma:
+            approximate = bench_store(
+                "Chroma (HNSW)",
+                lambda: ChromaStore(os.path.join(tmp_dir, "chroma")),
+                ids, embeddings, texts, metadatas, queries,
+            )
+            recall = np.mean([len(set(a) & set(b)) / TOP_K for a, b in zip(exact, approximate)])
+            print(f"Chroma recall@{TOP_K} against float32: {recall:.3f}")
@@ -0,0 +1,219 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Sequence
+from utils.ollama_client import OllamaClient
+
+
+class LLMEndpoint:
+    """
+    One LLM server of a `LLMBalancer`, with its load and latency stats.
+
+    Attributes:
+        client (OllamaClient): The pooled client of the server.
+        name (str): The URL of the server, used as its label in the stats.
+        outstanding (int): The requests in flight.
+        healthy (bool): False after a failed request or health check, until the next successful health check.
+        requests (int): The finished requests.
+        errors (int): The failed requests.
+        ttft_ewma (float): The moving average of the time to the first token, in seconds (0 before the first request).
+    """
+
+    # weight of the last request in the moving averages
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.name = client.base_url
+        self.outstanding = 0
+        self.healthy = True
+        self.requests = 0
+        self.errors = 0
+        self.ttft_ewma = 0.0
+        self.duration_ewma = 0.0
+
+    def _average(self, average: float, value: float) -> float:
+        return value if not average else average + self.EWMA_ALPHA * (value - average)
+
+    def stats(self) -> Dict:
+        return {
+            "endpoint": self.name,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ttft_ms": round(self.ttft_ewma * 1000, 1),
+            "duration_ms": round(self.duration_ewma * 1000, 1),
+        }
+
+
+class LLMBalancer:
+    """
+    Spreads the LLM requests of all the sessions over several Ollama (or OpenAI-compatible) servers.
+
+    A request goes to the healthy server with the fewest requests in flight (the fastest one on a tie). A session
+    sticks to the server that answered it before, as long as that server is healthy and has at most `affinity_slack`
+    more requests in flight than the least loaded one, so the server's prompt cache of the conversation stays warm.
+    A server that fails before the first token is marked unhealthy and the request is retried on another one.
+    A background thread checks every server every `health_check_interval` seconds, until `close`.
+
+    Sessions use it through `session_client`, which has the `chat_stream` and `chat` methods of `OllamaClient`,
+    so the Ollama LLM works unchanged on top of it.
+
+    Attributes:
+        endpoints (List[LLMEndpoint]): The servers.
+        affinity_slack (int): How many more requests in flight a session's server may have before the session moves.
+        on_request (Callable[[LLMEndpoint, float | None, float, bool], None] | None): Called after each request with the
+            endpoint, the time to the first token (None if there was none), the duration, and whether it failed.
+    """
+
+    # sessions remembered for affinity
+    MAX_SESSIONS = 10000
+
+    def __init__(
+        self,
+        clients: Sequence[OllamaClient],
+        affinity_slack: int = 1,
+        health_check_interval: float = 10,
+        on_request: Callable[[LLMEndpoint, float | None, float, bool], None] | None = None,
+    ):
+        if not clients:
+            raise ValueError("The balanced LLM provider needs at least one endpoint.")
+        self.endpoints: List[LLMEndpoint] = [LLMEndpoint(client) for client in clients]
+        self.affinity_slack = affinity_slack
+        self.on_request = on_request
+        self._affinity: OrderedDict[str, LLMEndpoint] = OrderedDict()
+        self._lock = threading.Lock()
+        self._health_check_interval = health_check_interval
+        self._closed = threading.Event()
+        if health_check_interval > 0:
+            threading.Thread(target=self._check_health, name="llm-health", daemon=True).start()
+
+    def close(self) -> None:
+        """Stop the health checks."""
+        self._closed.set()
+
+    def session_client(self, session_id: str) -> "_SessionClient":
+        """A client for one session: its requests keep going to the same server when possible."""
+        return _SessionClient(self, session_id)
+
+    def stats(self) -> List[Dict]:
+        """The load and latency of every server."""
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _check_health(self) -> None:
+        while not self._closed.wait(self._health_check_interval):
+            for endpoint in self.endpoints:
+                try:
+                    healthy = endpoint.client.health()
+                except Exception as e:
+                    print(f"Error checking the health of LLM endpoint {endpoint.name}: {e}")
+                    healthy = False
+                if healthy != endpoint.healthy:
+                    print(f"LLM endpoint {endpoint.name} is {'back' if healthy else 'down'}")
+                endpoint.healthy = healthy
+
+    def _acquire(self, session_id: str, exclude: Sequence[LLMEndpoint] = ()) -> LLMEndpoint:
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+            if not candidates:
+                # nothing known to be healthy: try the others anyway
+                candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+            least = min(candidates, key=lambda e: (e.outstanding, e.ttft_ewma))
+            endpoint = self._affinity.get(session_id)
+            if (
+                endpoint is None
+                or endpoint not in candidates
+                or endpoint.outstanding > least.outstanding + self.affinity_slack
+            ):
+                endpoint = least
+            self._affinity[session_id] = endpoint
+            self._affinity.move_to_end(session_id)
+            if len(self._affinity) > self.MAX_SESSIONS:
+                self._affinity.popitem(last=False)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(
+        self, endpoint: LLMEndpoint, start: float, ttft: float | None, failed: bool
+    ) -> None:
+        duration = time.perf_counter() - start
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            if failed:
+                endpoint.errors += 1
+            else:
+                endpoint.duration_ewma = endpoint._average(endpoint.duration_ewma, duration)
+            if ttft is not None:
+                endpoint.ttft_ewma = endpoint._average(endpoint.ttft_ewma, ttft)
+        if self.on_request is not None:
+            self.on_request(endpoint, ttft, duration, failed)
+
+    def _mark_down(self, endpoint: LLMEndpoint, error: Exception) -> None:
+        if endpoint.healthy:
+            print(f"LLM endpoint {endpoint.name} failed, trying another one: {error}")
+        endpoint.healthy = False
+
+    def chat_stream(self, session_id: str, model: str, messages: Sequence[Dict]) -> Iterator[str]:
+        tried: List[LLMEndpoint] = []
+        while True:
+            endpoint = self._acquire(session_id, exclude=tried)
+            tried.append(endpoint)
+            start = time.perf_counter()
+            ttft = None
+            failed = True
+            try:
+                for piece in endpoint.client.chat_stream(model, messages):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    yield piece
+                failed = False
+                return
+            except GeneratorExit:
+                # the session stopped reading (an interruption): not a failure of the server
+                failed = False
+                raise
+            except Exception as e:
+                # once the answer has started, it can't be sent again from another server
+                if ttft is not None or len(tried) >= len(self.endpoints):
+                    raise
+                self._mark_down(endpoint, e)
+            finally:
+                self._release(endpoint, start, ttft, failed)
+
+    def chat(self, session_id: str, model: str, messages: Sequence[Dict]) -> str:
+        tried: List[LLMEndpoint] = []
+        while True:
+            endpoint = self._acquire(session_id, exclude=tried)
+            tried.append(endpoint)
+            start = time.perf_counter()
+            failed = True
+            try:
+                response = endpoint.client.chat(model, messages)
+                failed = False
+                return response
+            except Exception as e:
+                if len(tried) >= len(self.endpoints):
+                    raise
+                self._mark_down(endpoint, e)
+            finally:
+                self._release(endpoint, start, None, failed)
+
+
+class _SessionClient:
+    """The view of a `LLMBalancer` for one session, with the chat methods of `OllamaClient`."""
+
+    # every endpoint serves the same model, so an answer from another endpoint is as good
+    last_stream_degraded = False
+
+    def __init__(self, balancer: LLMBalancer, session_id: str):
+        self.balancer = balancer
+        self.session_id = session_id
+
+    def chat_stream(self, model: str, messages: Sequence[Dict]) -> Iterator[str]:
+        return self.balancer.chat_stream(self.session_id, model, messages)
+
+    def chat(self, model: str, messages: Sequence[Dict]) -> str:
+        return self.balancer.chat(self.session_id, model, messages)
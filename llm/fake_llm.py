@@ -1,15 +1,18 @@
 from typing import Iterator
-import json
 
 from .llm_interface import LLMInterface
 
 class LLM(LLMInterface):
 
-    def __init__(self):
+    def __init__(self, journal=None):
         """
         Initializes an instance of the `FakeLLM` class.
+
+        Parameters:
+        - journal (SessionJournal, optional): Where the messages are recorded as chat history. Defaults to `None`.
         """
         self.memory = []
+        self.journal = journal
         self.sentence_count = 1
         self.response_list = [
             """Hello [smirk]! This is fake_llm. This is sentence 1. [joy]""",
@@ -43,9 +46,18 @@ class LLM(LLMInterface):
     def __printDebugInfo(self):
         print(" -- System: " + self.system)
 
-    def chat_iter(self, prompt: str) -> Iterator[str]:
+    def _remember(self, message: dict) -> None:
+        """
+        Add a message to the memory, and record it in the chat history
+        """
+        self.memory.append(message)
+        if self.journal is not None:
+            self.journal.append(message)
+
+    def chat_iter(self, prompt: str, ephemeral_context: str | None = None) -> Iterator[str]:
+        # the fake answers don't use the context, and it is never stored
 
-        self.memory.append(
+        self._remember(
             {
                 "role": "user",
                 "content": prompt,
@@ -67,44 +79,49 @@ class LLM(LLMInterface):
                 complete_response += char
             
             # Store the complete response in memory
-            self.memory.append(
+            self._remember(
                 {
                     "role": "assistant",
                     "content": complete_response,
                 }
             )
 
-            # Serialize the memory to a file
-            self.serialize_memory(self.memory, 'mem.json')
-
         return _generate_response()
 
+    def restore_memory(self, messages: list) -> None:
+        self.memory.extend(dict(message) for message in messages)
+
+    def add_to_memory(self, prompt: str, response: str) -> None:
+        self._remember(
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        )
+        self._remember(
+            {
+                "role": "assistant",
+                "content": response,
+            }
+        )
+
     def handle_interrupt(self, heard_response: str) -> None:
         print(">>>> LLM believe heard response is: ", heard_response)
         if self.memory[-1]["role"] == "assistant":
             self.memory[-1]["content"] = heard_response + "..."
+            if self.journal is not None:
+                self.journal.edit_last(self.memory[-1]["content"])
         else:
             if heard_response:
-                self.memory.append(
+                self._remember(
                     {
                         "role": "assistant",
                         "content": heard_response + "...",
                     }
                 )
-        self.memory.append(
+        self._remember(
             {
                 "role": "system",
                 "content": "[Interrupted by user]",
             }
         )
-
-    def serialize_memory(self, memory, filename):
-        """
-        Serialize the memory to a file.
-
-        Parameters:
-        - memory (list): The list of memory to be serialized.
-        - filename (str): The name of the file to which memory should be serialized.
-        """
-        with open(filename, 'w') as file:
-            json.dump(memory, file)
@@ -7,9 +7,15 @@ from typing import Type
 
 class LLMFactory:
     @staticmethod
-    def create_llm(llm_provider, **kwargs) -> Type[LLMInterface]:
+    def create_llm(
+        llm_provider, journal=None, long_term_memory=None, http_client=None, **kwargs
+    ) -> Type[LLMInterface]:
 
-        if llm_provider == "ollama":
+        if llm_provider in ("ollama", "balanced"):
+            if llm_provider == "balanced":
+                # the requests go through the balancer's client, the first endpoint is only shown in the logs
+                endpoints = kwargs.get("ENDPOINTS") or [{}]
+                kwargs.setdefault("BASE_URL", endpoints[0].get("BASE_URL"))
             return OllamaLLM(
                 system=kwargs.get("SYSTEM_PROMPT"),
                 base_url=kwargs.get("BASE_URL"),
@@ -17,18 +23,27 @@ class LLMFactory:
                 llm_api_key=kwargs.get("LLM_API_KEY"),
                 project_id=kwargs.get("PROJECT_ID"),
                 organization_id=kwargs.get("ORGANIZATION_ID"),
-                verbose=kwargs.get("VERBOSE", False)
-
+                verbose=kwargs.get("VERBOSE", False),
+                memory_token_budget=kwargs.get("MEMORY_TOKEN_BUDGET", 3000),
+                summarize_memory=kwargs.get("MEMORY_SUMMARIZE", True),
+                journal=journal,
+                long_term_memory=long_term_memory,
+                api=kwargs.get("API", "ollama"),
+                keep_alive=kwargs.get("KEEP_ALIVE", -1),
+                options=kwargs.get("OPTIONS"),
+                http_client=http_client,
             )
         elif llm_provider == "memgpt":
             return MemGPTLLM(
                 base_url=kwargs.get("BASE_URL"),
                 server_admin_token=kwargs.get("ADMIN_TOKEN"),
                 agent_id=kwargs.get("AGENT_ID"),
-                verbose=kwargs.get("VERBOSE", False)
+                verbose=kwargs.get("VERBOSE", False),
+                connect_timeout=kwargs.get("CONNECT_TIMEOUT", 10),
+                read_timeout=kwargs.get("READ_TIMEOUT", 120),
             )
         elif llm_provider == "fakellm":
-            return FakeLLM()
+            return FakeLLM(journal=journal)
         else:
             raise ValueError(f"Unsupported LLM provider: {llm_provider}")
 
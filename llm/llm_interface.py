@@ -4,14 +4,26 @@ from typing import Iterator
 
 class LLMInterface(metaclass=abc.ABCMeta):
 
+    # True when the last response of `chat_iter` is an error message or came from a fallback model.
+    # Such a response is shown to the user but must not be reused, e.g. by the answer cache.
+    last_response_degraded: bool = False
+    # The type of the error the last response of `chat_iter` ended with, when it was answered with an error message
+    # instead of raised. None if it didn't fail.
+    last_response_error: str | None = None
+
     @abc.abstractmethod
-    def chat_iter(self, prompt: str) -> Iterator[str]:
+    def chat_iter(self, prompt: str, ephemeral_context: str | None = None) -> Iterator[str]:
         """
         Sends a chat prompt to an agent and return an iterator to the response. 
         This function will have to store the user message and ai response back to the memory.
 
+        The ephemeral context (like the documents retrieved by RAG) is only sent with this request, as a system message
+        before the user message. It must not be stored in the memory: the memory keeps the bare prompt, so the
+        prompt of the next turns doesn't grow with every retrieved context.
+
         Parameters:
         - prompt (str): The message or question to send to the agent.
+        - ephemeral_context (str, optional): Context for this turn only.
 
         Returns:
         - Iterator[str]: An iterator to the response from the agent.
@@ -31,7 +43,30 @@ class LLMInterface(metaclass=abc.ABCMeta):
         """
         pass
 
+    def restore_memory(self, messages: list) -> None:
+        """
+        Load the messages of a previous session (from its chat history journal) into the memory, to resume it.
+        LLM providers that keep their memory on the server side can leave it out.
 
-    
-    
+        Parameters:
+        - messages (list): The messages (dicts with "role" and "content"), in order, without the system prompt.
+        """
+        pass
 
+    def add_to_memory(self, prompt: str, response: str) -> None:
+        """
+        Store an exchange that was answered without calling the LLM (e.g. from the answer cache), so the LLM knows about it in the next turns.
+        LLM providers that keep their memory on the server side can leave it out.
+
+        Parameters:
+        - prompt (str): The message or question of the user.
+        - response (str): The response that was given.
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Release what the LLM holds for its session (background workers, connections) when the session ends.
+        It is not used afterwards.
+        """
+        pass
@@ -0,0 +1,121 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Sequence, Tuple
+import numpy as np
+
+
+def format_turns(messages: List[Dict[str, str]]) -> List[str]:
+    """Split messages into turns (a turn starts with a user message), each as one text to embed."""
+    turns: List[List[str]] = []
+    for message in messages:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        if message["role"] == "system":
+            if message["content"] == "[Interrupted by user]":
+                turns[-1].append("(the user interrupted the assistant)")
+            continue
+        turns[-1].append(f"{message['role'].capitalize()}: {message['content']}")
+    return ["\n".join(turn) for turn in turns if turn]
+
+
+class LongTermMemory:
+    """
+    A vector index over the past turns of one conversation.
+
+    The LLM memory keeps only a short window of recent turns. The turns that leave the window are given to `add`
+    and embedded in the background by the embedding model of the RAG (`EMBED_MODEL`). Before each answer, `search`
+    finds the few past turns closest to the question, which are sent with the request. So the prompt stays about
+    the same size in a long session, and what was said long ago can still be recalled.
+    The embeddings are kept normalized in one matrix, so a search is a single matrix-vector product.
+
+    Attributes:
+        embedder: The embedding model (`embed_documents`).
+        embed_query (Callable[[str], Sequence[float]]): Embeds a question, ideally from a cache shared with the RAG.
+        k (int): The maximum number of past turns returned by `search`.
+        min_similarity (float): The minimum cosine similarity of a returned turn.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        embed_query: Callable[[str], Sequence[float]] | None = None,
+        k: int = 3,
+        min_similarity: float = 0.0,
+    ):
+        self.embedder = embedder
+        self.embed_query = embed_query or embedder.embed_query
+        self.k = k
+        self.min_similarity = min_similarity
+        self._turns: List[str] = []
+        # one row per turn, with room to grow
+        self._matrix: np.ndarray | None = None
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="long-term-memory"
+        )
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def add(self, messages: List[Dict[str, str]]) -> None:
+        """Index past messages, in the background."""
+        turns = format_turns(messages)
+        executor = self._executor
+        if turns and executor is not None:
+            executor.submit(self._index, turns)
+
+    def close(self) -> None:
+        """Stop indexing in the background. The messages added after this are not indexed."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _index(self, turns: List[str]) -> None:
+        try:
+            vectors = np.asarray(self.embedder.embed_documents(turns), dtype=np.float32)
+        except Exception as e:
+            print(f"Error embedding past turns, they won't be recalled: {e}")
+            return
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+        with self._lock:
+            count = len(self._turns)
+            if self._matrix is None:
+                self._matrix = np.zeros((max(64, len(turns)), vectors.shape[1]), dtype=np.float32)
+            elif count + len(turns) > len(self._matrix):
+                matrix = np.zeros((2 * (count + len(turns)), vectors.shape[1]), dtype=np.float32)
+                matrix[:count] = self._matrix[:count]
+                self._matrix = matrix
+            self._matrix[count : count + len(turns)] = vectors
+            self._turns.extend(turns)
+
+    def search(self, query: str, k: int | None = None) -> List[Tuple[str, float]]:
+        """
+        Find the past turns closest to a question.
+
+        Parameters:
+            query (str): The question.
+            k (int, optional): The maximum number of turns, `self.k` by default.
+
+        Returns:
+            List[Tuple[str, float]]: The turns and their similarity to the question, in the order they were said.
+        """
+        k = self.k if k is None else k
+        with self._lock:
+            count = len(self._turns)
+        # nothing to recall yet: don't pay for the embedding
+        if not count or k <= 0:
+            return []
+        vector = np.asarray(self.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        with self._lock:
+            scores = self._matrix[:count] @ vector
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            return [
+                (self._turns[index], float(scores[index]))
+                for index in sorted(top)
+                if scores[index] >= self.min_similarity
+            ]
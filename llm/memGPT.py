@@ -1,6 +1,6 @@
 import requests
 import json
-from typing import Iterator
+from typing import Iterable, Iterator
 from rich.console import Console
 
 from .llm_interface import LLMInterface
@@ -8,6 +8,26 @@ from .llm_interface import LLMInterface
 console = Console()
 
 
+def _sse_data(lines: Iterable[bytes]) -> Iterator[str]:
+    """
+    The data of each server-sent event of a stream of lines (as given by `iter_lines`).
+    The `data:` lines of an event are joined with new lines and the event ends at a blank line.
+    A line without a field name is its own event, as the server may send bare JSON lines.
+    """
+    data = []
+    for line in lines:
+        line = line.decode("utf-8").strip()
+        if line.startswith("data:"):
+            data.append(line[len("data:") :].strip())
+            continue
+        if data and not line:
+            yield "\n".join(data)
+            data = []
+        if line and not line.startswith((":", "event:", "id:", "retry:")):
+            yield line
+    if data:
+        yield "\n".join(data)
+
 
 class LLM(LLMInterface):
 
@@ -17,6 +37,8 @@ class LLM(LLMInterface):
         server_admin_token:str,
         agent_id:str,
         verbose:str=False,
+        connect_timeout: float = 10,
+        read_timeout: float = 120,
     ) -> None:
 
         self.base_url = base_url
@@ -33,31 +55,43 @@ class LLM(LLMInterface):
             "authorization": f"Bearer {self.token}",
         }
         self.verbose = verbose
+        # a stalled server ends the turn with an error instead of holding it forever.
+        # The read timeout is the longest silence between two pieces of the stream, so it must cover the agent's thinking.
+        self.timeout = (connect_timeout, read_timeout)
+        # one session for all the messages, so the connection to the server is kept open between turns
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
 
     
-    def chat_iter(self, prompt) -> Iterator[str]:
-        full_response = self._send_message_to_agent(prompt, callback_function=print)
-        # memGPT will handle the memory, so no need to deal with it here
-        return full_response
+    def chat_iter(self, prompt, ephemeral_context=None) -> Iterator[str]:
+        # memGPT keeps the messages on its server, so the context can't be left out of its memory
+        if ephemeral_context:
+            prompt = f"{ephemeral_context}\n\n{prompt}"
+        # memGPT will handle the memory, so no need to deal with it here.
+        # The messages are yielded as they arrive, so the sentences can be spoken while the agent is still answering.
+        return self._stream_agent_messages(prompt)
     
+    def close(self) -> None:
+        self._session.close()
+
     def handle_interrupt(self, heard_response: str) -> None:
         print("\n>> (MemGPT doesn't know you interrupted it for now. I don't know how to tell it about the interruption.) \n")
 
 
-    def _send_message_to_agent(self, message, callback_function=print):
+    def _stream_agent_messages(self, message) -> Iterator[str]:
         """
-        Sends a message to the specified agent, invokes the callback with the assistant's full message if given, and return the assistant's full response. The response will NOT be streamed back word by word.
+        Sends a message to the specified agent and yields the assistant's messages as the server streams them.
 
-        Utilizes Server-Sent Events (SSE) for streaming assistant_messages back to the client. If verbose mode is enabled, messages of other types will be printed out. The callback is exclusively for assistant messages.
+        Utilizes Server-Sent Events (SSE) over the pooled session: each `assistant_message` is yielded as soon as its line arrives.
+        If verbose mode is enabled, messages of other types will be printed out.
 
         This function uses REST API endpoint to avoid installing the memGPT python package, because it currently has a dependency conflict with fastapi.
 
         Parameters:
         - message (str): The message to send to the agent.
-        - callback_function (function): The function to call with the assistant's message. Defaults to print.
 
         Returns:
-        - str: The assistant's full response.
+        - Iterator[str]: The assistant's messages. The request is sent on the first `next`.
         """
 
         url = f"{self.base_url}/api/agents/{self.agent_id}/messages"
@@ -68,36 +102,25 @@ class LLM(LLMInterface):
             "stream": True,
             "role": "user",
         }
-        response = requests.post(
-            url, headers=self.headers, data=json.dumps(data), stream=True
-        )
-
-        if response.status_code != 200:
-            raise ValueError(f"Failed to send message: {response.text}")
-
-        result = ""
-
-        for line in response.iter_lines():
-            if line:
-                decoded_line = line.decode("utf-8").strip()
-                if decoded_line.startswith("data:"):
-                    decoded_line = decoded_line[len("data:") :].strip()
-                if decoded_line:
-                    try:
-                        json_line = json.loads(decoded_line)
-                        if self.verbose:
-                            console.print(json_line)
-                        if "assistant_message" in json_line:
-                            result += json_line["assistant_message"]
-                            if callable(callback_function):
-                                callback_function(json_line["assistant_message"])
-
-                    except json.JSONDecodeError as e:
-                        print(f"Error decoding JSON: {e} for line: {decoded_line}")
-                else:
-                    print("Received an empty line or non-JSON data.")
-
-        return result
+        with self._session.post(
+            url, data=json.dumps(data), stream=True, timeout=self.timeout
+        ) as response:
+            if response.status_code != 200:
+                raise ValueError(f"Failed to send message: {response.text}")
+
+            # chunk_size=None hands over each line as it arrives, instead of waiting for a full buffer
+            for event in _sse_data(response.iter_lines(chunk_size=None)):
+                if event == "[DONE]":
+                    continue
+                try:
+                    json_line = json.loads(event)
+                    if self.verbose:
+                        console.print(json_line)
+                    if "assistant_message" in json_line:
+                        yield json_line["assistant_message"]
+
+                except json.JSONDecodeError as e:
+                    print(f"Error decoding JSON: {e} for line: {event}")
 
 
 if __name__ == "__main__":
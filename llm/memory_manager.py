@@ -0,0 +1,161 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+# what the system message of the summary starts with
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """An approximate token count: about 4 characters per token for ASCII text, one token per other character (CJK...)."""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars / 4) + len(text) - ascii_chars
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """The approximate token count of a chat message, with the overhead of its role."""
+    return estimate_tokens(message["content"] or "") + 4
+
+
+class MemoryManager:
+    """
+    The conversation memory of an LLM, kept within a token budget.
+
+    The system prompt is always sent. The rest of the conversation is a window of recent turns (a turn starts with a
+    user message, and holds the answer and the interrupt markers that follow it). When the window is over the budget,
+    the oldest turns are evicted and summarized by a background worker, off the response path. Until their summary
+    is ready, the evicted turns are still sent, so nothing is forgotten in the meantime. The summary is sent as a
+    system message right after the system prompt.
+
+    Attributes:
+        system (str): The system prompt.
+        token_budget (int): The approximate number of tokens of the system prompt, the summary and the window.
+        summary (str): The summary of the evicted turns.
+        messages (List[Dict[str, str]]): The window of recent messages.
+    """
+
+    def __init__(
+        self,
+        system: str,
+        token_budget: int = 3000,
+        summarize: Callable[[str, List[Dict[str, str]]], str] | None = None,
+        min_recent_turns: int = 1,
+        on_evict: Callable[[List[Dict[str, str]]], None] | None = None,
+    ):
+        """
+        Initializes the memory.
+
+        Parameters:
+            system (str): The system prompt.
+            token_budget (int): The approximate number of tokens of the system prompt, the summary and the window. 0 for no limit.
+            summarize (Callable[[str, List[Dict[str, str]]], str], optional): Makes a new summary from the previous one and the
+                evicted messages. Without it, evicted turns are dropped.
+            min_recent_turns (int): The number of recent turns that are never evicted.
+            on_evict (Callable[[List[Dict[str, str]]], None], optional): Called with the evicted messages (to index them in a long-term memory).
+        """
+        self.system = system
+        self.token_budget = token_budget
+        self.summary = ""
+        self.messages: List[Dict[str, str]] = []
+        self._summarize = summarize
+        self._min_recent_turns = max(1, min_recent_turns)
+        self._on_evict = on_evict
+        # evicted messages waiting for the summarizer
+        self._pending: List[Dict[str, str]] = []
+        self._summarizing = False
+        self._lock = threading.Lock()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+            if summarize is not None
+            else None
+        )
+
+    def append(self, message: Dict[str, str]) -> None:
+        with self._lock:
+            self.messages.append(message)
+
+    def last(self) -> Dict[str, str] | None:
+        """The last message, None if the window is empty."""
+        with self._lock:
+            return self.messages[-1] if self.messages else None
+
+    def context(self) -> List[Dict[str, str]]:
+        """The messages to send to the LLM: the system prompt, the summary, the turns being summarized and the window."""
+        with self._lock:
+            context = [{"role": "system", "content": self.system}]
+            if self.summary:
+                context.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+            return context + self._pending + self.messages
+
+    def tokens(self) -> int:
+        """The approximate token count of the system prompt, the summary and the window."""
+        with self._lock:
+            return self._tokens()
+
+    def _tokens(self) -> int:
+        # must hold the lock
+        total = estimate_tokens(self.system) + sum(map(message_tokens, self.messages))
+        if self.summary:
+            total += estimate_tokens(SUMMARY_PREFIX + self.summary) + 4
+        return total
+
+    def _turn_starts(self) -> List[int]:
+        starts = [index for index, message in enumerate(self.messages) if message["role"] == "user"]
+        # messages before the first user message belong to the first turn
+        if starts and starts[0] != 0:
+            starts[0] = 0
+        return starts
+
+    def compact(self) -> None:
+        """Evict the oldest turns until the window fits the budget, and summarize them in the background."""
+        if self.token_budget <= 0:
+            return
+        with self._lock:
+            tokens = self._tokens()
+            if tokens <= self.token_budget:
+                return
+            starts = self._turn_starts()
+            evicted_turns = 0
+            # the turn ends where the next one starts
+            while tokens > self.token_budget and len(starts) - evicted_turns > self._min_recent_turns:
+                end = starts[evicted_turns + 1]
+                begin = starts[evicted_turns]
+                tokens -= sum(map(message_tokens, self.messages[begin:end]))
+                evicted_turns += 1
+            if not evicted_turns:
+                return
+            end = starts[evicted_turns]
+            evicted = self.messages[:end]
+            del self.messages[:end]
+            if self._executor is not None:
+                self._pending.extend(evicted)
+                if not self._summarizing:
+                    self._summarizing = True
+                    self._executor.submit(self._summarize_pending)
+        if self._on_evict is not None:
+            self._on_evict(evicted)
+
+    def close(self) -> None:
+        """Stop the background summarizer. The turns evicted after this are dropped."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _summarize_pending(self) -> None:
+        while True:
+            with self._lock:
+                batch = list(self._pending)
+                summary = self.summary
+                if not batch:
+                    self._summarizing = False
+                    return
+            try:
+                summary = self._summarize(summary, batch).strip()
+            except Exception as e:
+                # fall back to dropping the turns, so the prompt still stays within the budget
+                print(f"Error summarizing the conversation, dropping {len(batch)} old messages: {e}")
+            with self._lock:
+                self.summary = summary
+                del self._pending[: len(batch)]
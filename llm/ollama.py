@@ -1,12 +1,17 @@
 # Description: This file contains the implementation of the `ollama` class.
-# This class is responsible for handling the interaction with the OpenAI API for language generation.
-# And it is compatible with all of the OpenAI Compatible endpoints, including Ollama, OpenAI, and more.
+# This class is responsible for handling the interaction with the Ollama API for language generation.
+# And it is compatible with all of the OpenAI Compatible endpoints, including Ollama, OpenAI, and more (API: "openai").
 
 from typing import Iterator
-from openai import OpenAI
-import ollama
+from utils.ollama_client import OllamaClient
 from .llm_interface import LLMInterface
-import json
+from .memory_manager import MemoryManager
+
+SUMMARY_PROMPT = (
+    "You summarize conversations between a user and an AI assistant for the assistant's memory. "
+    "Merge the previous summary and the new messages into one short summary, in at most 150 words. "
+    "Keep the facts about the user, their requests and what was answered. Answer with the summary only."
+)
 
 
 class LLM(LLMInterface):
@@ -21,62 +26,111 @@ class LLM(LLMInterface):
         project_id:str="z",
         llm_api_key:str="z",
         verbose:bool=False,
+        memory_token_budget:int=3000,
+        summarize_memory:bool=True,
+        journal=None,
+        long_term_memory=None,
+        api:str="ollama",
+        keep_alive:int|str=-1,
+        options:dict|None=None,
+        http_client:OllamaClient|None=None,
     ):
         """
         Initializes an instance of the `ollama` class.
 
         Parameters:
-        - base_url (str): The base URL for the OpenAI API.
+        - base_url (str): The base URL of the server, with or without "/v1".
         - model (str): The model to be used for language generation.
         - system (str): The system to be used for language generation.
         - callback [DEPRECATED] (function, optional): The callback function to be called after each API call. Defaults to `print`.
-        - organization_id (str, optional): The organization ID for the OpenAI API. Defaults to an empty string.
-        - project_id (str, optional): The project ID for the OpenAI API. Defaults to an empty string.
-        - llm_api_key (str, optional): The API key for the OpenAI API. Defaults to an empty string.
+        - organization_id [DEPRECATED] (str, optional): The organization ID for the OpenAI API. Defaults to an empty string.
+        - project_id [DEPRECATED] (str, optional): The project ID for the OpenAI API. Defaults to an empty string.
+        - llm_api_key (str, optional): The API key for the OpenAI API (only sent with `api="openai"`). Defaults to an empty string.
         - verbose (bool, optional): Whether to enable verbose mode. Defaults to `False`.
+        - memory_token_budget (int, optional): The approximate number of tokens of the conversation sent to the model (system prompt included). 0 for no limit. Defaults to 3000.
+        - summarize_memory (bool, optional): Summarize the turns that don't fit the budget in the background, instead of dropping them. Defaults to `True`.
+        - journal (SessionJournal, optional): Where the messages are recorded as chat history. Defaults to `None`.
+        - long_term_memory (LongTermMemory, optional): Indexes the turns that leave the memory window, and recalls the relevant ones before each answer. Defaults to `None`.
+        - api (str, optional): "ollama" for the native Ollama API, "openai" for any OpenAI-compatible server. Defaults to "ollama".
+        - keep_alive (int | str, optional): How long Ollama keeps the model loaded after a request, -1 for ever. Defaults to -1.
+        - options (dict, optional): The Ollama model options, sent unchanged with every request so the model is never reloaded. Defaults to `None`.
+        - http_client (OllamaClient, optional): A pooled client shared with other sessions. Without it, the LLM has its own. Defaults to `None`.
         """
 
         self.base_url = base_url
         self.model = model
         self.system = system
         self.callback = callback
-        self.memory = []
+        self.memory = MemoryManager(
+            system,
+            token_budget=memory_token_budget,
+            summarize=self._summarize if summarize_memory else None,
+            on_evict=long_term_memory.add if long_term_memory is not None else None,
+        )
+        self.long_term_memory = long_term_memory
         self.verbose = verbose
-        self.client = OpenAI(
-            base_url=base_url,
-            organization=organization_id,
-            project=project_id,
-            api_key=llm_api_key,
+        self.journal = journal
+        self.client = http_client if http_client is not None else OllamaClient(
+            base_url,
+            api=api,
+            keep_alive=keep_alive,
+            options=options,
+            api_key=llm_api_key if api == "openai" else None,
+            pool_size=1,
         )
 
-        self.__set_system(system)
-
         if self.verbose:
             self.__printDebugInfo()
 
-    def __set_system(self, system):
-        """
-        Set the system prompt
-        system: str
-            the system prompt
-        """
-        self.system = system
-        self.memory.append(
-            {
-                "role": "system",
-                "content": system,
-            }
-        )
-
     def __print_memory(self):
         """
         Print the memory
         """
         print("Memory:\n========\n")
         # for message in self.memory:
-        print(self.memory)
+        print(self.memory.context())
+        print(f"(about {self.memory.tokens()} tokens)")
         print("\n========\n")
 
+    def _remember(self, message: dict) -> None:
+        """
+        Add a message to the memory, and record it in the chat history
+        """
+        self.memory.append(message)
+        if self.journal is not None:
+            self.journal.append(message)
+
+    def __recall(self, prompt: str) -> list:
+        """
+        The past turns that left the memory window and are relevant to the prompt
+        """
+        if self.long_term_memory is None:
+            return []
+        try:
+            return [turn for turn, _ in self.long_term_memory.search(prompt)]
+        except Exception as e:
+            print("Error searching the long-term memory: " + str(e))
+            return []
+
+    def _summarize(self, summary: str, messages: list) -> str:
+        """
+        Merge the previous summary of the conversation and evicted messages into a new summary.
+        Called by the memory manager in its background worker.
+        """
+        lines = [f"Previous summary: {summary}"] if summary else []
+        for message in messages:
+            if message["content"] == "[Interrupted by user]":
+                lines.append("(the user interrupted the assistant)")
+            else:
+                lines.append(f"{message['role']}: {message['content']}")
+        return self.client.chat(
+            self.model,
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": "\n".join(lines)},
+            ],
+        )
+
     def __printDebugInfo(self):
         print(" -- Base URL: " + self.base_url)
         print(" -- Model: " + self.model)
@@ -84,14 +138,36 @@ class LLM(LLMInterface):
 
 
 
-    def chat_iter(self, prompt:str) -> Iterator[str]:
+    def chat_iter(self, prompt:str, ephemeral_context:str|None=None) -> Iterator[str]:
 
-        self.memory.append(
+        self._remember(
             {
                 "role": "user",
                 "content": prompt,
             }
         )
+        # keep the conversation within the token budget, the evicted turns are summarized in the background
+        self.memory.compact()
+        # the context is sent with this request only, the memory keeps the bare prompt
+        messages = self.memory.context()
+        turn_context = []
+        recalled = self.__recall(prompt)
+        if recalled:
+            turn_context.append(
+                {
+                    "role": "system",
+                    "content": "Earlier in this conversation:\n" + "\n---\n".join(recalled),
+                }
+            )
+        if ephemeral_context:
+            turn_context.append(
+                {
+                    "role": "system",
+                    "content": ephemeral_context,
+                }
+            )
+        if turn_context:
+            messages = messages[:-1] + turn_context + messages[-1:]
 
         if self.verbose:
             self.__print_memory()
@@ -99,67 +175,84 @@ class LLM(LLMInterface):
             print(" -- Model: " + self.model)
             print(" -- System: " + self.system)
             print(" -- Prompt: " + prompt + "\n\n")
+            if ephemeral_context:
+                print(" -- Context: " + ephemeral_context + "\n\n")
 
-        chat_completion = []
-        try:
-            chat_completion = ollama.chat(model=self.model, messages=self.memory, stream=True)
-
-            # below is the older appraoch, which need the call go through the webserver, which might take some time for the response
-            # so the above is the base implimentation for the same but can get the response soon.
-
-            # chat_completion = self.client.chat.completions.create(
-            #     messages=self.memory,
-            #     model=self.model,
-            #     stream=True,
-            # )
-        except Exception as e:
-            print("Error calling the chat endpoint: " + str(e))
-            self.__printDebugInfo()
-            return "Error calling the chat endpoint: " + str(e)
+        # the pooled client streams from the configured BASE_URL, the request is sent when the iteration starts
+        chat_completion = self.client.chat_stream(self.model, messages)
 
         # a generator to give back an iterator to the response that will store 
         # the complete response in memory once the iteration is done
         def _generate_and_store_response():
             complete_response = ""
-            for chunk in chat_completion:
-                curr_chunk = chunk['message']['content']
-                if curr_chunk is None:
-                    curr_chunk = ""
-                yield curr_chunk
-                complete_response += curr_chunk
-            # for chunk in chat_completion:
-            #     if chunk.choices[0].delta.content is None:
-            #         chunk.choices[0].delta.content = ""
-            #     yield chunk.choices[0].delta.content
-            #     complete_response += chunk.choices[0].delta.content
-                
-            self.memory.append(
+            self.last_response_degraded = False
+            self.last_response_error = None
+            try:
+                for curr_chunk in chat_completion:
+                    yield curr_chunk
+                    complete_response += curr_chunk
+            except Exception as e:
+                print("Error calling the chat endpoint: " + str(e))
+                self.__printDebugInfo()
+                self.last_response_degraded = True
+                self.last_response_error = type(e).__name__
+                if not complete_response:
+                    yield "Error calling the chat endpoint: " + str(e)
+                    return
+            if self.client.last_stream_degraded:
+                self.last_response_degraded = True
+
+            self._remember(
                 {
                     "role": "assistant",
                     "content": complete_response,
                 }
             )
-            def serialize_memory(memory, filename):
-                with open(filename, 'w') as file:
-                    json.dump(memory, file)
-
-            serialize_memory(self.memory, 'mem.json')
             return
 
         return _generate_and_store_response()
     
+    def close(self) -> None:
+        # the pooled client is shared with the other sessions, it stays open
+        self.memory.close()
+        if self.long_term_memory is not None:
+            self.long_term_memory.close()
+
+    def restore_memory(self, messages: list) -> None:
+        # already in the chat history, so only the memory gets them
+        for message in messages:
+            self.memory.append(dict(message))
+        self.memory.compact()
+
+    def add_to_memory(self, prompt: str, response: str) -> None:
+        self._remember(
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        )
+        self._remember(
+            {
+                "role": "assistant",
+                "content": response,
+            }
+        )
+
     def handle_interrupt(self, heard_response: str) -> None:
-        if self.memory[-1]["role"] == "assistant":
-            self.memory[-1]["content"] = heard_response + "..."
+        last_message = self.memory.last()
+        if last_message is not None and last_message["role"] == "assistant":
+            last_message["content"] = heard_response + "..."
+            if self.journal is not None:
+                self.journal.edit_last(last_message["content"])
         else:
             if heard_response:
-                self.memory.append(
+                self._remember(
                     {
                         "role": "assistant",
                         "content": heard_response + "...",
                     }
                 )
-        self.memory.append(
+        self._remember(
             {
                 "role": "system",
                 "content": "[Interrupted by user]",
@@ -1,30 +1,32 @@
 import os
 import shutil
+import contextlib
+import hashlib
 import atexit
 import threading
 import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import Callable, Iterator, Optional
 from fastapi import WebSocket
 import numpy as np
 import time
-from asr.asr_factory import ASRFactory
+import uuid
 from asr.asr_interface import ASRInterface
 from live2d_model import Live2dModel
 from llm.llm_factory import LLMFactory
 from llm.llm_interface import LLMInterface
+from model_registry import ModelRegistry
+from utils.answer_cache import AnswerCache, CachedAnswer
 from prompts import prompt_loader
-from tts.tts_factory import TTSFactory
 from tts.tts_interface import TTSInterface
+from utils.sentence_segmenter import SentenceSegmenter
+from utils.metrics import ConversationMetrics
+from utils.tracing import Tracer, Turn
 
 import yaml
 import random
-import ollama
 import asyncio
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.document_loaders import DirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document 
 
 class OpenLLMVTuberMain:
     """
@@ -32,18 +34,33 @@ class OpenLLMVTuberMain:
     It initializes the Live2D controller, ASR, TTS, and LLM based on the provided configuration.
     Run `conversation_chain` to start one conversation (user_input -> llm -> speak).
 
+    Heavy models (ASR, TTS, RAG retriever) are borrowed from a `ModelRegistry`, so several instances
+    (one per websocket session in server mode) can share them. Each instance owns only the LLM and its memory.
+
     Attributes:
     - config (dict): The configuration dictionary.
+    - registry (ModelRegistry): The registry that owns the shared models.
+    - session_id (str): A short random id of this instance (or the id of the resumed session), used to keep the files of concurrent sessions apart.
     - llm (LLMInterface): The LLM instance.
     - asr (ASRInterface): The ASR instance.
     - tts (TTSInterface): The TTS instance.
+    - tracer (Tracer): Records the latency of each stage of a turn (see `TRACE_ON`).
+    - current_turn (Turn): The turn being processed, to record its spans with. Turn 0 is the time before the first conversation.
+    - metrics (ConversationMetrics): The metrics shared by all the sessions of the registry.
+    - answer_cache (AnswerCache | None): The semantic cache of answers shared by all the sessions (see `ANSWER_CACHE_ON`).
     """
 
     config: dict
+    registry: ModelRegistry
+    session_id: str
     llm: LLMInterface
     asr: ASRInterface
     tts: TTSInterface
     live2d: Live2dModel | None
+    tracer: Tracer
+    current_turn: Turn
+    metrics: ConversationMetrics
+    answer_cache: AnswerCache | None
     _continue_exec_flag: threading.Event
     EXEC_FLAG_CHECK_TIMEOUT = 5  # seconds
 
@@ -53,14 +70,31 @@ class OpenLLMVTuberMain:
         custom_asr: ASRInterface | None = None,
         custom_tts: TTSInterface | None = None,
         websocket: WebSocket | None = None,
+        registry: ModelRegistry | None = None,
+        play_welcome: bool = True,
+        session_id: str | None = None,
     ) -> None:
         self.config = configs
+        # without a shared registry, this instance owns its models
+        self.registry = registry if registry is not None else ModelRegistry(configs)
+        # the id of a previous session resumes its chat history
+        self.session_id = session_id or uuid.uuid4().hex[:8]
+        self.tracer = self.registry.get_tracer()
+        self.current_turn = Turn(self.tracer, self.session_id, 0)
+        self.metrics = self.registry.get_metrics()
         self.verbose = self.config.get("VERBOSE", False)
         self.show_timing = self.config.get("SHOW_RESPONSE_TIME", False)
         self.websocket = websocket
         # self.live2d = self.init_live2d()
         self._continue_exec_flag = threading.Event()
         self._continue_exec_flag.set()  # Set the flag to continue execution
+        # the audio output records its own playback spans (see set_audio_output_func)
+        self._output_records_playback = False
+        # synthesizes the sentences of a response in parallel, see speak_by_sentence_chain
+        self._tts_executor = ThreadPoolExecutor(
+            max_workers=self.config.get("TTS_WORKERS", 1),
+            thread_name_prefix=f"tts-{self.session_id}",
+        )
         
         print(f"is show response time enabled? {self.show_timing}")
         # Init RAG and load the docs.
@@ -70,6 +104,11 @@ class OpenLLMVTuberMain:
         else:
             print("RAG is disabled.")
             self.retriever = None
+        # decides whether a question needs the documents, so small talk skips the retrieval
+        if self.retriever is not None and self.config.get("RAG_GATE_ON", False):
+            self.retrieval_gate = self.registry.get_retrieval_gate()
+        else:
+            self.retrieval_gate = None
 
         # Init ASR if voice input is on.
         if self.config.get("VOICE_INPUT_ON", False):
@@ -93,8 +132,24 @@ class OpenLLMVTuberMain:
         else:
             self.tts = None
 
+        # the question of the previous turn: answers are only shared in the answer cache between the same contexts
+        self._previous_question = ""
         self.llm = self.init_llm()
 
+        if self.config.get("ANSWER_CACHE_ON", False):
+            self.answer_cache = self.registry.get_answer_cache()
+        else:
+            self.answer_cache = None
+        # (sentence, cached audio copy) of the turn being spoken, when the answer cache is on
+        self._turn_audio: list | None = None
+        # cleared when the audio of the turn is incomplete or comes from the TTS fallback, so it isn't cached
+        self._turn_cacheable = True
+
+        if play_welcome:
+            self.play_welcome_audio()
+
+    def play_welcome_audio(self) -> None:
+        """Play the welcome note with the current audio output function."""
         self._play_audio_file(
                         sentence="Welcome note",
                         filepath=f"./Audio_Files/Welcome_audio.mp3",
@@ -116,46 +171,8 @@ class OpenLLMVTuberMain:
     #     return live2d_controller
 
     # Initialization rag
-    def init_vectorstore(self) -> Chroma:
-        print("Innitiate the document loader..")
-        # Define the path to the folder where the documents are located
-        folder_path = "./data"
-
-        # Specify the models for embeddings
-        embedding_model = self.config.get("EMBED_MODEL")
-        
-        # Load all files from the specified folder
-        loader = DirectoryLoader(folder_path)
-        print("Loading vault content in vectordb...")
-
-        # Load documents from the directory
-        docs = loader.load()
-
-        # Initialize a text splitter to chunk the documents for better processing
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-
-        # Split the loaded documents into smaller chunks
-        splits = text_splitter.split_documents(docs)
-
-        # 2. Create Ollama embeddings and vector store
-        # Instantiate the embeddings model
-        embeddings = OllamaEmbeddings(model=embedding_model)
-
-        # Create a list to hold documents along with their embeddings
-        documents_with_embeddings = []
-        for doc in splits:
-            # Generate an embedding for the current document chunk
-            doc_embedding = embeddings.embed_query(doc.page_content)[0]  # Take the first embedding
-            # Create a Document object with the embedding stored in its metadata
-            documents_with_embeddings.append(
-                Document(page_content=doc.page_content, metadata={"embedding": doc_embedding})
-            )
-
-        print(f"Loaded {len(documents_with_embeddings)} documents")
-
-        # Add documents with embeddings to the Chroma vector store
-        vectorstore = Chroma.from_documents(documents=documents_with_embeddings, embedding=embeddings) 
-        return vectorstore.as_retriever()
+    def init_vectorstore(self):
+        return self.registry.get_retriever()
     
     def init_llm(self) -> LLMInterface:
         llm_provider = self.config.get("LLM_PROVIDER")
@@ -168,49 +185,68 @@ class OpenLLMVTuberMain:
             )
         else:
             system_prompt = self.get_system_prompt() #old
+        # cached answers are only valid for the persona they were made with
+        self.persona_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
     
+        journal = None
+        if self.config.get("SAVE_CHAT_HISTORY", False):
+            journal = self.registry.get_chat_journal().session(self.session_id)
+        long_term_memory = None
+        if self.config.get("LONG_TERM_MEMORY_ON", False):
+            from llm.long_term_memory import LongTermMemory
+
+            # the questions are embedded once, for the RAG and the recall
+            long_term_memory = LongTermMemory(
+                self.registry.get_embedder(),
+                embed_query=self._embed_question,
+                k=self.config.get("LONG_TERM_MEMORY_K", 3),
+                min_similarity=self.config.get("LONG_TERM_MEMORY_MIN_SIMILARITY", 0.0),
+            )
+        http_client = None
+        if llm_provider == "ollama":
+            # one pooled client for all the sessions, shared with the embeddings when they use the same server
+            http_client = self.registry.get_llm_client()
+        elif llm_provider == "balanced":
+            # the requests of this session stick to one server of the pool while it isn't overloaded
+            http_client = self.registry.get_llm_pool().session_client(self.session_id)
+        if http_client is not None and self.config.get("RESILIENCE_ON", False):
+            http_client = self.registry.get_resilient_llm_client(http_client)
         llm = LLMFactory.create_llm(
-            llm_provider=llm_provider, SYSTEM_PROMPT=system_prompt, **llm_config
+            llm_provider=llm_provider,
+            journal=journal,
+            long_term_memory=long_term_memory,
+            http_client=http_client,
+            SYSTEM_PROMPT=system_prompt,
+            **llm_config,
         )
+        if journal is not None:
+            history = journal.replay()
+            if history:
+                print(f"Resuming session {self.session_id} with {len(history)} messages")
+                llm.restore_memory(history)
+                questions = [message["content"] for message in history if message["role"] == "user"]
+                self._previous_question = questions[-1] if questions else ""
         return llm
 
     def init_asr(self) -> ASRInterface:
-        asr_model = self.config.get("ASR_MODEL")
-        asr_config = self.config.get(asr_model, {})
-        if asr_model == "AzureASR":
-            import api_keys # type: ignore
-
-            asr_config = {
-                "callback": print,
-                "subscription_key": api_keys.AZURE_API_Key,
-                "region": api_keys.AZURE_REGION,
-            }
-
-        asr = ASRFactory.get_asr_system(asr_model, **asr_config)
-        return asr
+        return self.registry.get_asr()
 
     def init_tts(self) -> TTSInterface:
-        tts_model = self.config.get("TTS_MODEL", "pyttsx3TTS")
-        tts_config = self.config.get(tts_model, {})
-
-        if tts_model == "AzureTTS":
-            import api_keys # type: ignore
-
-            tts_config = {
-                "api_key": api_keys.AZURE_API_Key,
-                "region": api_keys.AZURE_REGION,
-                "voice": api_keys.AZURE_VOICE,
-            }
-        tts = TTSFactory.get_tts_engine(tts_model, **tts_config)
-        return tts
+        return self.registry.get_tts()
 
     def set_audio_output_func(
-        self, audio_output_func: Callable[[Optional[str], Optional[str]], None]
+        self,
+        audio_output_func: Callable[[Optional[str], Optional[str]], None],
+        records_playback: bool = False,
     ) -> None:
         """
         Set the audio output function to be used for playing audio files.
         The function should accept two arguments: sentence (str) and filepath (str).
 
+        records_playback: bool
+        - Whether the function records the "playback" spans itself. A function that only hands the audio over
+          (like the server, which queues it for the websocket) doesn't play it, so the time it takes isn't the playback.
+
         sentence: str | None
         - The sentence to be displayed on the frontend.
         - If None, empty sentence will be displayed.
@@ -234,6 +270,7 @@ class OpenLLMVTuberMain:
         """
 
         self._play_audio_file = audio_output_func
+        self._output_records_playback = records_playback
 
         # def _play_audio_file(self, sentence: str, filepath: str | None) -> None:
 
@@ -307,12 +344,21 @@ class OpenLLMVTuberMain:
         # Apply the color to the console output
         print(f"{c[color_code]}New Conversation Chain started!")
 
+        turn = self.current_turn = self.tracer.start_turn(self.session_id)
+        with turn.span("turn"):
+            return self._conversation_turn(turn, user_input, c[color_code])
+
+    def _conversation_turn(
+        self, turn: Turn, user_input: str | np.ndarray | None, color: str
+    ) -> str:
+        """The body of `conversation_chain`, with the stages recorded as spans of `turn`."""
         # if user_input is not string, make it string
         if user_input is None:
             user_input = self.get_user_input()
         elif isinstance(user_input, np.ndarray):
             print("transcribing...")
-            user_input = self.asr.transcribe_np(user_input)
+            with turn.span("asr", samples=len(user_input)):
+                user_input = self.asr.transcribe_np(user_input)
 
         if user_input.strip().lower() == self.config.get("EXIT_PHRASE", "exit").lower():
             print("Exiting...")
@@ -347,39 +393,70 @@ class OpenLLMVTuberMain:
             self.process_start_time = time.time()
             print(f"=== Started the vector storage lookup ===")
 
-        if self.config.get("RAG_ON", False):
+        # a question close enough to an answered one gets the same answer, without the LLM and the TTS
+        question_embedding = None
+        cache_context = self._answer_cache_context()
+        self._previous_question = user_input
+        if self.answer_cache is not None:
+            with turn.span("answer_cache") as cache_span:
+                question_embedding = self._embed_question(user_input)
+                cached_answer = self.answer_cache.lookup(
+                    question_embedding, self._answer_cache_version(), cache_context
+                )
+                cache_span["hit"] = cached_answer is not None
+            if cached_answer is not None:
+                try:
+                    return self._replay_cached_answer(user_input, cached_answer, color)
+                finally:
+                    self.answer_cache.release(cached_answer)
+
+        needs_retrieval = self.config.get("RAG_ON", False)
+        if needs_retrieval and self.retrieval_gate is not None:
+            with turn.span("rag_gate") as gate_span:
+                needs_retrieval, reason = self.retrieval_gate.decide(user_input)
+                gate_span["decision"] = reason
+            self.metrics.rag_gate.labels(reason).inc()
+            if not needs_retrieval:
+                print(f"Skipping the vector storage lookup ({reason})")
+
+        if needs_retrieval:
             # Retrieve relevant documents based on the user's question
-            retrieved_docs = self.retriever.invoke(user_input)
+            with turn.span("rag") as rag_span:
+                retrieved_docs = self.retriever.invoke(user_input)
+                rag_span["docs"] = len(retrieved_docs)
             # Combine the contents of the retrieved documents for context
             formatted_context = self.combine_docs(retrieved_docs)
             # Call the LLM with the question and formatted context
 
             print("Done vector storage lookup")
-            # add the context over here
-            formatted_prompt = ("Please answer the following question, using the provided context information below, strictly:\n"
-                                "---------------------------------------------------------------\n"
-                                f"{formatted_context}\n"
-                                "---------------------------------------------------------------\n"
-                                "If you cannot find a relevant answer based on the context, respond only with **'I don't know the answer!'** "
-                                "Do not provide any additional information or reasoning.\n"
-                                f"QUESTION: {user_input}\n"
-                                "Answer: "
-                                ).strip()
+            # the context goes with this request only: the LLM memory keeps the bare question,
+            # so the prompt doesn't grow with the contexts of the previous turns
+            rag_context = ("Please answer the next question, using the provided context information below, strictly:\n"
+                           "---------------------------------------------------------------\n"
+                           f"{formatted_context}\n"
+                           "---------------------------------------------------------------\n"
+                           "If you cannot find a relevant answer based on the context, respond only with **'I don't know the answer!'** "
+                           "Do not provide any additional information or reasoning."
+                           ).strip()
         else:
-            formatted_prompt = user_input
+            rag_context = None
+        formatted_prompt = user_input
 
         print("Starting llm chat")
 
-        # llm call
-        chat_completion: Iterator[str] = self.llm.chat_iter(formatted_prompt)
-
-        # End the llm timer
-        process_end_llm_time = time.time()
-
-        # Calculate the llm runtime
-        if self.show_timing:
-            llm_runtime = process_end_llm_time - self.process_start_time
-            print(f"\n ---  --- llm runtime: {llm_runtime} seconds  ---  --- ")
+        # llm call. chat_iter returns a lazy generator, so the llm time is measured when the tokens arrive.
+        def _print_llm_first_token_time(seconds: float) -> None:
+            if self.show_timing:
+                llm_runtime = time.time() - self.process_start_time
+                print(f"\n ---  --- llm time to first token: {seconds} seconds ({llm_runtime} seconds since start)  ---  --- ")
+
+        chat_completion: Iterator[str] = turn.trace_stream(
+            "llm",
+            self.llm.chat_iter(formatted_prompt, ephemeral_context=rag_context),
+            on_first_chunk=_print_llm_first_token_time,
+            # the LLM answers its errors with a message, they still count as errors of the stage
+            handled_error=lambda: self.llm.last_response_error,
+        )
 
         if not self.config.get("TTS_ON", False):
             full_response = ""
@@ -390,9 +467,39 @@ class OpenLLMVTuberMain:
                     return None
                 full_response += char
                 print(char, end="")
+            # an error message or the answer of a fallback model is not worth reusing
+            if question_embedding is not None and not self.llm.last_response_degraded:
+                self.answer_cache.store(
+                    user_input,
+                    question_embedding,
+                    full_response,
+                    [],
+                    self._answer_cache_version(),
+                    cache_context,
+                )
             return full_response
 
-        full_response = self.speak(chat_completion)
+        self._turn_audio = [] if question_embedding is not None else None
+        self._turn_cacheable = True
+        try:
+            full_response = self.speak(chat_completion)
+            if (
+                self._turn_audio
+                and full_response
+                and self._turn_cacheable
+                and not self.llm.last_response_degraded
+            ):
+                self.answer_cache.store(
+                    user_input,
+                    question_embedding,
+                    full_response,
+                    self._turn_audio,
+                    self._answer_cache_version(),
+                    cache_context,
+                )
+                self._turn_audio = None
+        finally:
+            self._discard_turn_audio()
 
         # End the llm timer
         process_end_tts_time = time.time()
@@ -405,9 +512,81 @@ class OpenLLMVTuberMain:
         if self.verbose:
             print(f"\nComplete response: [\n{full_response}\n]")
 
-        print(f"{c[color_code]}Conversation completed.")
+        print(f"{color}Conversation completed.")
         return full_response
 
+    def _embed_question(self, question: str):
+        """The embedding of a question. With RAG on, it comes from the retriever's cache, so retrieval doesn't embed it again."""
+        if self.retriever is not None:
+            return self.retriever.embed_query(question)
+        return self.registry.get_embedder().embed_query(question)
+
+    def _answer_cache_version(self) -> str:
+        """The version cached answers must match: the RAG corpus version and the persona."""
+        corpus_version = self.retriever.index_version() if self.retriever is not None else ""
+        return f"{corpus_version}:{self.persona_hash}"
+
+    def _answer_cache_context(self) -> str:
+        """
+        The context key of the current turn in the answer cache: the previous question, normalized ("" on the first turn).
+        A follow-up like "how much is it?" only gets an answer made after the same question.
+        """
+        return " ".join(self._previous_question.lower().split())
+
+    def _keep_turn_audio(self, sentence: str, filepath: str | None) -> None:
+        """Copy the audio of a sentence for the answer cache, before it is played (and removed)."""
+        if filepath is None and sentence.strip():
+            # the sentence got no audio
+            self._turn_cacheable = False
+        if self._turn_audio is None or filepath is None:
+            return
+        try:
+            cached_filepath = self.answer_cache.new_audio_path(filepath)
+            shutil.copyfile(filepath, cached_filepath)
+            self._turn_audio.append((sentence, cached_filepath))
+        except OSError as e:
+            print(f"Error copying {filepath} to the answer cache: {e}")
+            self._discard_turn_audio()
+
+    def _discard_turn_audio(self) -> None:
+        """Drop the audio kept for the answer cache, when the answer won't be cached (e.g. it was interrupted)."""
+        turn_audio, self._turn_audio = self._turn_audio, None
+        for _, filepath in turn_audio or []:
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+
+    def _replay_cached_answer(
+        self, user_input: str, cached_answer: CachedAnswer, color: str
+    ) -> str:
+        """Give the answer of the answer cache, with its audio, as if the LLM had said it."""
+        print(
+            f"Answer cache hit (similarity {cached_answer.similarity:.3f}), "
+            f"cached question: {cached_answer.question}"
+        )
+        print(cached_answer.answer)
+        if self.show_timing:
+            print(f"\n ---  --- answer cache time: {time.time() - self.process_start_time} seconds  ---  --- ")
+        self.llm.add_to_memory(user_input, cached_answer.answer)
+
+        if self.config.get("TTS_ON", False):
+            for sentence, filepath in cached_answer.audio:
+                if not self._continue_exec_flag.is_set():
+                    self._interrupt_post_processing()
+                    raise InterruptedError(
+                        "Conversation chain interrupted: cached answer"
+                    )
+                with self._playback_span(cached=True):
+                    self._play_audio_file(
+                        sentence=sentence,
+                        filepath=filepath,
+                        remove_after_play=False,
+                    )
+
+        print(f"{color}Conversation completed.")
+        return cached_answer.answer
+
     def get_user_input(self) -> str:
         """
         Get user input using the method specified in the configuration file.
@@ -433,7 +612,7 @@ class OpenLLMVTuberMain:
         - chat_completion (Iterator[str]): The chat completion to speak
 
         Returns:
-        - str: The full response from the LLM
+        - str: The full response from the LLM, or None if it was interrupted before it was played
         """
         full_response = ""
         if self.config.get("SAY_SENTENCE_SEPARATELY", True):
@@ -448,15 +627,21 @@ class OpenLLMVTuberMain:
                 print(char, end="")
                 full_response += char
             print("\n")
-            filename = self._generate_audio_file(full_response, "temp")
+            with self.current_turn.span("tts", index=0, chars=len(full_response)):
+                filename = self._generate_audio_file(full_response, f"{self.session_id}-temp")
 
-            if self._continue_exec_flag.is_set():
+            if not self._continue_exec_flag.is_set():
+                print("\nInterrupted!")
+                if filename:
+                    self.tts.remove_file(filename, verbose=self.verbose)
+                self._interrupt_post_processing()
+                return None
+            self._keep_turn_audio(full_response, filename)
+            with self._playback_span(index=0):
                 self._play_audio_file(
                     sentence=full_response,
                     filepath=filename,
                 )
-            else:
-                self._interrupt_post_processing()
 
         return full_response
 
@@ -483,7 +668,11 @@ class OpenLLMVTuberMain:
         if sentence.strip() == "":
             return None
 
-        return self.tts.generate_audio(sentence, file_name_no_ext=file_name_no_ext)
+        filepath = self.tts.generate_audio(sentence, file_name_no_ext=file_name_no_ext)
+        if self.tts.last_audio_degraded:
+            # the voice of the fallback engine is not worth reusing
+            self._turn_cacheable = False
+        return filepath
 
     def _play_audio_file(self, sentence: str | None, filepath: str | None, remove_after_play: bool = True) -> None:
         """
@@ -517,20 +706,109 @@ class OpenLLMVTuberMain:
         except Exception as e:
             print(f"Error playing the audio file {filepath}: {e}")
 
+    def _playback_span(self, **attributes):
+        """The span of playing a sentence, unless the audio output records it itself."""
+        if self._output_records_playback:
+            return contextlib.nullcontext(attributes)
+        return self.current_turn.span("playback", **attributes)
+
+    def _submit_tts_job(self, sentence: str, index: int) -> Future:
+        """
+        Start synthesizing a sentence on the TTS worker pool.
+
+        Parameters:
+        - sentence (str): The sentence to synthesize
+        - index (int): The index of the sentence in the response, used for the file name
+
+        Returns:
+        - Future: A future of the path to the audio file (or None)
+        """
+        turn = self.current_turn
+
+        def _synthesize() -> str | None:
+            with turn.span("tts", index=index, chars=len(sentence)):
+                return self._generate_audio_file(
+                    sentence, file_name_no_ext=f"{self.session_id}-temp-{index}"
+                )
+
+        self.metrics.tts_pending.inc()
+        audio_future = self._tts_executor.submit(_synthesize)
+        audio_future.add_done_callback(lambda _: self.metrics.tts_pending.dec())
+        return audio_future
+
+    def _discard_tts_job(self, audio_future: Future) -> None:
+        """Cancel a TTS job that will never be played, and remove its audio file once it's done."""
+        if audio_future.cancel():
+            return
+
+        def _remove_audio_file(future: Future) -> None:
+            if future.cancelled() or future.exception() is not None:
+                return
+            if future.result() and self.tts:
+                self.tts.remove_file(future.result(), verbose=self.verbose)
+
+        audio_future.add_done_callback(_remove_audio_file)
+
     def speak_by_sentence_chain(self, chat_completion: Iterator[str]) -> str:
         """
         Generate and play the chat completion sentences one by one using the TTS engine.
         Now properly handles interrupts in a multi-threaded environment using the existing _continue_exec_flag.
+
+        The producer submits every sentence to the TTS worker pool (`TTS_WORKERS`) as soon as it is complete, so several
+        sentences can be synthesized at once. The task queue holds the jobs in sentence order and acts as the reorder
+        buffer: the consumer waits for each job in turn, so audio is always played in order. The queue is bounded
+        (`TTS_MAX_PENDING`), so a fast LLM can't pile up unbounded audio. On interrupt, the pending jobs are cancelled.
         """
-        task_queue = queue.Queue()
+        task_queue = queue.Queue(maxsize=self.config.get("TTS_MAX_PENDING", 4))
         full_response = [""]  # Use a list to store the full response
         interrupted_error_event = threading.Event()
+        consumer_done_event = threading.Event()
+
+        def _queue_put(audio_info) -> None:
+            # wait for room in the bounded queue, but keep checking for interrupts
+            while True:
+                if audio_info is not None and not self._continue_exec_flag.is_set():
+                    self._discard_tts_job(audio_info["audio_future"])
+                    raise InterruptedError("Producer interrupted")
+                if consumer_done_event.is_set():
+                    return
+                try:
+                    task_queue.put(audio_info, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def _wait_for_audio(audio_future: Future) -> str | None:
+            # wait for the synthesis of the next sentence, but keep checking for interrupts
+            while True:
+                if not self._continue_exec_flag.is_set():
+                    self._discard_tts_job(audio_future)
+                    raise InterruptedError("😱Consumer interrupted")
+                try:
+                    return audio_future.result(timeout=0.1)
+                except FutureTimeoutError:
+                    continue
+
+        def _discard_queued_jobs() -> None:
+            while True:
+                try:
+                    audio_info = task_queue.get_nowait()
+                except queue.Empty:
+                    return
+                if audio_info is not None:
+                    self._discard_tts_job(audio_info["audio_future"])
 
         def producer_worker():
+            sentence_buffer = ""
             try:
                 index = 0
-                sentence_buffer = ""
-                isFirst_Generated = False
+                segmenter = SentenceSegmenter(
+                    min_length=self.config.get("SENTENCE_MIN_LENGTH", 0),
+                    max_length=self.config.get("SENTENCE_MAX_LENGTH", 0),
+                    first_clause=self.config.get("FIRST_CLAUSE_EARLY_FLUSH", False),
+                    first_clause_min_length=self.config.get("FIRST_CLAUSE_MIN_LENGTH", 10),
+                    first_clause_max_tokens=self.config.get("FIRST_CLAUSE_MAX_TOKENS", 0),
+                )
                 for char in chat_completion:
                     if not self._continue_exec_flag.is_set():
                         raise InterruptedError("Producer interrupted")
@@ -538,51 +816,41 @@ class OpenLLMVTuberMain:
                     if char:
                         # print the response on the screen
                         print(char, end="", flush=True)
-                        sentence_buffer += char
                         full_response[0] += char
-                        if self.is_complete_sentence(char):
+                        for sentence_buffer in segmenter.feed(char):
                             if self.verbose:
                                 print("\n")
                             if not self._continue_exec_flag.is_set():
                                 raise InterruptedError("Producer interrupted")
-                            audio_filepath = self._generate_audio_file(
-                                sentence_buffer, file_name_no_ext=f"temp-{index}"
+                            _queue_put(
+                                {
+                                    "sentence": sentence_buffer,
+                                    "index": index,
+                                    "audio_future": self._submit_tts_job(
+                                        sentence_buffer, index
+                                    ),
+                                }
                             )
-                            # Calculate the tts first generation time
-                            if self.show_timing and not isFirst_Generated:
-                                process_first_audio_genration_time = time.time()
-                                tts_first_generation = process_first_audio_genration_time - self.process_start_time
-                                print(f"\n ---  --- First audio generation time: {tts_first_generation} seconds  ---  --- ")
-                                isFirst_Generated = True
-                            if not self._continue_exec_flag.is_set():
-                                raise InterruptedError("Producer interrupted")
-                            audio_info = {
-                                "sentence": sentence_buffer,
-                                "audio_filepath": audio_filepath,
-                            }
-                            task_queue.put(audio_info)
                             index += 1
-                            sentence_buffer = ""
 
                 # Handle any remaining text in the buffer
+                sentence_buffer = segmenter.flush()
                 if sentence_buffer:
                     if not self._continue_exec_flag.is_set():
                         raise InterruptedError("Producer interrupted")
                     print("\n")
-                    audio_filepath = self._generate_audio_file(
-                        sentence_buffer, file_name_no_ext=f"temp-{index}"
+                    _queue_put(
+                        {
+                            "sentence": sentence_buffer,
+                            "index": index,
+                            "audio_future": self._submit_tts_job(sentence_buffer, index),
+                        }
                     )
-                    # Calculate the tts first generation time
-                    if self.show_timing and not isFirst_Generated:
-                        process_first_audio_genration_time = time.time()
-                        tts_first_generation = process_first_audio_genration_time - self.process_start_time
-                        print(f"\n ---  --- First audio generation time: {tts_first_generation} seconds  at buffer check---  --- ")
-                        isFirst_Generated = True
-                    audio_info = {
-                        "sentence": sentence_buffer,
-                        "audio_filepath": audio_filepath,
-                    }
-                    task_queue.put(audio_info)
+
+                # How much sooner the first TTS call started, compared to waiting for the first full sentence
+                first_clause_saving = segmenter.first_clause_saving()
+                if self.show_timing and first_clause_saving is not None:
+                    print(f"\n ---  --- First clause early flush saved: {first_clause_saving} seconds  ---  --- ")
 
             except InterruptedError:
                 print("\nProducer interrupted")
@@ -593,48 +861,67 @@ class OpenLLMVTuberMain:
                     f"Producer error: Error generating audio for sentence: '{sentence_buffer}'.\n{e}",
                     "Producer stopped\n",
                 )
+                self._turn_cacheable = False
                 return
             finally:
-                task_queue.put(None)  # Signal end of production
+                _queue_put(None)  # Signal end of production
 
         def consumer_worker():
             heard_sentence = ""
+            isFirst_Generated = False
             isFirst_Played = False
-            while True:
-
-                try:
-                    if not self._continue_exec_flag.is_set():
-                        raise InterruptedError("😱Consumer interrupted")
-
-                    audio_info = task_queue.get(
-                        timeout=0.1
-                    )  # Short timeout to check for interrupts
-                    if audio_info is None:
-                        break  # End of production
-                    if audio_info:
-                        # Calculate the tts first play time
-                        if self.show_timing and not isFirst_Played:
-                            process_first_audio_play_time = time.time()
-                            tts_first_play = process_first_audio_play_time - self.process_start_time
-                            print(f"\n ---  --- First audio play time: {tts_first_play} seconds  ---  --- ")
-                            isFirst_Played = True
-                        heard_sentence += audio_info["sentence"]
-                        self._play_audio_file(
-                            sentence=audio_info["sentence"],
-                            filepath=audio_info["audio_filepath"],
+            try:
+                while True:
+
+                    try:
+                        if not self._continue_exec_flag.is_set():
+                            raise InterruptedError("😱Consumer interrupted")
+
+                        audio_info = task_queue.get(
+                            timeout=0.1
+                        )  # Short timeout to check for interrupts
+                        if audio_info is None:
+                            break  # End of production
+                        if audio_info:
+                            audio_filepath = _wait_for_audio(audio_info["audio_future"])
+                            # Calculate the tts first generation time
+                            if self.show_timing and not isFirst_Generated:
+                                process_first_audio_genration_time = time.time()
+                                tts_first_generation = process_first_audio_genration_time - self.process_start_time
+                                print(f"\n ---  --- First audio generation time: {tts_first_generation} seconds  ---  --- ")
+                                isFirst_Generated = True
+                            if not self._continue_exec_flag.is_set():
+                                self._discard_tts_job(audio_info["audio_future"])
+                                raise InterruptedError("😱Consumer interrupted")
+                            # Calculate the tts first play time
+                            if self.show_timing and not isFirst_Played:
+                                process_first_audio_play_time = time.time()
+                                tts_first_play = process_first_audio_play_time - self.process_start_time
+                                print(f"\n ---  --- First audio play time: {tts_first_play} seconds  ---  --- ")
+                                isFirst_Played = True
+                            heard_sentence += audio_info["sentence"]
+                            self._keep_turn_audio(audio_info["sentence"], audio_filepath)
+                            with self._playback_span(index=audio_info["index"]):
+                                self._play_audio_file(
+                                    sentence=audio_info["sentence"],
+                                    filepath=audio_filepath,
+                                )
+                        task_queue.task_done()
+                    except queue.Empty:
+                        continue  # No item available, continue checking for interrupts
+                    except InterruptedError as e:
+                        print(f"\n{str(e)}, stopping worker threads")
+                        interrupted_error_event.set()
+                        _discard_queued_jobs()
+                        return  # Exit the function
+                    except Exception as e:
+                        print(
+                            f"Consumer error: Error playing sentence '{audio_info['sentence']}'.\n {e}"
                         )
-                    task_queue.task_done()
-                except queue.Empty:
-                    continue  # No item available, continue checking for interrupts
-                except InterruptedError as e:
-                    print(f"\n{str(e)}, stopping worker threads")
-                    interrupted_error_event.set()
-                    return  # Exit the function
-                except Exception as e:
-                    print(
-                        f"Consumer error: Error playing sentence '{audio_info['sentence']}'.\n {e}"
-                    )
-                    continue
+                        self._turn_cacheable = False
+                        continue
+            finally:
+                consumer_done_event.set()
 
         producer_thread = threading.Thread(target=producer_worker)
         consumer_thread = threading.Thread(target=consumer_worker)
@@ -644,6 +931,8 @@ class OpenLLMVTuberMain:
 
         producer_thread.join()
         consumer_thread.join()
+        # the producer may have queued jobs after the consumer stopped
+        _discard_queued_jobs()
 
         if interrupted_error_event.is_set():
             self._interrupt_post_processing()
@@ -665,6 +954,16 @@ class OpenLLMVTuberMain:
         self._continue_exec_flag.clear()
         self.llm.handle_interrupt(heard_sentence)
 
+    def close(self) -> None:
+        """
+        End the session, e.g. when its websocket disconnects: stop the running conversation chain at its next
+        interrupt check, cancel the sentences waiting for TTS and stop the background workers of the LLM memory.
+        The shared models stay loaded for the other sessions. The session can't be used afterwards.
+        """
+        self._continue_exec_flag.clear()
+        self._tts_executor.shutdown(wait=False, cancel_futures=True)
+        self.llm.close()
+
     def _interrupt_post_processing(self) -> None:
         """Perform post-processing tasks (like resetting the continue flag to allow next conversation chain to start) after an interrupt."""
         #TODO # Stop any currently playing sound
@@ -675,61 +974,6 @@ class OpenLLMVTuberMain:
         if not self._continue_exec_flag.is_set():
             raise InterruptedError("Conversation chain interrupted: checked")
 
-    def is_complete_sentence(self, text: str):
-        """
-        Check if the text is a complete sentence.
-        text: str
-            the text to check
-        """
-
-        white_list = [
-            "...",
-            "Dr.",
-            "Mr.",
-            "Ms.",
-            "Mrs.",
-            "Jr.",
-            "Sr.",
-            "St.",
-            "Ave.",
-            "Rd.",
-            "Blvd.",
-            "Dept.",
-            "Univ.",
-            "Prof.",
-            "Ph.D.",
-            "M.D.",
-            "U.S.",
-            "U.K.",
-            "U.N.",
-            "E.U.",
-            "U.S.A.",
-            "U.K.",
-            "U.S.S.R.",
-            "U.A.E.",
-            "NY."
-        ]
-
-        for item in white_list:
-            if text.strip().lower().endswith(item.lower()):
-                return False
-
-        punctuation_blacklist = [
-            ".",
-            "?",
-            "!",
-            "。",
-            "；",
-            "？",
-            "！",
-            "…",
-            "〰",
-            "〜",
-            "～",
-            "！",
-        ]
-        return any(text.strip().endswith(punct) for punct in punctuation_blacklist)
-
     def clean_cache():
         cache_dir = "./cache"
         if os.path.exists(cache_dir):
@@ -740,7 +984,12 @@ if __name__ == "__main__":
     with open("conf.yaml", "rb") as f:
         config = yaml.safe_load(f)
 
-    vtuber_main = OpenLLMVTuberMain(config)
+    vtuber_main = OpenLLMVTuberMain(
+        config, session_id=config.get("RESUME_CHAT_SESSION") or None
+    )
+    print(f"Session id: {vtuber_main.session_id}")
+    if config.get("OLLAMA_WARM_UP", False):
+        vtuber_main.registry.warm_up_ollama()
     
     atexit.register(vtuber_main.clean_cache)
 
@@ -0,0 +1,703 @@
+import itertools
+import os
+import re
+import threading
+from typing import Any, Callable, Dict
+import numpy as np
+from asr.asr_factory import ASRFactory
+from asr.asr_interface import ASRInterface
+from live2d_model import Live2dModel
+from tts.tts_factory import TTSFactory
+from tts.tts_interface import TTSInterface
+from utils.metrics import ConversationMetrics
+from utils.resilience import CircuitBreaker, DeadlineExceeded, ResiliencePolicy, iter_with_deadline
+from utils.tracing import Tracer
+
+
+def _has_own_microphone(asr: ASRInterface) -> bool:
+    """Whether an ASR engine captures the microphone itself (like AzureASR), instead of through `transcribe_np`."""
+    return type(asr).transcribe_with_local_vad is not ASRInterface.transcribe_with_local_vad
+
+
+class _SerializedASR(ASRInterface):
+    """
+    Wraps an ASR engine that is not safe to call from several threads at once, so that sessions sharing it take turns.
+    """
+
+    def __init__(self, asr: ASRInterface):
+        self._asr = asr
+        self._lock = threading.Lock()
+
+    def transcribe_np(self, audio: np.ndarray) -> str:
+        with self._lock:
+            return self._asr.transcribe_np(audio)
+
+    def transcribe_with_local_vad(self) -> str:
+        if _has_own_microphone(self._asr):
+            with self._lock:
+                return self._asr.transcribe_with_local_vad()
+        return super().transcribe_with_local_vad()
+
+
+class _SerializedTTS(TTSInterface):
+    """
+    Wraps a TTS engine that is not safe to call from several threads at once, so that sessions sharing it take turns.
+    """
+
+    def __init__(self, tts: TTSInterface):
+        self._tts = tts
+        self._lock = threading.Lock()
+
+    def generate_audio(self, text: str, file_name_no_ext=None):
+        with self._lock:
+            return self._tts.generate_audio(text, file_name_no_ext=file_name_no_ext)
+
+
+class _ResilientASR(ASRInterface):
+    """
+    Wraps a remote ASR engine with a deadline, retries and a circuit breaker (see `ResiliencePolicy`).
+    When a call fails or the breaker is open, the audio goes to the local fallback engine, if there is one.
+    """
+
+    def __init__(
+        self,
+        asr: ASRInterface,
+        policy: ResiliencePolicy,
+        fallback: Callable[[], ASRInterface | None],
+        on_fallback: Callable[[], None] = lambda: None,
+    ):
+        self._asr = asr
+        self._policy = policy
+        self._fallback = fallback
+        self._on_fallback = on_fallback
+
+    def transcribe_np(self, audio: np.ndarray) -> str:
+        try:
+            return self._policy.call(self._asr.transcribe_np, audio)
+        except Exception as e:
+            fallback = self._fallback()
+            if fallback is None:
+                raise
+            print(f"ASR failed ({e}), transcribing with the fallback engine")
+            self._on_fallback()
+            return fallback.transcribe_np(audio)
+
+    def transcribe_with_local_vad(self) -> str:
+        # the microphone capture of the engine is kept; the audio of the others goes through `transcribe_np`
+        if _has_own_microphone(self._asr):
+            return self._asr.transcribe_with_local_vad()
+        return super().transcribe_with_local_vad()
+
+
+class _ResilientTTS(TTSInterface):
+    """
+    Wraps a remote TTS engine with a deadline, retries and a circuit breaker (see `ResiliencePolicy`).
+    A call that returns no audio file counts as a failure. When a call fails or the breaker is open,
+    the sentence goes to the local fallback engine, if there is one.
+
+    Each attempt writes its own file, so an attempt that ran out of time and finishes later can't overwrite the audio
+    of the retry or of the fallback. Its file is removed when it finishes.
+    The engine is shared by the sessions, and each sentence is synthesized on one thread, so `last_audio_degraded`
+    is kept per thread.
+    """
+
+    def __init__(
+        self,
+        tts: TTSInterface,
+        policy: ResiliencePolicy,
+        fallback: Callable[[], TTSInterface | None],
+        on_fallback: Callable[[], None] = lambda: None,
+    ):
+        self._tts = tts
+        self._policy = policy
+        self._fallback = fallback
+        self._on_fallback = on_fallback
+        self._attempts = itertools.count()
+        self._local = threading.local()
+
+    @property
+    def last_audio_degraded(self) -> bool:
+        return getattr(self._local, "degraded", False)
+
+    def _generate(self, text: str, file_name_no_ext):
+        attempt_name = f"{file_name_no_ext or 'temp'}-{next(self._attempts)}"
+        file_path = self._tts.generate_audio(text, file_name_no_ext=attempt_name)
+        if file_path is None:
+            raise RuntimeError("No audio was received")
+        return file_path
+
+    def _remove_late_file(self, file_path: str) -> None:
+        self._tts.remove_file(file_path, verbose=False)
+
+    def generate_audio(self, text: str, file_name_no_ext=None):
+        self._local.degraded = False
+        try:
+            return self._policy.call(
+                self._generate, text, file_name_no_ext, on_late_result=self._remove_late_file
+            )
+        except Exception as e:
+            fallback = self._fallback()
+            if fallback is None:
+                raise
+            print(f"TTS failed ({e}), speaking with the fallback engine")
+            self._on_fallback()
+            self._local.degraded = True
+            return fallback.generate_audio(text, file_name_no_ext=file_name_no_ext)
+
+
+class _ResilientLLMClient:
+    """
+    Wraps the HTTP client of the LLM with a deadline on the first token, retries before it and a circuit breaker
+    (see `ResiliencePolicy`). When a request fails before its first token or the breaker is open, it goes to the
+    fallback client (a local server) with the fallback model, if there is one. Has the chat methods of `OllamaClient`.
+
+    After the first token, each piece must arrive within `chunk_timeout` seconds. A stream that stalls counts as a
+    failure of the breaker. If it stalls before any text, the answer comes from the fallback instead (or
+    `DeadlineExceeded` is raised); after some text, the answer ends there, since what was said can't be taken back.
+    Each session has its own wrapper, so `last_stream_degraded` tells its LLM whether its last answer is a fallback
+    or was cut short.
+    """
+
+    last_stream_degraded = False
+
+    def __init__(
+        self,
+        client,
+        policy: ResiliencePolicy,
+        fallback=None,
+        fallback_model: str | None = None,
+        on_fallback: Callable[[], None] = lambda: None,
+        chunk_timeout: float | None = 10,
+    ):
+        self._client = client
+        self._policy = policy
+        self._fallback = fallback
+        self._fallback_model = fallback_model
+        self._on_fallback = on_fallback
+        self._chunk_timeout = chunk_timeout or None
+
+    @staticmethod
+    def _start(client, model: str, messages):
+        # the request is sent on the first `next`: wait for the first piece
+        stream = client.chat_stream(model, messages)
+        return next(stream, ""), stream
+
+    def _start_fallback(self, error: Exception, model: str, messages):
+        print(f"LLM failed ({error}), answering with the fallback model")
+        self._on_fallback()
+        self.last_stream_degraded = True
+        return self._start(self._fallback, self._fallback_model or model, messages)
+
+    def chat_stream(self, model: str, messages):
+        self.last_stream_degraded = False
+        try:
+            first, stream = self._policy.call(
+                self._start,
+                self._client,
+                model,
+                messages,
+                # a stream that answered too late is closed, so its connection goes back to the pool
+                on_late_result=lambda result: result[1].close(),
+            )
+        except Exception as e:
+            if self._fallback is None:
+                raise
+            first, stream = self._start_fallback(e, model, messages)
+        pieces = None
+        spoken = bool(first)
+        try:
+            yield first
+            pieces = iter_with_deadline(stream, self._chunk_timeout)
+            for piece in pieces:
+                spoken = spoken or bool(piece)
+                yield piece
+        except DeadlineExceeded as e:
+            if not self.last_stream_degraded:
+                self._policy.breaker.record_failure()
+            if spoken:
+                print(f"LLM stream stalled ({e}), ending the answer")
+                self.last_stream_degraded = True
+                return
+            if self.last_stream_degraded or self._fallback is None:
+                raise
+            first, fallback_stream = self._start_fallback(e, model, messages)
+            try:
+                yield first
+                yield from fallback_stream
+            finally:
+                fallback_stream.close()
+        finally:
+            # the stream runs on the reading thread of `pieces` once it is handed over
+            if pieces is None:
+                stream.close()
+            else:
+                pieces.close()
+
+    def chat(self, model: str, messages) -> str:
+        try:
+            return self._policy.call(self._client.chat, model, messages)
+        except Exception as e:
+            if self._fallback is None:
+                raise
+            print(f"LLM failed ({e}), answering with the fallback model")
+            self._on_fallback()
+            return self._fallback.chat(self._fallback_model or model, messages)
+
+
+class ModelRegistry:
+    """
+    A process-wide registry of the heavy models (ASR, TTS, RAG retriever and Live2D model info) and of the latency tracer and metrics.
+    Every model is built lazily, exactly once, and then borrowed by all the sessions that use this registry.
+    Sessions (`OpenLLMVTuberMain`) only own their lightweight state, like the LLM memory and the interrupt flag.
+
+    Engines that are not known to handle concurrent calls are wrapped so that calls from different sessions are serialized.
+    With `RESILIENCE_ON`, remote engines and the LLM client are wrapped with a deadline, retries and a circuit breaker,
+    and fall back to the configured local engine when they fail.
+
+    Attributes:
+        config (dict): The configuration dictionary.
+        CONCURRENT_ASR (set): ASR systems that can be called from several threads at once.
+        CONCURRENT_TTS (set): TTS engines that can be called from several threads at once.
+        REMOTE_ASR (set): ASR systems that call a remote service.
+        REMOTE_TTS (set): TTS engines that call a remote service.
+    """
+
+    CONCURRENT_ASR = {"Faster-Whisper", "GroqWhisperASR", "AzureASR"}
+    CONCURRENT_TTS = {"edgeTTS", "AzureTTS", "cosyvoiceTTS"}
+    REMOTE_ASR = {"GroqWhisperASR", "AzureASR"}
+    REMOTE_TTS = {"edgeTTS", "AzureTTS", "cosyvoiceTTS"}
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._handles: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def _get_or_build(self, name: str, builder: Callable[[], Any]) -> Any:
+        """
+        Return the handle registered under `name`, building it with `builder` on first use.
+        Concurrent callers asking for the same handle wait for a single build.
+        """
+        if name in self._handles:
+            return self._handles[name]
+        with self._registry_lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._handles:
+                self._handles[name] = builder()
+        return self._handles[name]
+
+    def warm_up(self) -> None:
+        """Build every model enabled in the configuration, so that the first session doesn't have to wait."""
+        if self.config.get("VOICE_INPUT_ON", False):
+            self.get_asr()
+        if self.config.get("TTS_ON", False):
+            self.get_tts()
+        if self.config.get("RAG_ON", False):
+            self.get_retriever()
+        if self.config.get("LIVE2D_MODEL"):
+            self.get_live2d()
+        if self.config.get("OLLAMA_WARM_UP", False):
+            self.warm_up_ollama()
+        if self.config.get("RESILIENCE_ON", False):
+            # a fallback loaded at the first failure would make that turn even slower
+            if self.config.get("VOICE_INPUT_ON", False) and self.config.get("ASR_MODEL") in self.REMOTE_ASR:
+                self.get_fallback_asr()
+            if self.config.get("TTS_ON", False) and self.config.get("TTS_MODEL") in self.REMOTE_TTS:
+                self.get_fallback_tts()
+
+    def warm_up_ollama(self) -> None:
+        """Load the chat and embedding models and open the connections, so that the first turn doesn't wait for a cold start."""
+        models = []
+        if self.config.get("LLM_PROVIDER") == "ollama":
+            models.append((self.get_llm_client(), self.config.get("ollama", {}).get("MODEL"), False))
+        elif self.config.get("LLM_PROVIDER") == "balanced":
+            model = self.config.get("balanced", {}).get("MODEL")
+            models.extend((endpoint.client, model, False) for endpoint in self.get_llm_pool().endpoints)
+        if self.config.get("EMBED_MODEL") and (
+            self.config.get("RAG_ON", False)
+            or self.config.get("ANSWER_CACHE_ON", False)
+            or self.config.get("LONG_TERM_MEMORY_ON", False)
+        ):
+            models.append((self.get_embedder().client, self.config.get("EMBED_MODEL"), True))
+        for client, model, embedding in models:
+            try:
+                seconds = client.warm_up(model, embedding=embedding)
+                print(f"Warmed up {model} in {seconds:.2f}s")
+            except Exception as e:
+                print(f"Error warming up {model}: {e}")
+
+    def get_asr(self) -> ASRInterface:
+        return self._get_or_build("asr", self._build_asr)
+
+    def get_tts(self) -> TTSInterface:
+        return self._get_or_build("tts", self._build_tts)
+
+    def get_fallback_asr(self) -> ASRInterface | None:
+        """The local ASR engine used when the remote one fails (`ASR_FALLBACK`), None if there is none."""
+        asr_model = self.config.get("ASR_FALLBACK")
+        if not asr_model:
+            return None
+        return self._get_or_build(
+            "fallback_asr",
+            lambda: self._build_fallback(asr_model, lambda: self._build_asr_engine(asr_model)),
+        )
+
+    def get_fallback_tts(self) -> TTSInterface | None:
+        """The local TTS engine used when the remote one fails (`TTS_FALLBACK`), None if there is none."""
+        tts_model = self.config.get("TTS_FALLBACK")
+        if not tts_model:
+            return None
+        return self._get_or_build(
+            "fallback_tts",
+            lambda: self._build_fallback(tts_model, lambda: self._build_tts_engine(tts_model)),
+        )
+
+    def get_retriever(self):
+        return self._get_or_build("retriever", self._build_retriever)
+
+    def get_retrieval_gate(self):
+        return self._get_or_build("retrieval_gate", self._build_retrieval_gate)
+
+    def get_chat_journal(self):
+        return self._get_or_build("chat_journal", self._build_chat_journal)
+
+    def get_http_client(self, base_url: str, api: str = "ollama", api_key: str | None = None):
+        """The pooled HTTP client of an LLM server, shared by the chat of every session and the embeddings."""
+        from utils.ollama_client import server_root
+
+        key = f"http_client:{api}:{server_root(base_url)}"
+        return self._get_or_build(key, lambda: self._build_http_client(base_url, api, api_key))
+
+    def get_llm_client(self):
+        """The HTTP client of the "ollama" LLM provider."""
+        llm_config = self.config.get("ollama", {})
+        api = llm_config.get("API", "ollama")
+        return self.get_http_client(
+            llm_config.get("BASE_URL", "http://localhost:11434"),
+            api,
+            llm_config.get("LLM_API_KEY") if api == "openai" else None,
+        )
+
+    def get_resilient_llm_client(self, client):
+        """
+        Wrap the LLM client of a session with the retries and circuit breaker shared by all the sessions,
+        and the fallback server of `LLM_FALLBACK`. The deadlines only apply with a fallback: without one,
+        a slow answer (a long prompt on a CPU, for example) is better than none.
+        """
+        fallback_config = self.config.get("LLM_FALLBACK") or {}
+        fallback = None
+        if fallback_config.get("BASE_URL"):
+            fallback = self.get_http_client(
+                fallback_config["BASE_URL"], fallback_config.get("API", "ollama")
+            )
+        first_token_timeout = self.config.get("LLM_FIRST_TOKEN_TIMEOUT", 20) if fallback else None
+        return _ResilientLLMClient(
+            client,
+            self._get_or_build(
+                "llm_policy", lambda: self._build_policy("llm", first_token_timeout)
+            ),
+            fallback=fallback,
+            fallback_model=fallback_config.get("MODEL"),
+            on_fallback=self.get_metrics().fallbacks.labels("llm").inc,
+            chunk_timeout=self.config.get("LLM_CHUNK_TIMEOUT", 10) if fallback else None,
+        )
+
+    def get_llm_pool(self):
+        """The balancer of the "balanced" LLM provider, shared by all the sessions."""
+        return self._get_or_build("llm_pool", self._build_llm_pool)
+
+    def get_embedder(self):
+        return self._get_or_build("embedder", self._build_embedder)
+
+    def get_answer_cache(self):
+        return self._get_or_build("answer_cache", self._build_answer_cache)
+
+    def get_live2d(self) -> Live2dModel:
+        return self._get_or_build(
+            "live2d", lambda: Live2dModel(self.config.get("LIVE2D_MODEL"))
+        )
+
+    def get_tracer(self) -> Tracer:
+        return self._get_or_build("tracer", self._build_tracer)
+
+    def get_metrics(self) -> ConversationMetrics:
+        return self._get_or_build("metrics", self._build_metrics)
+
+    def _build_metrics(self) -> ConversationMetrics:
+        metrics = ConversationMetrics(
+            backends={
+                "asr": self.config.get("ASR_MODEL", ""),
+                "rag": self.config.get("EMBED_MODEL", ""),
+                "llm": self.config.get("LLM_PROVIDER", ""),
+                "tts": self.config.get("TTS_MODEL", ""),
+            }
+        )
+        # stage latencies, turns and errors come from the spans of every session
+        self.get_tracer().add_listener(metrics.observe_span)
+        return metrics
+
+    def _build_tracer(self) -> Tracer:
+        if not self.config.get("TRACE_ON", False):
+            return Tracer()
+        trace_file = self.config.get("TRACE_FILE", "./logs/trace.jsonl")
+        print(f"Tracing conversation latency to {trace_file}")
+        return Tracer(
+            file_path=trace_file,
+            max_bytes=self.config.get("TRACE_MAX_BYTES", 10 * 1024 * 1024),
+            backup_count=self.config.get("TRACE_BACKUP_COUNT", 5),
+        )
+
+    def _build_asr(self) -> ASRInterface:
+        asr_model = self.config.get("ASR_MODEL")
+        asr = self._build_asr_engine(asr_model)
+        if self.config.get("RESILIENCE_ON", False) and asr_model in self.REMOTE_ASR:
+            asr = _ResilientASR(
+                asr,
+                self._build_policy(asr_model, self.config.get("ASR_TIMEOUT", 10)),
+                fallback=self.get_fallback_asr,
+                on_fallback=self.get_metrics().fallbacks.labels("asr").inc,
+            )
+        return asr
+
+    def _build_asr_engine(self, asr_model: str) -> ASRInterface:
+        asr_config = self.config.get(asr_model, {})
+        if asr_model == "AzureASR":
+            import api_keys  # type: ignore
+
+            asr_config = {
+                "callback": print,
+                "subscription_key": api_keys.AZURE_API_Key,
+                "region": api_keys.AZURE_REGION,
+            }
+
+        asr = ASRFactory.get_asr_system(asr_model, **asr_config)
+        if asr_model not in self.CONCURRENT_ASR:
+            asr = _SerializedASR(asr)
+        return asr
+
+    def _build_tts(self) -> TTSInterface:
+        tts_model = self.config.get("TTS_MODEL", "pyttsx3TTS")
+        tts = self._build_tts_engine(tts_model)
+        if self.config.get("RESILIENCE_ON", False) and tts_model in self.REMOTE_TTS:
+            tts = _ResilientTTS(
+                tts,
+                self._build_policy(tts_model, self.config.get("TTS_TIMEOUT", 10)),
+                fallback=self.get_fallback_tts,
+                on_fallback=self.get_metrics().fallbacks.labels("tts").inc,
+            )
+        return tts
+
+    def _build_tts_engine(self, tts_model: str) -> TTSInterface:
+        tts_config = self.config.get(tts_model, {})
+
+        if tts_model == "AzureTTS":
+            import api_keys  # type: ignore
+
+            tts_config = {
+                "api_key": api_keys.AZURE_API_Key,
+                "region": api_keys.AZURE_REGION,
+                "voice": api_keys.AZURE_VOICE,
+            }
+        tts = TTSFactory.get_tts_engine(tts_model, **tts_config)
+        if tts_model not in self.CONCURRENT_TTS:
+            tts = _SerializedTTS(tts)
+        return tts
+
+    def _build_policy(self, backend: str, timeout: float | None) -> ResiliencePolicy:
+        breaker = CircuitBreaker(
+            backend,
+            failure_threshold=self.config.get("BREAKER_FAILURE_THRESHOLD", 3),
+            reset_timeout=self.config.get("BREAKER_RESET_TIMEOUT", 30),
+        )
+        self.get_metrics().breaker_open.labels(backend).set_function(
+            lambda: float(breaker.is_open())
+        )
+        return ResiliencePolicy(
+            breaker,
+            timeout=timeout,
+            retries=self.config.get("RETRIES", 1),
+            base_delay=self.config.get("RETRY_BASE_DELAY", 0.2),
+        )
+
+    def _build_fallback(self, name: str, build: Callable[[], Any]) -> Any:
+        try:
+            return build()
+        except Exception as e:
+            # without it, the failures of the main engine are raised as before
+            print(f"Error loading the fallback {name}, running without it: {e}")
+            return None
+
+    def _build_chat_journal(self):
+        import atexit
+        from utils.chat_journal import ChatJournal
+
+        journal = ChatJournal(
+            self.config.get("CHAT_HISTORY_DIR", "./chat_history/"),
+            fsync_interval=self.config.get("CHAT_HISTORY_FSYNC_INTERVAL", 1.0),
+        )
+        # write what is still queued before the process exits
+        atexit.register(journal.close)
+        return journal
+
+    def _build_http_client(
+        self, base_url: str, api: str, api_key: str | None, llm_config: dict | None = None
+    ):
+        from utils.ollama_client import OllamaClient
+
+        if llm_config is None:
+            llm_config = self.config.get("ollama", {})
+        return OllamaClient(
+            base_url,
+            api=api,
+            keep_alive=llm_config.get("KEEP_ALIVE", -1),
+            options=llm_config.get("OPTIONS"),
+            api_key=api_key,
+            # every session streams, and the embeddings are sent several batches at a time
+            pool_size=self.config.get("HTTP_POOL_SIZE", 16),
+        )
+
+    def _build_llm_pool(self):
+        import atexit
+        from llm.balancer import LLMBalancer
+
+        llm_config = self.config.get("balanced", {})
+        clients = [
+            self._build_http_client(
+                endpoint["BASE_URL"],
+                endpoint.get("API", "ollama"),
+                endpoint.get("LLM_API_KEY"),
+                llm_config=llm_config,
+            )
+            for endpoint in llm_config.get("ENDPOINTS") or []
+        ]
+        metrics = self.get_metrics()
+
+        def record(endpoint, ttft, duration, failed):
+            if failed:
+                metrics.llm_endpoint_errors.labels(endpoint.name).inc()
+            elif ttft is not None:
+                metrics.llm_ttft.labels(endpoint.name).observe(ttft)
+
+        pool = LLMBalancer(
+            clients,
+            affinity_slack=llm_config.get("AFFINITY_SLACK", 1),
+            health_check_interval=llm_config.get("HEALTH_CHECK_INTERVAL", 10),
+            on_request=record,
+        )
+        # stop the health checks before the process exits
+        atexit.register(pool.close)
+        for endpoint in pool.endpoints:
+            metrics.llm_outstanding.labels(endpoint.name).set_function(
+                lambda endpoint=endpoint: endpoint.outstanding
+            )
+            metrics.llm_healthy.labels(endpoint.name).set_function(
+                lambda endpoint=endpoint: float(endpoint.healthy)
+            )
+        print(f"Balancing the LLM requests over {len(pool.endpoints)} endpoints")
+        return pool
+
+    def _build_embedder(self):
+        from rag.embedder import OllamaEmbedder
+
+        return OllamaEmbedder(
+            model=self.config.get("EMBED_MODEL"),
+            batch_size=self.config.get("EMBED_BATCH_SIZE", 32),
+            concurrency=self.config.get("EMBED_CONCURRENCY", 4),
+            client=self.get_http_client(
+                self.config.get("EMBED_BASE_URL", "http://localhost:11434")
+            ),
+        )
+
+    def _build_retrieval_gate(self):
+        from rag.gate import RetrievalGate
+
+        gate = RetrievalGate(
+            self.get_retriever(),
+            min_similarity=self.config.get("RAG_GATE_MIN_SIMILARITY", 0.0),
+        )
+        self.get_metrics().rag_skip_ratio.set_function(gate.skip_rate)
+        return gate
+
+    def _build_answer_cache(self):
+        from utils.answer_cache import AnswerCache
+
+        answer_cache = AnswerCache(
+            audio_dir=self.config.get("ANSWER_CACHE_DIR", "./cache/answers"),
+            threshold=self.config.get("ANSWER_CACHE_THRESHOLD", 0.92),
+            maxsize=self.config.get("ANSWER_CACHE_SIZE", 200),
+        )
+        self.get_metrics().cache_hit_ratio.labels("answer").set_function(
+            answer_cache.hit_rate
+        )
+        return answer_cache
+
+    def _build_retriever(self):
+        from rag.indexer import RagIndexer
+        from rag.retriever import Retriever
+
+        # Specify the models for embeddings
+        embedding_model = self.config.get("EMBED_MODEL")
+        embeddings = self.get_embedder()
+
+        # one index per embedding model, vectors of different models don't mix
+        index_dir = os.path.join(
+            self.config.get("RAG_INDEX_DIR", "./rag_index"),
+            re.sub(r"[^A-Za-z0-9._-]+", "_", embedding_model),
+        )
+        os.makedirs(index_dir, exist_ok=True)
+        if self.config.get("RAG_STORE", "chroma") == "numpy":
+            from rag.numpy_store import NumpyStore
+
+            store = NumpyStore(
+                os.path.join(index_dir, "numpy"),
+                dtype=self.config.get("RAG_VECTOR_DTYPE", "float32"),
+            )
+        else:
+            from rag.chroma_store import ChromaStore
+
+            store = ChromaStore(os.path.join(index_dir, "chroma"))
+        lexical_index = None
+        if self.config.get("RAG_HYBRID", True):
+            from rag.bm25 import BM25Index
+
+            lexical_index = BM25Index(os.path.join(index_dir, "bm25.json"))
+
+        print("Syncing the RAG index with ./data...")
+        indexer = RagIndexer(
+            # Define the path to the folder where the documents are located
+            data_dir="./data",
+            store=store,
+            embeddings=embeddings,
+            embed_model=embedding_model,
+            manifest_path=os.path.join(index_dir, "manifest.json"),
+            chunk_size=1000,
+            chunk_overlap=200,
+            lexical_index=lexical_index,
+        )
+        stats = indexer.sync()
+        print(
+            f"RAG index ready: {stats.chunks_total} chunks, {stats.chunks_embedded} embedded, "
+            f"{stats.chunks_removed} removed, {stats.files_unchanged} files unchanged ({stats.seconds:.2f}s)"
+        )
+        if stats.chunks_embedded:
+            print(f"Embedding throughput: {stats.chunks_per_second:.1f} chunks/s")
+        retriever = Retriever(
+            store,
+            embeddings,
+            k=self.config.get("RAG_TOP_K", 4),
+            index_version=lambda: indexer.corpus_version,
+            cache_size=self.config.get("RAG_CACHE_SIZE", 256),
+            cache_ttl=self.config.get("RAG_CACHE_TTL", 3600),
+            lexical_index=lexical_index,
+            candidates=self.config.get("RAG_HYBRID_CANDIDATES", 20),
+            rrf_k=self.config.get("RAG_RRF_K", 60),
+        )
+        metrics = self.get_metrics()
+        metrics.cache_hit_ratio.labels("rag_query_embedding").set_function(
+            retriever.embedding_cache.hit_rate
+        )
+        metrics.cache_hit_ratio.labels("rag_retrieval").set_function(
+            retriever.result_cache.hit_rate
+        )
+        return retriever
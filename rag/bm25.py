@@ -0,0 +1,177 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+from rag.chunk import Chunk
+
+# numbers with their decimal or thousands separators ("4.50", "1,200"), or words
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,:]\d+)*|[^\W\d_]+")
+# Chinese, Japanese and Korean have no spaces between words: each character is a term
+CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+
+def tokenize(text: str) -> List[str]:
+    """The terms of a text for the lexical index: lowercase words and numbers, and single CJK characters."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if CJK_PATTERN.search(token):
+            terms.extend(part for part in CJK_PATTERN.split(token) if part)
+            terms.extend(CJK_PATTERN.findall(token))
+        else:
+            terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """
+    An in-memory inverted index of the RAG chunks, scored with Okapi BM25.
+    It matches the exact words of a question (menu items, prices, addresses, names), which embeddings often miss,
+    and is fused with the vector search by the `Retriever`.
+
+    It has the same `count`, `ids`, `upsert`, `delete`, `persist` and `query` methods as the vector stores, so the
+    indexer keeps it in sync with them. It is saved as one JSON file next to the vector index and loaded at start-up,
+    so nothing is tokenized again. Changes are kept in memory until `persist`.
+
+    Attributes:
+        path (str): The JSON file of the index.
+        k1 (float): The term frequency saturation.
+        b (float): How much the chunk length normalizes the term frequency.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        """
+        Opens (or creates) the index.
+
+        Parameters:
+            path (str): The JSON file of the index.
+            k1 (float): The term frequency saturation.
+            b (float): How much the chunk length normalizes the term frequency.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        # chunk id -> text, metadata and length in terms
+        self._texts: Dict[str, str] = {}
+        self._metadatas: Dict[str, Dict] = {}
+        self._lengths: Dict[str, int] = {}
+        # term -> {chunk id: term frequency}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading the BM25 index, rebuilding it: {e}")
+            return
+        if data.get("version") != self.FORMAT_VERSION:
+            return
+        self._texts = data["texts"]
+        self._metadatas = data["metadatas"]
+        self._lengths = data["lengths"]
+        self._postings = data["postings"]
+        self._total_length = sum(self._lengths.values())
+
+    def count(self) -> int:
+        return len(self._texts)
+
+    def ids(self) -> List[str]:
+        """The ids of all the chunks in the index."""
+        return list(self._texts)
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings,
+        texts: Sequence[str],
+        metadatas: Sequence[Dict],
+    ) -> None:
+        """Add or replace chunks. The embeddings are ignored, they are only taken to match the vector stores."""
+        self.delete([cid for cid in ids if cid in self._texts])
+        for cid, text, metadata in zip(ids, texts, metadatas):
+            terms = Counter(tokenize(text))
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[cid] = frequency
+            length = sum(terms.values())
+            self._texts[cid] = text
+            self._metadatas[cid] = dict(metadata)
+            self._lengths[cid] = length
+            self._total_length += length
+            self._dirty = True
+
+    def delete(self, ids: Sequence[str]) -> None:
+        for cid in ids:
+            text = self._texts.pop(cid, None)
+            if text is None:
+                continue
+            # the terms of the chunk are found again from its text, so no forward index is kept
+            for term in set(tokenize(text)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(cid, None)
+                    if not postings:
+                        del self._postings[term]
+            self._metadatas.pop(cid, None)
+            self._total_length -= self._lengths.pop(cid, 0)
+            self._dirty = True
+
+    def persist(self) -> None:
+        """Write the changes to disk."""
+        if not self._dirty:
+            return
+        # write then rename, so a crash never leaves a half written index
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": self.FORMAT_VERSION,
+                    "texts": self._texts,
+                    "metadatas": self._metadatas,
+                    "lengths": self._lengths,
+                    "postings": self._postings,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def query(self, text: str, k: int) -> List[Tuple[Chunk, float]]:
+        """
+        Find the chunks that best match the words of a question.
+
+        Parameters:
+            text (str): The question.
+            k (int): The maximum number of chunks to return.
+
+        Returns:
+            List[Tuple[Chunk, float]]: The chunks that share at least one term with the question, and their BM25 score, best first.
+        """
+        n_chunks = len(self._texts)
+        if not n_chunks or k <= 0:
+            return []
+        average_length = self._total_length / n_chunks or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+            for cid, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[cid] / average_length)
+                scores[cid] = scores.get(cid, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            (Chunk(page_content=self._texts[cid], metadata=dict(self._metadatas[cid])), score)
+            for cid, score in best
+        ]
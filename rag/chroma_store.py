@@ -0,0 +1,94 @@
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from rag.chunk import Chunk
+
+
+class ChromaStore:
+    """
+    A persistent chromadb collection holding the chunks of the RAG index with their embeddings.
+    The embeddings are computed by the caller, so each chunk is embedded once, and the collection is opened
+    from disk at start-up instead of being rebuilt.
+
+    Attributes:
+        index_dir (str): The directory of the chromadb database.
+    """
+
+    def __init__(self, index_dir: str, collection_name: str = "rag"):
+        """
+        Opens (or creates) the collection.
+
+        Parameters:
+            index_dir (str): The directory of the chromadb database.
+            collection_name (str): The name of the collection.
+        """
+        import chromadb
+        from chromadb.config import Settings
+
+        self.index_dir = index_dir
+        self._client = chromadb.PersistentClient(
+            path=index_dir, settings=Settings(anonymized_telemetry=False)
+        )
+        # cosine distance, so scores are comparable between queries
+        self._collection = self._client.get_or_create_collection(
+            collection_name, metadata={"hnsw:space": "cosine"}
+        )
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def ids(self) -> List[str]:
+        """The ids of all the chunks in the store."""
+        return self._collection.get(include=[])["ids"]
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        texts: Sequence[str],
+        metadatas: Sequence[Dict],
+    ) -> None:
+        if not ids:
+            return
+        # chromadb limits the size of a single write
+        batch_size = self._client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self._collection.upsert(
+                ids=list(ids[start:end]),
+                embeddings=np.asarray(embeddings[start:end], dtype=np.float32),
+                documents=list(texts[start:end]),
+                metadatas=list(metadatas[start:end]),
+            )
+
+    def delete(self, ids: Sequence[str]) -> None:
+        batch_size = self._client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            self._collection.delete(ids=list(ids[start : start + batch_size]))
+
+    def persist(self) -> None:
+        """Nothing to do, chromadb writes every change to disk."""
+
+    def query(self, embedding: Sequence[float], k: int) -> List[Tuple[Chunk, float]]:
+        """
+        Find the chunks closest to an embedding.
+
+        Parameters:
+            embedding (Sequence[float]): The query embedding.
+            k (int): The number of chunks to return.
+
+        Returns:
+            List[Tuple[Chunk, float]]: The chunks and their cosine similarity to the query, best first.
+        """
+        if self.count() == 0:
+            return []
+        result = self._collection.query(
+            query_embeddings=[np.asarray(embedding, dtype=np.float32)],
+            n_results=min(k, self.count()),
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            (Chunk(page_content=text, metadata=dict(metadata or {})), 1.0 - distance)
+            for text, metadata, distance in zip(
+                result["documents"][0], result["metadatas"][0], result["distances"][0]
+            )
+        ]
@@ -0,0 +1,17 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+
+@dataclass
+class Chunk:
+    """
+    A piece of a document in the RAG index.
+    It has the same `page_content` and `metadata` fields as a langchain `Document`, so the code that formats the context doesn't change.
+
+    Attributes:
+        page_content (str): The text of the chunk.
+        metadata (dict): Where the chunk comes from (`source`), and the retrieval `score` once retrieved.
+    """
+
+    page_content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
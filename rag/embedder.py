@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence
+from utils.ollama_client import OllamaClient
+
+
+class OllamaEmbedder:
+    """
+    Embeds texts with an Ollama server, for RAG ingestion and queries.
+    Documents are sent in batches to `/api/embed` (one request embeds a whole batch), with a bounded number of batches
+    in flight at once. Servers older than `/api/embed` get one `/api/embeddings` request per text instead.
+    It has the `embed_documents` and `embed_query` methods of a langchain embeddings model.
+
+    Attributes:
+        client (OllamaClient): The pooled client of the Ollama server, usually shared with the chat.
+        model (str): The embedding model.
+        batch_size (int): The number of texts per request.
+        concurrency (int): The maximum number of requests in flight.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        base_url: str = "http://localhost:11434",
+        batch_size: int = 32,
+        concurrency: int = 4,
+        timeout: float = 120,
+        on_progress: Callable[[int, int, float], None] | None = None,
+        client: OllamaClient | None = None,
+    ):
+        """
+        Initializes the embedder.
+
+        Parameters:
+            model (str): The embedding model.
+            base_url (str): The URL of the Ollama server.
+            batch_size (int): The number of texts per request.
+            concurrency (int): The maximum number of requests in flight.
+            timeout (float): The timeout of a request, in seconds.
+            on_progress (Callable[[int, int, float], None], optional): Called after each batch with the number of
+                texts embedded, the total and the seconds elapsed. Defaults to printing the progress.
+            client (OllamaClient, optional): A shared client of the server. Without it, the embedder has its own.
+        """
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.on_progress = on_progress if on_progress is not None else self._print_progress
+        # the connection pool must hold every request in flight
+        self.client = client if client is not None else OllamaClient(
+            base_url, pool_size=self.concurrency, timeout=timeout
+        )
+
+    @staticmethod
+    def _print_progress(done: int, total: int, elapsed: float) -> None:
+        print(
+            f"Embedded {done}/{total} chunks ({done / max(elapsed, 1e-9):.1f} chunks/s)"
+        )
+
+    def _embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        return self.client.embed(self.model, texts)
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Embed texts in batches, several batches at a time.
+
+        Parameters:
+            texts (Sequence[str]): The texts to embed.
+
+        Returns:
+            List[List[float]]: The embeddings, in the order of the texts.
+        """
+        if not texts:
+            return []
+        batches = [
+            texts[start : start + self.batch_size]
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        start_time = time.time()
+        done = [0]
+        lock = threading.Lock()
+
+        def _run(batch: Sequence[str]) -> List[List[float]]:
+            embeddings = self._embed_batch(batch)
+            if len(embeddings) != len(batch):
+                raise ValueError(
+                    f"Expected {len(batch)} embeddings from the server, got {len(embeddings)}"
+                )
+            with lock:
+                done[0] += len(batch)
+                self.on_progress(done[0], len(texts), time.time() - start_time)
+            return embeddings
+
+        if len(batches) == 1 or self.concurrency == 1:
+            results = [_run(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.concurrency, len(batches)),
+                thread_name_prefix="embed",
+            ) as executor:
+                # map keeps the order of the batches
+                results = list(executor.map(_run, batches))
+        return [embedding for batch in results for embedding in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed one text, like a question."""
+        return self._embed_batch([text])[0]
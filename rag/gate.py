@@ -0,0 +1,102 @@
+import threading
+from typing import Iterable, List, Tuple
+from rag.retriever import normalize_query
+
+# a question made only of these phrases is small talk ("ok, thanks, bye")
+SMALL_TALK_PHRASES = frozenset(
+    phrase.strip()
+    for phrase in """
+    hi | hello | hey | hiya | yo | hi there | hello there | hey there | hello everyone | hi everyone
+    good morning | good afternoon | good evening | good night | good day | morning | evening
+    thanks | thank you | thx | thanks so much | thank you so much | thanks a lot | thank you very much | thanks again
+    ok | okay | k | alright | all right | sure | fine | cool | nice | great | awesome | perfect | wonderful
+    yes | yeah | yep | yup | no | nope | nah | not really | maybe
+    bye | goodbye | bye bye | see you | see you later | see ya | later | cya | take care
+    wow | oh | ah | hmm | haha | lol | please | sorry | oh no | oh wow
+    how are you | how are you doing | how's it going | hows it going | what's up | whats up | sup
+    i'm fine | im fine | i'm good | im good | i am fine | i am good | me too | you too
+    """.replace("\n", "|").split("|")
+) - {""}
+
+
+class RetrievalGate:
+    """
+    Decides, before the RAG lookup, whether a question needs the documents at all.
+    Small talk ("hi", "thanks", "ok bye") skips the retrieval and the context block of the prompt, so the turn goes
+    straight to the LLM with a short prompt.
+
+    Two checks, cheapest first:
+    - rules: a question made only of small-talk phrases is skipped. Whole phrases are matched, so "what's up" is small
+      talk but "what's good?" is retrieved;
+    - a similarity floor (off at 0): the question is skipped when even its closest chunk is less similar than
+      `min_similarity`. It uses the retriever's cached query embedding, which the retrieval then reuses.
+      Only the vector similarity is checked, so the floor must be set for the embedding model in use.
+
+    Attributes:
+        retriever (Retriever): The retriever of the RAG index.
+        min_similarity (float): The similarity floor, 0 to only use the rules.
+        small_talk_phrases (frozenset): The phrases of small talk, lowercase.
+        skipped (int): The questions that skipped retrieval.
+        retrieved (int): The questions that went through retrieval.
+    """
+
+    def __init__(
+        self,
+        retriever,
+        min_similarity: float = 0.0,
+        small_talk_phrases: Iterable[str] = SMALL_TALK_PHRASES,
+    ):
+        self.retriever = retriever
+        self.min_similarity = min_similarity
+        self.small_talk_phrases = frozenset(" ".join(phrase.split()) for phrase in small_talk_phrases) - {""}
+        self._longest_phrase = max((len(phrase.split()) for phrase in self.small_talk_phrases), default=0)
+        self.skipped = 0
+        self.retrieved = 0
+        self._lock = threading.Lock()
+
+    def skip_rate(self) -> float:
+        """The ratio of questions that skipped retrieval, 0 before the first question."""
+        total = self.skipped + self.retrieved
+        return self.skipped / total if total else 0.0
+
+    def _is_small_talk(self, words: List[str]) -> bool:
+        # whether the words split into small-talk phrases: ends[i] is True when words[:i] does
+        ends = [True] + [False] * len(words)
+        for end in range(1, len(words) + 1):
+            ends[end] = any(
+                ends[start] and " ".join(words[start:end]) in self.small_talk_phrases
+                for start in range(max(0, end - self._longest_phrase), end)
+            )
+        return ends[-1]
+
+    def _decide(self, query: str) -> Tuple[bool, str]:
+        words = [word.strip(".?!") for word in normalize_query(query).replace(",", " ").split()]
+        words = [word for word in words if word]
+        if not words:
+            return False, "empty"
+        if self._is_small_talk(words):
+            return False, "small_talk"
+        if self.min_similarity > 0:
+            best = self.retriever.store.query(self.retriever.embed_query(query), 1)
+            if not best or best[0][1] < self.min_similarity:
+                return False, "low_similarity"
+        return True, "retrieve"
+
+    def decide(self, query: str) -> Tuple[bool, str]:
+        """
+        Decide whether a question needs retrieval.
+
+        Parameters:
+            query (str): The question.
+
+        Returns:
+            Tuple[bool, str]: True if the documents should be retrieved, and the reason
+                ("retrieve", "small_talk", "low_similarity" or "empty").
+        """
+        needed, reason = self._decide(query)
+        with self._lock:
+            if needed:
+                self.retrieved += 1
+            else:
+                self.skipped += 1
+        return needed, reason
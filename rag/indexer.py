@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+from rag.chunk import Chunk
+
+
+def file_sha256(path: str) -> str:
+    """The sha256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, text: str) -> str:
+    """The id of a chunk in the store: the hash of its content, prefixed by the hash of its file."""
+    return (
+        hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+        + "-"
+        + hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+    )
+
+
+@dataclass
+class SyncStats:
+    """What a sync of the index changed."""
+
+    files_changed: int = 0
+    files_unchanged: int = 0
+    files_removed: int = 0
+    chunks_embedded: int = 0
+    chunks_removed: int = 0
+    chunks_total: int = 0
+    seconds: float = 0.0
+    embed_seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        """The embedding throughput."""
+        return self.chunks_embedded / self.embed_seconds if self.embed_seconds else 0.0
+
+
+class RagIndexer:
+    """
+    Keeps a persistent RAG index in sync with the documents folder.
+
+    A manifest next to the index records the sha256 of every file and the ids of its chunks. On sync, unchanged files
+    are skipped without being read by the document loader. Changed files are split again, and only the chunks whose
+    content hash is new are embedded; chunks that are gone (edited or deleted files) are purged from the store.
+    The index directory is specific to the embedding model, so switching models never mixes vectors.
+    An optional lexical index (`BM25Index`) is kept in sync with the store; it never needs embeddings, so chunks
+    missing only from it are added back without calling the embedding model.
+
+    Attributes:
+        data_dir (str): The folder of the documents.
+        store: The vector store (`upsert`, `delete`, `ids`, `persist`).
+        embeddings: The embedding model (`embed_documents`).
+        embed_model (str): The name of the embedding model, recorded in the manifest.
+        manifest_path (str): The path of the manifest.
+        lexical_index: The lexical index (`upsert`, `delete`, `ids`, `persist`), or None.
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(
+        self,
+        data_dir: str,
+        store,
+        embeddings,
+        embed_model: str,
+        manifest_path: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        lexical_index=None,
+    ):
+        self.data_dir = data_dir
+        self.store = store
+        self.embeddings = embeddings
+        self.embed_model = embed_model
+        self.manifest_path = manifest_path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.lexical_index = lexical_index
+        self.manifest = self._load_manifest()
+
+    @property
+    def corpus_version(self) -> str:
+        """A hash of all the chunk ids in the index. It changes whenever the indexed content changes."""
+        return self.manifest.get("corpus_version", "")
+
+    def _load_manifest(self) -> dict:
+        empty = {
+            "version": self.MANIFEST_VERSION,
+            "embed_model": self.embed_model,
+            "corpus_version": "",
+            "files": {},
+        }
+        if not os.path.exists(self.manifest_path):
+            return empty
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading the RAG manifest, re-indexing everything: {e}")
+            return empty
+        if (
+            manifest.get("version") != self.MANIFEST_VERSION
+            or manifest.get("embed_model") != self.embed_model
+        ):
+            return empty
+        return manifest
+
+    def _save_manifest(self) -> None:
+        chunk_ids = sorted(
+            chunk
+            for entry in self.manifest["files"].values()
+            for chunk in entry["chunks"]
+        )
+        self.manifest["corpus_version"] = hashlib.sha256(
+            "\n".join(chunk_ids).encode("utf-8")
+        ).hexdigest()[:16]
+        # write then rename, so a crash never leaves a half written manifest
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _list_files(self) -> Dict[str, str]:
+        """The documents to index, by path relative to the data folder. Hidden files are skipped, like DirectoryLoader does."""
+        files = {}
+        for root, dirs, names in os.walk(self.data_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(names):
+                if name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, self.data_dir)] = path
+        return files
+
+    def _split_file(self, path: str, source: str) -> List[Chunk]:
+        from langchain_community.document_loaders import UnstructuredFileLoader
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        docs = UnstructuredFileLoader(path).load()
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+        )
+        return [
+            Chunk(page_content=doc.page_content, metadata={"source": source})
+            for doc in text_splitter.split_documents(docs)
+        ]
+
+    def sync(self) -> SyncStats:
+        """
+        Bring the index up to date with the documents folder.
+
+        Returns:
+            SyncStats: What changed.
+        """
+        start_time = time.time()
+        stats = SyncStats()
+        indexed_files: Dict[str, dict] = self.manifest["files"]
+        current_files = self._list_files()
+        store_ids = set(self.store.ids())
+        lexical_ids = (
+            set(self.lexical_index.ids()) if self.lexical_index is not None else store_ids
+        )
+
+        new_chunks: Dict[str, Chunk] = {}
+        # chunks to add to the lexical index only
+        lexical_chunks: Dict[str, Chunk] = {}
+        stale_ids = set()
+        for source, path in current_files.items():
+            sha256 = file_sha256(path)
+            entry = indexed_files.get(source)
+            # a file is re-indexed if it changed, or if the store or the lexical index lost some of its chunks
+            if (
+                entry is not None
+                and entry["sha256"] == sha256
+                and store_ids.issuperset(entry["chunks"])
+                and lexical_ids.issuperset(entry["chunks"])
+            ):
+                stats.files_unchanged += 1
+                continue
+            stats.files_changed += 1
+            old_ids = set(entry["chunks"]) if entry is not None else set()
+            chunk_ids = {}
+            for chunk in self._split_file(path, source):
+                cid = chunk_id(source, chunk.page_content)
+                if cid in chunk_ids:
+                    continue
+                chunk_ids[cid] = None
+                if cid not in old_ids or cid not in store_ids:
+                    new_chunks[cid] = chunk
+                elif cid not in lexical_ids:
+                    lexical_chunks[cid] = chunk
+            stale_ids |= old_ids - chunk_ids.keys()
+            chunk_ids = list(chunk_ids)
+            indexed_files[source] = {"sha256": sha256, "chunks": chunk_ids}
+
+        for source in list(indexed_files):
+            if source not in current_files:
+                stats.files_removed += 1
+                stale_ids |= set(indexed_files.pop(source)["chunks"])
+
+        if new_chunks:
+            ids = list(new_chunks)
+            texts = [new_chunks[cid].page_content for cid in ids]
+            print(f"Embedding {len(ids)} new or changed chunks...")
+            embed_start_time = time.time()
+            embeddings = self.embeddings.embed_documents(texts)
+            stats.embed_seconds = time.time() - embed_start_time
+            self.store.upsert(
+                ids, embeddings, texts, [new_chunks[cid].metadata for cid in ids]
+            )
+            stats.chunks_embedded = len(ids)
+        lexical_chunks.update(new_chunks)
+        if self.lexical_index is not None and lexical_chunks:
+            ids = list(lexical_chunks)
+            self.lexical_index.upsert(
+                ids,
+                None,
+                [lexical_chunks[cid].page_content for cid in ids],
+                [lexical_chunks[cid].metadata for cid in ids],
+            )
+
+        # also drop what a previous, interrupted sync may have left behind
+        known_ids = {
+            cid for entry in indexed_files.values() for cid in entry["chunks"]
+        }
+        stale_ids |= store_ids - known_ids
+        self.store.delete(sorted(stale_ids))
+        stats.chunks_removed = len(stale_ids)
+        stats.chunks_total = len(known_ids)
+        self.store.persist()
+        if self.lexical_index is not None:
+            self.lexical_index.delete(sorted(stale_ids | (lexical_ids - known_ids)))
+            self.lexical_index.persist()
+
+        if stats.files_changed or stats.files_removed or stale_ids:
+            self._save_manifest()
+        stats.seconds = time.time() - start_time
+        return stats
@@ -0,0 +1,175 @@
+import json
+import os
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from rag.chunk import Chunk
+
+
+class NumpyStore:
+    """
+    An in-process vector store for the RAG index: the normalized embeddings live in one `.npy` matrix that is
+    memory-mapped at start-up, and the chunks (ids, texts, metadata) in a JSON side table.
+    A query is a matrix-vector product over all the chunks and an `argpartition` for the top k, which is
+    faster than a vector database for the few thousand (up to a few hundred thousand) chunks of a knowledge base.
+
+    It has the same methods as `ChromaStore`. Changes are kept in memory until `persist`.
+
+    Attributes:
+        index_dir (str): The directory of the store.
+        dtype (np.dtype): The type of the stored embeddings, float16 halves the size of the index.
+    """
+
+    EMBEDDINGS_FILE = "embeddings.npy"
+    CHUNKS_FILE = "chunks.json"
+    # rows per block when a float16 matrix is converted for the product
+    QUERY_BLOCK_ROWS = 16384
+
+    def __init__(self, index_dir: str, dtype: str = "float32"):
+        """
+        Opens (or creates) the store.
+
+        Parameters:
+            index_dir (str): The directory of the store.
+            dtype (str): "float32" or "float16".
+        """
+        self.index_dir = index_dir
+        self.dtype = np.dtype(dtype)
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._matrix: np.ndarray | None = None
+        self._dirty = False
+        os.makedirs(index_dir, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        embeddings_path = os.path.join(self.index_dir, self.EMBEDDINGS_FILE)
+        chunks_path = os.path.join(self.index_dir, self.CHUNKS_FILE)
+        if not (os.path.exists(embeddings_path) and os.path.exists(chunks_path)):
+            return
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+        matrix = np.load(embeddings_path, mmap_mode="r")
+        if matrix.dtype != self.dtype or len(matrix) != len(table["ids"]):
+            # written with another dtype, or half written: start over, the indexer embeds everything again
+            print("The NumPy RAG store doesn't match its side table, rebuilding it.")
+            return
+        self._ids = table["ids"]
+        self._texts = table["texts"]
+        self._metadatas = table["metadatas"]
+        self._matrix = matrix
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def ids(self) -> List[str]:
+        """The ids of all the chunks in the store."""
+        return list(self._ids)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        texts: Sequence[str],
+        metadatas: Sequence[Dict],
+    ) -> None:
+        if not ids:
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32)).astype(self.dtype)
+        positions = {cid: index for index, cid in enumerate(self._ids)}
+        # copy out of the memory map before changing it
+        matrix = (
+            np.array(self._matrix)
+            if self._matrix is not None and len(self._matrix)
+            else np.empty((0, vectors.shape[1]), dtype=self.dtype)
+        )
+        new_rows = []
+        for row, cid in enumerate(ids):
+            index = positions.get(cid)
+            if index is None:
+                positions[cid] = len(self._ids)
+                self._ids.append(cid)
+                self._texts.append(texts[row])
+                self._metadatas.append(dict(metadatas[row]))
+                new_rows.append(row)
+            else:
+                matrix[index] = vectors[row]
+                self._texts[index] = texts[row]
+                self._metadatas[index] = dict(metadatas[row])
+        self._matrix = np.concatenate([matrix, vectors[new_rows]])
+        self._dirty = True
+
+    def delete(self, ids: Sequence[str]) -> None:
+        if not ids or self._matrix is None:
+            return
+        removed = set(ids)
+        keep = [index for index, cid in enumerate(self._ids) if cid not in removed]
+        if len(keep) == len(self._ids):
+            return
+        self._matrix = np.array(self._matrix[keep])
+        self._ids = [self._ids[index] for index in keep]
+        self._texts = [self._texts[index] for index in keep]
+        self._metadatas = [self._metadatas[index] for index in keep]
+        self._dirty = True
+
+    def persist(self) -> None:
+        """Write the changes to disk, then memory-map the new matrix."""
+        if not self._dirty:
+            return
+        embeddings_path = os.path.join(self.index_dir, self.EMBEDDINGS_FILE)
+        chunks_path = os.path.join(self.index_dir, self.CHUNKS_FILE)
+        matrix = self._matrix if self._matrix is not None else np.empty((0, 0), self.dtype)
+        # write then rename. The matrix goes first: a crash between the two renames leaves a mismatch, which _load detects.
+        with open(embeddings_path + ".tmp", "wb") as f:
+            np.save(f, matrix)
+        with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(embeddings_path + ".tmp", embeddings_path)
+        os.replace(chunks_path + ".tmp", chunks_path)
+        self._matrix = np.load(embeddings_path, mmap_mode="r")
+        self._dirty = False
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return self._matrix @ query
+        # numpy has no fast float16 product: convert block by block, so memory stays bounded
+        scores = np.empty(len(self._matrix), dtype=np.float32)
+        for start in range(0, len(self._matrix), self.QUERY_BLOCK_ROWS):
+            block = self._matrix[start : start + self.QUERY_BLOCK_ROWS]
+            scores[start : start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def query(self, embedding: Sequence[float], k: int) -> List[Tuple[Chunk, float]]:
+        """
+        Find the chunks closest to an embedding.
+
+        Parameters:
+            embedding (Sequence[float]): The query embedding.
+            k (int): The number of chunks to return.
+
+        Returns:
+            List[Tuple[Chunk, float]]: The chunks and their cosine similarity to the query, best first.
+        """
+        if not self._ids or k <= 0:
+            return []
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        scores = self._scores(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (
+                Chunk(page_content=self._texts[index], metadata=dict(self._metadatas[index])),
+                float(scores[index]),
+            )
+            for index in top
+        ]
@@ -0,0 +1,124 @@
+import re
+from typing import Callable, Dict, List, Tuple
+from rag.chunk import Chunk
+from utils.ttl_cache import TTLCache
+
+
+def normalize_query(query: str) -> str:
+    """The cache key of a question: lowercase, single spaces, without the punctuation around it."""
+    return re.sub(r"\s+", " ", query).strip(" \t\n.?!,;:。？！，").lower()
+
+
+class Retriever:
+    """
+    Finds the chunks of the RAG index that are relevant to a question.
+    It has the same `invoke(query)` method as a langchain retriever.
+
+    Repeated questions are answered from two caches, keyed by the normalized question: the query embeddings
+    (which skip the round-trip to the embedding server) and the retrieved chunks. The chunk cache is also keyed
+    by the version of the index, so it never serves chunks from an older index.
+
+    With a lexical index, the search is hybrid: the `candidates` best chunks of the vector search and of the BM25
+    search are fused by reciprocal rank fusion (each list adds 1 / (rrf_k + rank) to a chunk's score), so a chunk
+    that matches the exact words of the question ranks high even when its embedding is not the closest.
+    The fused ranking is more precise, so a smaller `k` (a shorter prompt) usually keeps the right chunk.
+
+    Attributes:
+        store: The vector store (`query`).
+        embeddings: The embedding model (`embed_query`).
+        k (int): The number of chunks to return.
+        lexical_index: The lexical index (`query`), or None for a vector-only search.
+        candidates (int): The number of chunks taken from each search before the fusion.
+        rrf_k (int): The rank constant of the fusion. Lower values favor the chunks at the top of either list.
+        embedding_cache (TTLCache): The query embeddings.
+        result_cache (TTLCache): The retrieved chunks.
+    """
+
+    def __init__(
+        self,
+        store,
+        embeddings,
+        k: int = 4,
+        index_version: Callable[[], str] = lambda: "",
+        cache_size: int = 256,
+        cache_ttl: float = 3600,
+        lexical_index=None,
+        candidates: int = 20,
+        rrf_k: int = 60,
+    ):
+        """
+        Initializes the retriever.
+
+        Parameters:
+            store: The vector store (`query`).
+            embeddings: The embedding model (`embed_query`).
+            k (int): The number of chunks to return.
+            index_version (Callable[[], str]): Returns the current version of the index.
+            cache_size (int): The maximum number of questions in each cache. 0 to disable the caches.
+            cache_ttl (float): Seconds a cached question stays valid. 0 for no expiry.
+            lexical_index: The lexical index (`query`), or None for a vector-only search.
+            candidates (int): The number of chunks taken from each search before the fusion.
+            rrf_k (int): The rank constant of the fusion.
+        """
+        self.store = store
+        self.embeddings = embeddings
+        self.k = k
+        self.index_version = index_version
+        self.embedding_cache = TTLCache(cache_size, cache_ttl)
+        self.result_cache = TTLCache(cache_size, cache_ttl)
+        self.lexical_index = lexical_index
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def embed_query(self, query: str) -> List[float]:
+        """The embedding of a question, from the cache if it was asked before."""
+        key = normalize_query(query)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+            self.embedding_cache.put(key, embedding)
+        return embedding
+
+    def _search(self, query: str) -> List[Tuple[str, Dict]]:
+        """The texts and metadata of the best chunks, with their scores in the metadata."""
+        if self.lexical_index is None:
+            return [
+                (chunk.page_content, {**chunk.metadata, "score": score})
+                for chunk, score in self.store.query(self.embed_query(query), self.k)
+            ]
+        candidates = max(self.candidates, self.k)
+        fused: Dict[Tuple[str, str], Dict] = {}
+        for name, results in (
+            ("vector_score", self.store.query(self.embed_query(query), candidates)),
+            ("bm25_score", self.lexical_index.query(query, candidates)),
+        ):
+            for rank, (chunk, score) in enumerate(results, start=1):
+                # the chunk ids are hashes of the source and the text, so these identify a chunk
+                key = (chunk.metadata.get("source", ""), chunk.page_content)
+                metadata = fused.setdefault(key, {**chunk.metadata, "score": 0.0})
+                metadata["score"] += 1.0 / (self.rrf_k + rank)
+                metadata[name] = score
+        best = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)
+        return [(text, metadata) for (_, text), metadata in best[: self.k]]
+
+    def invoke(self, query: str) -> List[Chunk]:
+        """
+        Retrieve the chunks most relevant to the query, best first. Each chunk gets its similarity in `metadata["score"]`,
+        or, with a lexical index, its fused score (and its `vector_score` and `bm25_score` when it was found by that search).
+
+        Parameters:
+            query (str): The question.
+
+        Returns:
+            List[Chunk]: The retrieved chunks.
+        """
+        key = (self.index_version(), self.k, normalize_query(query))
+        cached = self.result_cache.get(key)
+        if cached is None:
+            cached = self._search(query)
+            self.result_cache.put(key, cached)
+        # copies, so the caller can't change the cached chunks
+        return [
+            Chunk(page_content=text, metadata=dict(metadata))
+            for text, metadata in cached
+        ]
@@ -0,0 +1,64 @@
+# Latency report of the spans written by utils/tracing.py (TRACE_ON in conf.yaml).
+# Run from the project root: python scripts/trace_report.py [./logs/trace.jsonl] [--session SESSION_ID]
+
+import argparse
+import glob
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+
+
+def read_spans(trace_file: str):
+    """Read the spans from the trace file and its rotated backups (trace.jsonl.1, trace.jsonl.2...)."""
+    paths = [trace_file] + sorted(glob.glob(f"{glob.escape(trace_file)}.*"))
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line may be cut short if the process was killed
+                    continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency percentiles per span of a trace file.")
+    parser.add_argument("trace_file", nargs="?", default="./logs/trace.jsonl")
+    parser.add_argument("--session", help="Only report the spans of this session.")
+    args = parser.parse_args()
+
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    turns = set()
+    for span in read_spans(args.trace_file):
+        if args.session and span.get("session_id") != args.session:
+            continue
+        durations[span["span"]].append(span["duration_ms"])
+        if "error" in span:
+            errors[span["span"]] += 1
+        turns.add((span.get("session_id"), span.get("turn_id")))
+
+    if not durations:
+        print(f"No spans found in {args.trace_file}")
+        return
+
+    print(f"{len(turns)} turns\n")
+    print(f"{'span':<16}{'count':>8}{'errors':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for name in sorted(durations):
+        values = np.array(durations[name])
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(
+            f"{name:<16}{len(values):>8}{errors[name]:>8}"
+            f"{p50:>12.1f}{p95:>12.1f}{p99:>12.1f}{values.max():>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,19 @@ import yaml
 import json
 import numpy as np
 import asyncio
+import time
 from fastapi import FastAPI, WebSocket, APIRouter, Body
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.websockets import WebSocketDisconnect
 from typing import List, Dict
 from main import OpenLLMVTuberMain
-from live2d_model import Live2dModel
+from model_registry import ModelRegistry
+from session_pool import SessionPool
 from tts.stream_audio import AudioPayloadPreparer
+from utils.metrics import ConversationMetrics
+from utils.pcm_buffer import PCMBuffer
+from utils.websocket_sender import WebSocketSender
 
 
 class WebSocketServer:
@@ -24,6 +30,9 @@ class WebSocketServer:
         router (APIRouter): APIRouter instance for routing.
         connected_clients (List[WebSocket]): List of connected WebSocket clients for "/client-ws".
         server_ws_clients (List[WebSocket]): List of connected WebSocket clients for "/server-ws".
+        model_registry (ModelRegistry): The heavy models (ASR, TTS, RAG, Live2D) shared by all "/client-ws" sessions.
+        session_pool (SessionPool): Pre-built sessions handed out to new "/client-ws" connections.
+        metrics (ConversationMetrics): The metrics served on "/metrics".
     """
 
     def __init__(self, open_llm_vtuber_config: Dict | None = None):
@@ -35,8 +44,26 @@ class WebSocketServer:
         self.new_connected_clients: List[WebSocket] = []
         self.connected_clients: List[WebSocket] = []
         self.server_ws_clients: List[WebSocket] = []
-        self.open_llm_vtuber: OpenLLMVTuberMain | None = None
         self.open_llm_vtuber_config: Dict | None = open_llm_vtuber_config
+        self.model_registry: ModelRegistry | None = None
+        self.session_pool: SessionPool | None = None
+        self.metrics: ConversationMetrics | None = None
+        self._senders: set[WebSocketSender] = set()
+        if open_llm_vtuber_config is not None:
+            self.model_registry = ModelRegistry(open_llm_vtuber_config)
+            self.session_pool = SessionPool(
+                open_llm_vtuber_config,
+                self.model_registry,
+                size=open_llm_vtuber_config.get("SESSION_POOL_SIZE", 2),
+            )
+            self.metrics = self.model_registry.get_metrics()
+            self.metrics.gauge(
+                "vtuber_session_pool_ready", "Pre-built sessions ready for new connections."
+            ).set_function(self.session_pool.qsize)
+            self.metrics.gauge(
+                "vtuber_outbound_queue_depth",
+                "Messages queued for the clients and not sent yet, over all connections.",
+            ).set_function(lambda: sum(sender.qsize() for sender in list(self._senders)))
         self._setup_routes()
         self._mount_static_files()
 
@@ -84,113 +111,217 @@ class WebSocketServer:
         @self.router.websocket("/client-ws")
         async def websocket_endpoint(websocket: WebSocket):
             await websocket.accept()
-            await websocket.send_text(
-                json.dumps({"type": "full-text", "text": "Connection established"})
-            )
-
-            self.connected_clients.append(websocket)
-            print("Connection established")
-            l2d = Live2dModel(self.open_llm_vtuber_config["LIVE2D_MODEL"])
-            self.open_llm_vtuber = OpenLLMVTuberMain(self.open_llm_vtuber_config)
-            audio_payload_preparer = AudioPayloadPreparer()
-
-            def _play_audio_file(sentence: str | None, filepath: str | None) -> None:
-                if filepath is None:
-                    print("No audio to be streamed. Response is empty.")
-                    return
-
-                if sentence is None:
-                    sentence = ""
-                print(f">> Playing {filepath}...")
-                payload, duration = audio_payload_preparer.prepare_audio_payload(
-                    audio_path=filepath,
-                    display_text=sentence,
-                    expression_list=l2d.extract_emotion(sentence),
-                )
-                print("Payload send.")
-
-                async def _send_audio():
-                    await websocket.send_text(json.dumps(payload))
-                    await asyncio.sleep(duration)
-
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                new_loop.run_until_complete(_send_audio())
-                new_loop.close()
-
-                print("Audio played.")
-
-            self.open_llm_vtuber.set_audio_output_func(_play_audio_file)
+            # every message to this client goes through the sender, so they are delivered in order
+            sender = WebSocketSender(websocket)
+            open_llm_vtuber: OpenLLMVTuberMain | None = None
+            welcome_task = None
+            conversation_task = None
+            try:
+                sender.start()
+                self._senders.add(sender)
+                self.metrics.active_sessions.inc()
+                await sender.send_json({"type": "full-text", "text": "Connection established"})
+
+                self.connected_clients.append(websocket)
+                print("Connection established")
+                l2d = self.model_registry.get_live2d()
+                open_llm_vtuber = await asyncio.to_thread(self.session_pool.acquire)
+                audio_payload_preparer = AudioPayloadPreparer()
+
+                def _play_audio_file(
+                    sentence: str | None,
+                    filepath: str | None,
+                    remove_after_play: bool = True,
+                ) -> None:
+                    if filepath is None:
+                        print("No audio to be streamed. Response is empty.")
+                        return
+
+                    if sentence is None:
+                        sentence = ""
+                    print(f">> Playing {filepath}...")
+                    # an interrupt during this sentence drops all of it, even the frames queued after the interrupt
+                    generation = sender.generation
+                    turn = open_llm_vtuber.current_turn
+                    queued_at = time.time()
+
+                    def _record_sent(name: str = "ws_send", **attributes) -> None:
+                        # time from the handover to the sender until the message is on the wire
+                        turn.record(name, queued_at, time.time(), **attributes)
+
+                    def _record_playback(duration: float) -> None:
+                        # the frontend plays the sentence while the sender holds the queue for its duration
+                        sent_at = time.time()
+                        _record_sent()
+                        turn.record("playback", sent_at, sent_at + duration)
+
+                    if self.open_llm_vtuber_config.get("AUDIO_STREAMING", False):
+                        # frames are sent as soon as they are ready, the end message holds the queue.
+                        # The payload span lasts until the first frame is ready, the rest is prepared while it is sent.
+                        payload_start = time.time()
+                        first_frame_at = None
+                        frames = 0
+                        for message in audio_payload_preparer.stream_audio_payload(
+                            audio_path=filepath,
+                            display_text=sentence,
+                            expression_list=l2d.extract_emotion(sentence),
+                        ):
+                            if sender.generation != generation:
+                                print("Interrupted, the rest of the sentence is dropped.")
+                                break
+                            if isinstance(message, bytes):
+                                if first_frame_at is None:
+                                    first_frame_at = time.time()
+                                frames += 1
+                                sender.send_bytes_threadsafe(message, generation=generation)
+                            elif message["type"] == "audio-stream-start":
+                                queued_at = time.time()
+                                sender.send_text_threadsafe(
+                                    json.dumps(message),
+                                    on_sent=lambda: _record_sent("ws_first_frame"),
+                                    generation=generation,
+                                )
+                            elif message["type"] == "audio-stream-end":
+                                sender.send_text_threadsafe(
+                                    json.dumps(message),
+                                    hold=message["duration"],
+                                    on_sent=lambda duration=message["duration"]: _record_playback(duration),
+                                    generation=generation,
+                                )
+                            else:
+                                sender.send_text_threadsafe(
+                                    json.dumps(message), generation=generation
+                                )
+                        turn.record(
+                            "payload",
+                            payload_start,
+                            first_frame_at or time.time(),
+                            streaming=True,
+                            frames=frames,
+                        )
+                    else:
+                        with turn.span("payload", streaming=False):
+                            payload, duration = audio_payload_preparer.prepare_audio_payload(
+                                audio_path=filepath,
+                                display_text=sentence,
+                                expression_list=l2d.extract_emotion(sentence),
+                            )
+                            payload = json.dumps(payload)
+                        queued_at = time.time()
+                        # the payload holds the queue for its duration, so the frontend gets audio at playback speed
+                        sender.send_text_threadsafe(
+                            payload,
+                            hold=duration,
+                            on_sent=lambda: _record_playback(duration),
+                            generation=generation,
+                        )
+                    if remove_after_play:
+                        open_llm_vtuber.tts.remove_file(filepath, verbose=False)
+                    print("Payload queued.")
 
-            await websocket.send_text(
-                json.dumps({"type": "set-model", "text": l2d.model_info})
-            )
-            print("Model set")
-            received_data_buffer = np.array([])
-            # start mic
-            await websocket.send_text(
-                json.dumps({"type": "control", "text": "start-mic"})
-            )
+                # the audio is only queued here, its playback is recorded when it is sent
+                open_llm_vtuber.set_audio_output_func(_play_audio_file, records_playback=True)
 
-            conversation_task = None
+                await sender.send_json({"type": "set-model", "text": l2d.model_info})
+                print("Model set")
+                welcome_task = asyncio.create_task(
+                    asyncio.to_thread(open_llm_vtuber.play_welcome_audio)
+                )
+                received_data_buffer = PCMBuffer()
+                # Mic audio arrives as legacy JSON messages until the client negotiates a binary format
+                binary_audio_format: str | None = None
+                # start mic
+                await sender.send_json({"type": "control", "text": "start-mic"})
 
-            try:
                 while True:
                     print(".", end="")
-                    message = await websocket.receive_text()
-                    data = json.loads(message)
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+
+                    if message.get("bytes") is not None:
+                        # binary frames are raw little-endian PCM in the negotiated format
+                        if binary_audio_format is None:
+                            print("Binary frame received before audio format negotiation. Dropped.")
+                            continue
+                        try:
+                            received_data_buffer.append_bytes(
+                                message["bytes"], binary_audio_format
+                            )
+                        except ValueError as e:
+                            # a broken frame only loses its own audio, not the session
+                            print(f"Malformed binary audio frame dropped: {e}")
+                            continue
+                        print("*", end="")
+                        continue
+
+                    data = json.loads(message["text"])
                     # print(f"\033\n Received ws req: {data.get('type')}\033[0m\n")
 
-                    if data.get("type") == "interrupt-signal":
+                    if data.get("type") == "audio-format":
+                        requested_format = data.get("format")
+                        if requested_format in PCMBuffer.SAMPLE_FORMATS:
+                            binary_audio_format = requested_format
+                        else:
+                            binary_audio_format = None
+                        print(f"Mic audio format: {binary_audio_format or 'json'}")
+                        await sender.send_json(
+                            {
+                                "type": "audio-format-ack",
+                                "format": binary_audio_format or "json",
+                                "binary": binary_audio_format is not None,
+                            }
+                        )
+
+                    elif data.get("type") == "interrupt-signal":
                         print("Start receiving audio data from front end.")
-                        if conversation_task is not None:
+                        self.metrics.interrupts.inc()
+                        # drop the audio that is queued but not yet sent
+                        sender.cancel_pending()
+                        if conversation_task is not None and not conversation_task.done():
                             print(
                                 "\033[91mLLM hadn't finish itself. Interrupting it...",
                                 "heard response: \n",
                                 data.get("text"),
                                 "\033[0m\n",
                             )
-                            self.open_llm_vtuber.interrupt(data.get("text"))
+                            open_llm_vtuber.interrupt(data.get("text"))
                             # conversation_task.cancel()
+                        elif conversation_task is not None:
+                            # the response was complete, but its playback was cut short
+                            open_llm_vtuber.llm.handle_interrupt(data.get("text"))
 
                     elif data.get("type") == "mic-audio-data":
-                        received_data_buffer = np.append(
-                            received_data_buffer,
-                            np.array(
-                                list(data.get("audio").values()), dtype=np.float32
-                            ),
+                        # legacy format: a Float32Array serialized as an object keyed by index
+                        received_data_buffer.append(
+                            np.fromiter(
+                                data.get("audio").values(), dtype=np.float32
+                            )
                         )
                         print("*", end="")
 
                     elif data.get("type") == "mic-audio-end":
                         print("Received audio data end from front end.")
-                        await websocket.send_text(
-                            json.dumps({"type": "full-text", "text": "Thinking..."})
-                        )
-                        audio = received_data_buffer
-                        received_data_buffer = np.array([])
+                        await sender.send_json({"type": "full-text", "text": "Thinking..."})
+                        audio = received_data_buffer.pop_all()
 
                         async def _run_conversation():
                             try:
-                                await websocket.send_text(
-                                    json.dumps(
-                                        {
-                                            "type": "control",
-                                            "text": "conversation-chain-start",
-                                        }
-                                    )
+                                await sender.send_json(
+                                    {
+                                        "type": "control",
+                                        "text": "conversation-chain-start",
+                                    }
                                 )
                                 await asyncio.to_thread(
-                                    self.open_llm_vtuber.conversation_chain,
+                                    open_llm_vtuber.conversation_chain,
                                     user_input=audio,
                                 )
-                                await websocket.send_text(
-                                    json.dumps(
-                                        {
-                                            "type": "control",
-                                            "text": "conversation-chain-end",
-                                        }
-                                    )
+                                await sender.send_json(
+                                    {
+                                        "type": "control",
+                                        "text": "conversation-chain-end",
+                                    }
                                 )
                                 print("One Conversation Loop Completed")
                             except asyncio.CancelledError:
@@ -203,8 +334,28 @@ class WebSocketServer:
                         print("Unknown data type received.")
 
             except WebSocketDisconnect:
-                self.connected_clients.remove(websocket)
-                self.open_llm_vtuber = None
+                print("Client disconnected.")
+            finally:
+                # the session is single use: stop its turn and its workers, nothing will be sent to this socket anymore
+                for task in (welcome_task, conversation_task):
+                    if task is not None and not task.done():
+                        task.cancel()
+                if open_llm_vtuber is not None:
+                    open_llm_vtuber.close()
+                if websocket in self.connected_clients:
+                    self.connected_clients.remove(websocket)
+                await sender.stop()
+                self._senders.discard(sender)
+                self.metrics.active_sessions.dec()
+
+        # Prometheus scrape endpoint
+        @self.router.get("/metrics")
+        async def metrics():
+            if self.metrics is None:
+                return PlainTextResponse("", media_type="text/plain; version=0.0.4")
+            return PlainTextResponse(
+                self.metrics.render(), media_type="text/plain; version=0.0.4"
+            )
 
         @self.router.post("/broadcast")
         async def broadcast_message(message: str = Body(..., embed=True)):
@@ -232,6 +383,8 @@ class WebSocketServer:
         """Runs the FastAPI application using Uvicorn."""
         import uvicorn
 
+        if self.session_pool is not None:
+            self.session_pool.start()
         uvicorn.run(self.app, host=host, port=port, log_level=log_level)
         
     def clean_cache():
@@ -0,0 +1,72 @@
+import queue
+import threading
+from main import OpenLLMVTuberMain
+from model_registry import ModelRegistry
+
+
+class SessionPool:
+    """
+    Keeps a few pre-built `OpenLLMVTuberMain` sessions ready, so a new websocket connection gets one instantly.
+    All sessions borrow their heavy models from the same `ModelRegistry`. Sessions are single use:
+    a connection takes one out of the pool and closes it (`OpenLLMVTuberMain.close`) when it disconnects, and the pool
+    refills itself in the background.
+
+    Attributes:
+        config (dict): The configuration dictionary.
+        registry (ModelRegistry): The registry shared by all sessions.
+        size (int): The number of pre-built sessions to keep ready.
+    """
+
+    def __init__(self, config: dict, registry: ModelRegistry, size: int = 2):
+        self.config = config
+        self.registry = registry
+        self.size = max(0, size)
+        self._sessions: queue.Queue = queue.Queue()
+        self._refill_lock = threading.Lock()
+
+    def start(self) -> None:
+        """Warm up the shared models and fill the pool in a background thread."""
+        threading.Thread(target=self._warm_up, daemon=True).start()
+
+    def _warm_up(self) -> None:
+        try:
+            self.registry.warm_up()
+        except Exception as e:
+            print(f"Error warming up the shared models: {e}")
+        self._refill()
+
+    def _build_session(self) -> OpenLLMVTuberMain:
+        # the welcome note is played by the server once the session has an audio output
+        return OpenLLMVTuberMain(
+            self.config, registry=self.registry, play_welcome=False
+        )
+
+    def _refill(self) -> None:
+        # only one thread refills at a time, the others have nothing left to do
+        if not self._refill_lock.acquire(blocking=False):
+            return
+        try:
+            while self._sessions.qsize() < self.size:
+                self._sessions.put(self._build_session())
+        except Exception as e:
+            print(f"Error pre-building a session: {e}")
+        finally:
+            self._refill_lock.release()
+
+    def qsize(self) -> int:
+        """The number of sessions ready to be handed out."""
+        return self._sessions.qsize()
+
+    def acquire(self) -> OpenLLMVTuberMain:
+        """
+        Take a ready session out of the pool, or build one if the pool is empty. This call may block, so run it in a thread.
+
+        Returns:
+            OpenLLMVTuberMain: A fresh session for one connection.
+        """
+        try:
+            session = self._sessions.get_nowait()
+        except queue.Empty:
+            session = self._build_session()
+        threading.Thread(target=self._refill, daemon=True).start()
+        return session
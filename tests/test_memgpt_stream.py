@@ -0,0 +1,115 @@
+# Tests of the streaming parser of the MemGPT backend, against a local stand-in for the MemGPT messages endpoint
+# that sends its server-sent events in raw chunks, cut wherever the test wants.
+# Run from the project root: python -m pytest tests
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm.memGPT import LLM
+
+
+class StandInMemGPT(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the body of the response, in the chunks it is sent in
+    chunks = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in self.chunks:
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+            # so the client reads each chunk on its own
+            time.sleep(0.02)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture
+def llm():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInMemGPT)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm = LLM(f"http://127.0.0.1:{server.server_address[1]}", "token", "agent")
+    yield llm
+    llm.close()
+    server.shutdown()
+    server.server_close()
+
+
+def answer(llm, chunks):
+    StandInMemGPT.chunks = chunks
+    return list(llm.chat_iter("hello"))
+
+
+def test_yields_assistant_messages_only(llm):
+    assert answer(
+        llm,
+        [
+            b'data: {"internal_monologue": "The user said hello."}\n\n',
+            b'data: {"function_call": "send_message(...)"}\n\n',
+            b'data: {"assistant_message": "Hi there!"}\n\n',
+            b"data: [DONE]\n\n",
+        ],
+    ) == ["Hi there!"]
+
+
+def test_line_cut_across_chunks(llm):
+    assert answer(
+        llm,
+        [
+            b'data: {"assistant_me',
+            b'ssage": "Caf\xc3',
+            b'\xa9 time."}\n',
+            b'\ndata: {"assistant_message": " Yes."}\r\n\r\n',
+            b"data: [DONE]\n\n",
+        ],
+    ) == ["Café time.", " Yes."]
+
+
+def test_event_split_across_data_lines(llm):
+    assert answer(
+        llm,
+        [
+            b'data: {"assistant_message":\n',
+            b'data: "Hello,"}\n\n',
+            b'data: {"assistant_message": " world."}\n\n',
+            b"data: [DONE]\n\n",
+        ],
+    ) == ["Hello,", " world."]
+
+
+def test_done_and_bare_lines(llm):
+    assert answer(
+        llm,
+        [
+            b": keep-alive\n\n",
+            b'{"assistant_message": "One."}\n',
+            b'{"assistant_message": " Two."}\n',
+            b"data: [DONE]\n\n",
+        ],
+    ) == ["One.", " Two."]
+
+
+def test_pieces_arrive_before_the_end_of_the_stream(llm):
+    StandInMemGPT.chunks = [
+        b'data: {"assistant_message": "First."}\n\n',
+        *[b": thinking\n\n"] * 10,
+        b'data: {"assistant_message": " Second."}\n\n',
+    ]
+    start = time.perf_counter()
+    stream = llm.chat_iter("hello")
+    assert next(stream) == "First."
+    first = time.perf_counter() - start
+    assert list(stream) == [" Second."]
+    assert first < time.perf_counter() - start
@@ -1,13 +1,21 @@
+from typing import Iterator
 from pydub import AudioSegment
-from pydub.utils import make_chunks
+import numpy as np
 import base64
+import io
+import struct
+import wave
 
 
 class AudioPayloadPreparer:
     """
     A class to handle preparation of audio payloads for streaming.
+    The audio file is decoded once into an int16 numpy array, which is used both for the lip-sync volumes and for the data on the wire.
     """
 
+    # header of a binary audio frame: sequence number, number of volumes, reserved
+    FRAME_HEADER = struct.Struct("<IHH")
+
     def __init__(self, chunk_length_ms: int = 20):
         """
         Initializes the AudioPayloadPreparer object with constant parameters.
@@ -17,22 +25,71 @@ class AudioPayloadPreparer:
         """
         self.chunk_length_ms: int = chunk_length_ms
 
-    def __get_volume_by_chunks(self, audio):
+    def __decode(self, audio_path):
+        """
+        Private method to decode the audio file into interleaved 16-bit samples.
+
+        Parameters:
+            audio_path (str): The path to the audio file.
+
+        Returns:
+            tuple: The samples (np.ndarray of int16), the frame rate (int) and the number of channels (int).
+        """
+        audio = AudioSegment.from_file(audio_path).set_sample_width(2)
+        samples = np.frombuffer(audio.raw_data, dtype="<i2")
+        return samples, audio.frame_rate, audio.channels
+
+    def __get_volume_by_chunks(self, samples, frame_rate, channels):
         """
         Private method to divide the audio into chunks and calculate the normalized volume (RMS) for each chunk.
+        All full chunks are computed in a single vectorized pass. The last chunk may be shorter.
 
         Parameters:
-            audio (AudioSegment): The audio segment to process.
+            samples (np.ndarray): The interleaved int16 samples.
+            frame_rate (int): The frame rate of the audio.
+            channels (int): The number of channels.
 
         Returns:
-            list: Normalized volumes for each chunk.
+            np.ndarray: Normalized volumes (float32, between 0 and 1) for each chunk.
         """
-        chunks = make_chunks(audio, self.chunk_length_ms)
-        volumes = [chunk.rms for chunk in chunks]
-        max_volume = max(volumes)
+        chunk_size = max(1, frame_rate * self.chunk_length_ms // 1000) * channels
+        squares = np.square(samples, dtype=np.float64)
+        full_chunks = len(squares) // chunk_size
+        volumes = np.sqrt(
+            squares[: full_chunks * chunk_size].reshape(full_chunks, chunk_size).mean(axis=1)
+        )
+        remainder = squares[full_chunks * chunk_size :]
+        if len(remainder) > 0:
+            volumes = np.append(volumes, np.sqrt(remainder.mean()))
+
+        max_volume = volumes.max() if len(volumes) > 0 else 0
         if max_volume == 0:
             raise ValueError("Audio is empty or all zero.")
-        return [volume / max_volume for volume in volumes]
+        return (volumes / max_volume).astype(np.float32)
+
+    @staticmethod
+    def __to_wav_bytes(samples, frame_rate, channels):
+        """Private method to wrap the int16 samples in a wav container without decoding them again."""
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wf:
+            wf.setnchannels(channels)
+            wf.setsampwidth(2)
+            wf.setframerate(frame_rate)
+            wf.writeframes(samples.tobytes())
+        return buffer.getvalue()
+
+    @staticmethod
+    def quantize_volumes(volumes):
+        """
+        Quantize normalized volumes to one byte each (0 -> 0, 1 -> 255).
+
+        Parameters:
+            volumes (np.ndarray): Normalized volumes between 0 and 1.
+
+        Returns:
+            np.ndarray: The volumes as uint8.
+        """
+        return np.rint(volumes * 255).astype(np.uint8)
 
     def prepare_audio_payload(
         self, audio_path, display_text=None, expression_list=None
@@ -51,21 +108,91 @@ class AudioPayloadPreparer:
         if not audio_path:
             raise ValueError("audio_path cannot be None or empty.")
 
-        audio = AudioSegment.from_file(audio_path)
-        audio_bytes = audio.export(format="wav").read()
+        samples, frame_rate, channels = self.__decode(audio_path)
+        volumes = self.__get_volume_by_chunks(samples, frame_rate, channels)
+        audio_bytes = self.__to_wav_bytes(samples, frame_rate, channels)
         audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
-        volumes = self.__get_volume_by_chunks(audio)
 
         payload = {
             "type": "audio",
             "audio": audio_base64,
-            "volumes": volumes,
+            # three decimals are plenty for the mouth and keep the json small
+            "volumes": np.round(volumes, 3).tolist(),
+            "slice_length": self.chunk_length_ms,
+            "text": display_text,
+            "expressions": expression_list,
+        }
+
+        return payload, len(samples) / channels / frame_rate
+
+    def stream_audio_payload(
+        self,
+        audio_path,
+        display_text=None,
+        expression_list=None,
+        frame_length_ms: int = 200,
+    ) -> Iterator[dict | bytes]:
+        """
+        Prepares the audio as a stream of messages, so the frontend can start playing before the whole sentence is sent.
+        The audio is sent as raw 16-bit PCM instead of base64 encoded wav.
+
+        The stream is:
+        - an `audio-stream-start` message (dict) with the audio format, the text and the expressions,
+        - binary frames (bytes), each holding `frame_length_ms` of audio: a header (`FRAME_HEADER`: sequence number,
+          number of volumes, reserved), the volumes of the frame quantized to uint8 (padded to an even length),
+          and the little-endian int16 PCM,
+        - an `audio-stream-end` message (dict) with the number of frames and the duration.
+
+        Parameters:
+            audio_path (str): The path to the audio file to be processed.
+            display_text (str, optional): Text to be displayed with the audio.
+            expression_list (list, optional): List of expressions associated with the audio.
+            frame_length_ms (int): The length of audio in each binary frame. Rounded down to a multiple of the chunk length.
+
+        Returns:
+            Iterator[dict | bytes]: The messages to send, in order.
+        """
+        if not audio_path:
+            raise ValueError("audio_path cannot be None or empty.")
+
+        samples, frame_rate, channels = self.__decode(audio_path)
+        volumes = self.quantize_volumes(
+            self.__get_volume_by_chunks(samples, frame_rate, channels)
+        )
+        duration = len(samples) / channels / frame_rate
+
+        chunks_per_frame = max(1, frame_length_ms // self.chunk_length_ms)
+        samples_per_chunk = max(1, frame_rate * self.chunk_length_ms // 1000) * channels
+        samples_per_frame = samples_per_chunk * chunks_per_frame
+
+        yield {
+            "type": "audio-stream-start",
+            "sample_rate": frame_rate,
+            "channels": channels,
             "slice_length": self.chunk_length_ms,
             "text": display_text,
             "expressions": expression_list,
+            "duration": duration,
         }
 
-        return payload, audio.duration_seconds
+        seq = 0
+        for offset in range(0, len(samples), samples_per_frame):
+            frame_volumes = volumes[seq * chunks_per_frame : (seq + 1) * chunks_per_frame]
+            # keep the pcm 2-byte aligned for the frontend's Int16Array
+            padding = b"\0" if len(frame_volumes) % 2 else b""
+            yield (
+                self.FRAME_HEADER.pack(seq, len(frame_volumes), 0)
+                + frame_volumes.tobytes()
+                + padding
+                + samples[offset : offset + samples_per_frame].tobytes()
+            )
+            seq += 1
+
+        yield {
+            "type": "audio-stream-end",
+            "frames": seq,
+            "duration": duration,
+        }
 
 
 # Example usage:
@@ -5,6 +5,8 @@ from playsound3 import playsound
 
 class TTSInterface(metaclass=abc.ABCMeta):
 
+    # True when the last audio generated on the calling thread comes from a fallback engine
+    last_audio_degraded = False
 
     @abc.abstractmethod
     def generate_audio(self, text:str, file_name_no_ext=None):
@@ -0,0 +1,211 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import List, Sequence, Tuple
+import numpy as np
+
+
+@dataclass
+class CachedAnswer:
+    """
+    An answer kept by the `AnswerCache`.
+
+    Attributes:
+        question (str): The question that was answered.
+        answer (str): The full answer of the LLM.
+        audio (List[Tuple[str, str]]): The sentences of the answer and the cached copies of their audio files, in order.
+        version (str): The corpus and persona version the answer was made with.
+        context (str): The conversation the question was asked in (see `AnswerCache`).
+        similarity (float): The similarity of the question that hit this answer (set on lookup).
+    """
+
+    question: str
+    answer: str
+    audio: List[Tuple[str, str]] = field(default_factory=list)
+    version: str = ""
+    context: str = ""
+    created: float = 0.0
+    similarity: float = 0.0
+
+
+class AnswerCache:
+    """
+    A semantic cache of answers: a question whose embedding is close enough (cosine similarity >= `threshold`)
+    to an answered question gets the same answer, with its audio, without calling the LLM or the TTS.
+
+    Entries are only valid for the version they were made with (the RAG corpus version and the persona), so the cache
+    is emptied as soon as either changes. The cache is shared by all the sessions, but an answer can depend on what was
+    said before ("how much is it?"), so each answer is kept with a `context` key of the conversation it was made in
+    (like the previous question, "" for the first one), and only a question asked in the same context can hit it.
+    The audio files of an answer are copies owned by the cache, in `audio_dir`. An answer returned by `lookup` holds its
+    files until it is given back with `release`, so an eviction by another session can't remove them while they play.
+    The question embeddings are kept normalized in one matrix, so a lookup is a single matrix-vector product.
+
+    Attributes:
+        audio_dir (str): Where the cached audio files are kept. Emptied at start.
+        threshold (float): The minimum cosine similarity for a hit.
+        maxsize (int): The maximum number of answers. The oldest answer is evicted first.
+        hits (int): The number of lookups that found an answer.
+        misses (int): The number of lookups that didn't.
+    """
+
+    def __init__(self, audio_dir: str, threshold: float = 0.92, maxsize: int = 200):
+        self.audio_dir = audio_dir
+        self.threshold = threshold
+        self.maxsize = max(1, maxsize)
+        self.hits = 0
+        self.misses = 0
+        self._version: str | None = None
+        self._entries: List[CachedAnswer | None] = [None] * self.maxsize
+        self._matrix: np.ndarray | None = None
+        # the slot the next answer goes to (the oldest one when the cache is full)
+        self._next_slot = 0
+        # the audio files of the answers being replayed, and those of them that were evicted meanwhile
+        self._held: Counter = Counter()
+        self._evicted_held: set = set()
+        self._lock = threading.Lock()
+        shutil.rmtree(audio_dir, ignore_errors=True)
+        os.makedirs(audio_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self._entries)
+
+    def hit_rate(self) -> float:
+        """The ratio of lookups that were hits, 0 before the first lookup."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _check_version(self, version: str) -> None:
+        # must hold the lock
+        if version != self._version:
+            if self._version is not None and len(self):
+                print("The corpus or the persona changed, emptying the answer cache.")
+            self._clear()
+            self._version = version
+
+    def _clear(self) -> None:
+        for slot in range(self.maxsize):
+            self._evict(slot)
+        self._matrix = None
+        self._next_slot = 0
+
+    def _evict(self, slot: int) -> None:
+        entry = self._entries[slot]
+        if entry is None:
+            return
+        self._entries[slot] = None
+        if self._matrix is not None:
+            self._matrix[slot] = 0
+        for _, path in entry.audio:
+            if self._held[path]:
+                self._evicted_held.add(path)
+            else:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def lookup(
+        self, embedding: Sequence[float], version: str, context: str = ""
+    ) -> CachedAnswer | None:
+        """
+        Find the answer of the closest cached question asked in the same context.
+        The answer holds its audio files: give it back with `release` once it has been replayed.
+
+        Parameters:
+            embedding (Sequence[float]): The embedding of the question.
+            version (str): The current corpus and persona version.
+            context (str): The context key of the conversation.
+
+        Returns:
+            CachedAnswer | None: A copy of the answer, or None if no cached question is similar enough.
+        """
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None:
+                self.misses += 1
+                return None
+            similarities = self._matrix @ self._normalize(embedding)
+            same_context = np.fromiter(
+                (entry is not None and entry.context == context for entry in self._entries),
+                dtype=bool,
+                count=self.maxsize,
+            )
+            similarities = np.where(same_context, similarities, -np.inf)
+            slot = int(np.argmax(similarities))
+            entry = self._entries[slot]
+            if entry is None or similarities[slot] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            for _, path in entry.audio:
+                self._held[path] += 1
+            return replace(entry, audio=list(entry.audio), similarity=float(similarities[slot]))
+
+    def release(self, answer: CachedAnswer) -> None:
+        """Give back an answer of `lookup`: its audio files are removed now if it was evicted while it was held."""
+        with self._lock:
+            for _, path in answer.audio:
+                self._held[path] -= 1
+                if self._held[path] <= 0:
+                    del self._held[path]
+                    if path in self._evicted_held:
+                        self._evicted_held.discard(path)
+                        self._remove(path)
+
+    def new_audio_path(self, filepath: str) -> str:
+        """A new path in the cache for a copy of the audio file `filepath`."""
+        extension = os.path.splitext(filepath)[1]
+        return os.path.join(self.audio_dir, f"{uuid.uuid4().hex}{extension}")
+
+    def store(
+        self,
+        question: str,
+        embedding: Sequence[float],
+        answer: str,
+        audio: List[Tuple[str, str]],
+        version: str,
+        context: str = "",
+    ) -> None:
+        """
+        Keep an answer. The cache takes ownership of the audio files.
+
+        Parameters:
+            question (str): The question.
+            embedding (Sequence[float]): The embedding of the question.
+            answer (str): The full answer.
+            audio (List[Tuple[str, str]]): The sentences and the paths of their audio (from `new_audio_path`).
+            version (str): The corpus and persona version the answer was made with.
+            context (str): The context key of the conversation the question was asked in.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None:
+                self._matrix = np.zeros((self.maxsize, len(vector)), dtype=np.float32)
+            slot = self._next_slot
+            self._evict(slot)
+            self._matrix[slot] = vector
+            self._entries[slot] = CachedAnswer(
+                question=question,
+                answer=answer,
+                audio=list(audio),
+                version=version,
+                context=context,
+                created=time.time(),
+            )
+            self._next_slot = (slot + 1) % self.maxsize
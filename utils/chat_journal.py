@@ -0,0 +1,158 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+
+class ChatJournal:
+    """
+    The chat history of every session, as append-only JSONL files (one per session, `<session_id>.jsonl`).
+
+    A turn only puts its events in a queue: a single background thread appends them in batches and calls fsync at
+    most once every `fsync_interval` seconds, so the disk is never on the response path, and concurrent sessions
+    never write the same file. A session is restored by replaying its events (`replay`).
+
+    Events are `{"op": "append", "role": ..., "content": ...}` for a new message, and
+    `{"op": "edit_last", "content": ...}` when the last message is changed (an answer cut short by an interrupt).
+
+    Attributes:
+        directory (str): The folder of the journals.
+        fsync_interval (float): The maximum number of seconds between two fsyncs of a journal with new events.
+    """
+
+    def __init__(self, directory: str, fsync_interval: float = 1.0):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        # the journals written since their last fsync
+        self._unsynced: set = set()
+        self._last_fsync = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="chat-journal", daemon=True)
+        self._thread.start()
+
+    def path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def session(self, session_id: str) -> "SessionJournal":
+        """The journal of one session."""
+        return SessionJournal(self, session_id)
+
+    def write(self, session_id: str, event: dict) -> None:
+        """Queue an event. It is written by the background thread."""
+        self._queue.put((session_id, {"ts": round(time.time(), 3), **event}))
+
+    def flush(self) -> None:
+        """Wait until the events queued so far are written and synced to disk."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self) -> None:
+        """Write and sync the queued events, then stop the background thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def replay(self, session_id: str) -> List[Dict[str, str]]:
+        """
+        Rebuild the messages of a session from its journal.
+
+        Parameters:
+            session_id (str): The session.
+
+        Returns:
+            List[Dict[str, str]]: The messages (role and content), in order. Empty if the session has no journal.
+        """
+        messages = []
+        try:
+            with open(self.path(session_id), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # the last line of a journal that was being written when the process stopped
+                        continue
+                    if event.get("op") == "append":
+                        messages.append({"role": event["role"], "content": event["content"]})
+                    elif event.get("op") == "edit_last" and messages:
+                        messages[-1]["content"] = event["content"]
+        except FileNotFoundError:
+            pass
+        return messages
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                self._fsync()
+                continue
+            # take everything queued, and write it as one batch
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            events = defaultdict(list)
+            markers = []
+            for item in batch:
+                if item is None or isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    session_id, event = item
+                    events[session_id].append(json.dumps(event, ensure_ascii=False) + "\n")
+            for session_id, lines in events.items():
+                try:
+                    with open(self.path(session_id), "a", encoding="utf-8") as f:
+                        f.writelines(lines)
+                    self._unsynced.add(self.path(session_id))
+                except OSError as e:
+                    print(f"Error writing the chat history of session {session_id}: {e}")
+            if markers or time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+            for marker in markers:
+                if marker is None:
+                    return
+                marker.set()
+
+    def _fsync(self) -> None:
+        for path in self._unsynced:
+            try:
+                with open(path, "a") as f:
+                    os.fsync(f.fileno())
+            except OSError as e:
+                print(f"Error syncing the chat history {path}: {e}")
+        self._unsynced.clear()
+        self._last_fsync = time.monotonic()
+
+
+class SessionJournal:
+    """
+    The journal of one session, given to its LLM to record the conversation.
+
+    Attributes:
+        session_id (str): The session.
+    """
+
+    def __init__(self, journal: ChatJournal, session_id: str):
+        self._journal = journal
+        self.session_id = session_id
+
+    def append(self, message: Dict[str, str]) -> None:
+        """Record a new message."""
+        self._journal.write(
+            self.session_id,
+            {"op": "append", "role": message["role"], "content": message["content"]},
+        )
+
+    def edit_last(self, content: str) -> None:
+        """Record a change of the last message."""
+        self._journal.write(self.session_id, {"op": "edit_last", "content": content})
+
+    def replay(self) -> List[Dict[str, str]]:
+        """The messages recorded so far. Call `ChatJournal.flush` first to include the queued ones."""
+        return self._journal.replay(self.session_id)
@@ -0,0 +1,165 @@
+from typing import Any, Dict, Sequence, Tuple
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+
+# seconds, from a fast cache hit to a slow online TTS call
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class ConversationMetrics:
+    """
+    The metrics of the conversation pipeline, in their own `prometheus_client` registry. Stage latencies, turns and
+    errors are fed by the tracer (see `observe_span`), the other metrics are recorded by the server.
+
+    Attributes:
+        stage_latency (Histogram): The duration of each stage (asr, rag, llm_ttft, llm, tts, payload, ws_send, playback...), by backend.
+        turns (Counter): The finished conversation turns.
+        interrupts (Counter): The interrupts sent by the clients.
+        errors (Counter): The stages that failed, by backend.
+        active_sessions (Gauge): The connected clients with a session.
+        tts_pending (Gauge): The sentences waiting for (or in) TTS synthesis.
+        cache_hit_ratio (Gauge): The hit ratio of each cache, by cache name. Caches register a function with `set_function`.
+        rag_gate (Counter): The decisions of the retrieval gate, by decision ("retrieve" or why it was skipped).
+        rag_skip_ratio (Gauge): The ratio of questions that skipped retrieval.
+        llm_outstanding (Gauge): The requests in flight to each server of the balanced LLM provider, by endpoint.
+        llm_healthy (Gauge): 1 if a server of the balanced LLM provider is healthy, else 0, by endpoint.
+        llm_ttft (Histogram): The time to the first token of each server of the balanced LLM provider, by endpoint.
+        llm_endpoint_errors (Counter): The failed requests to each server of the balanced LLM provider, by endpoint.
+        breaker_open (Gauge): 1 if the circuit breaker of a remote backend is open (or half-open), else 0, by backend.
+        fallbacks (Counter): The calls answered by the local fallback engine, by stage ("asr", "tts" or "llm").
+    """
+
+    # the end of a turn cut short by the user is not an error
+    NOT_ERRORS = frozenset(("InterruptedError", "GeneratorExit"))
+
+    def __init__(self, backends: Dict[str, str] | None = None):
+        """
+        Initializes the metrics.
+
+        Parameters:
+            backends (Dict[str, str], optional): The backend (model or engine name) of each stage, like {"tts": "edgeTTS"}.
+        """
+        self.registry = CollectorRegistry()
+        self.backends = dict(backends or {})
+        self.stage_latency = Histogram(
+            "vtuber_stage_duration_seconds",
+            "Duration of each stage of a conversation turn.",
+            ("stage", "backend"),
+            buckets=DEFAULT_LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.turns = Counter(
+            "vtuber_turns_total",
+            "Conversation turns, finished or interrupted.",
+            registry=self.registry,
+        )
+        self.interrupts = Counter(
+            "vtuber_interrupts_total",
+            "Interrupts sent by the clients.",
+            registry=self.registry,
+        )
+        self.errors = Counter(
+            "vtuber_errors_total",
+            "Failed stages of a conversation turn.",
+            ("stage", "backend"),
+            registry=self.registry,
+        )
+        self.active_sessions = Gauge(
+            "vtuber_active_sessions",
+            "Connected clients with a session.",
+            registry=self.registry,
+        )
+        self.tts_pending = Gauge(
+            "vtuber_tts_pending_sentences",
+            "Sentences submitted to TTS and not synthesized yet.",
+            registry=self.registry,
+        )
+        self.cache_hit_ratio = Gauge(
+            "vtuber_cache_hit_ratio",
+            "Hit ratio of each cache.",
+            ("cache",),
+            registry=self.registry,
+        )
+        self.rag_gate = Counter(
+            "vtuber_rag_gate_total",
+            "Retrieval gate decisions: retrieve, or why the retrieval was skipped.",
+            ("decision",),
+            registry=self.registry,
+        )
+        self.rag_skip_ratio = Gauge(
+            "vtuber_rag_skip_ratio",
+            "Ratio of questions that skipped the RAG retrieval.",
+            registry=self.registry,
+        )
+        self.llm_outstanding = Gauge(
+            "vtuber_llm_endpoint_outstanding_requests",
+            "Requests in flight to each LLM server of the balanced provider.",
+            ("endpoint",),
+            registry=self.registry,
+        )
+        self.llm_healthy = Gauge(
+            "vtuber_llm_endpoint_healthy",
+            "1 if the LLM server of the balanced provider is healthy, else 0.",
+            ("endpoint",),
+            registry=self.registry,
+        )
+        self.llm_ttft = Histogram(
+            "vtuber_llm_endpoint_ttft_seconds",
+            "Time to the first token of each LLM server of the balanced provider.",
+            ("endpoint",),
+            buckets=DEFAULT_LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.llm_endpoint_errors = Counter(
+            "vtuber_llm_endpoint_errors_total",
+            "Failed requests to each LLM server of the balanced provider.",
+            ("endpoint",),
+            registry=self.registry,
+        )
+        self.breaker_open = Gauge(
+            "vtuber_circuit_breaker_open",
+            "1 if the circuit breaker of a remote backend is open or half-open, else 0.",
+            ("backend",),
+            registry=self.registry,
+        )
+        self.fallbacks = Counter(
+            "vtuber_fallbacks_total",
+            "Calls answered by the local fallback engine, by stage.",
+            ("stage",),
+            registry=self.registry,
+        )
+        # stage -> children, so a span is recorded without looking up its labels
+        self._stage_children: Dict[str, Tuple[Histogram, Counter]] = {}
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """A new gauge in the registry of these metrics, like the gauges of the server."""
+        return Gauge(name, help, labelnames, registry=self.registry)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        return generate_latest(self.registry).decode()
+
+    def _children_for(self, stage: str) -> Tuple[Histogram, Counter]:
+        children = self._stage_children.get(stage)
+        if children is None:
+            backend = self.backends.get(stage.split("_", 1)[0], "")
+            children = (
+                self.stage_latency.labels(stage, backend),
+                self.errors.labels(stage, backend),
+            )
+            self._stage_children[stage] = children
+        return children
+
+    def observe_span(self, span: Dict[str, Any]) -> None:
+        """A tracer listener: record a finished span."""
+        stage = span["span"]
+        if stage == "turn":
+            self.turns.inc()
+        latency, errors = self._children_for(stage)
+        error = span.get("error")
+        if error is not None and error not in self.NOT_ERRORS:
+            errors.inc()
+            return
+        latency.observe(span["duration_ms"] / 1000)
@@ -0,0 +1,214 @@
+import json
+import time
+from typing import Dict, Iterator, List, Sequence
+import requests
+
+
+def server_root(base_url: str) -> str:
+    """The root URL of an Ollama server: "http://localhost:11434/v1/" -> "http://localhost:11434"."""
+    base_url = base_url.rstrip("/")
+    if base_url.endswith("/v1"):
+        base_url = base_url[: -len("/v1")]
+    return base_url
+
+
+class OllamaClient:
+    """
+    A connection-pooled HTTP client of an LLM server, shared by the chat of every session and by the embeddings.
+    Connections are kept open between requests, so a turn never pays for the TCP/TLS setup.
+
+    With the "ollama" API, requests go to the native endpoints (`/api/chat`, `/api/embed`) with `keep_alive`,
+    so the models stay loaded between turns, and the same `options` on every request, since changing some of them
+    (like `num_ctx`) makes Ollama reload the model. With the "openai" API, the chat goes to the
+    `/v1/chat/completions` endpoint of any OpenAI-compatible server.
+
+    Attributes:
+        base_url (str): The root URL of the server ("/v1" is removed for the "ollama" API, added for "openai").
+        api (str): "ollama" or "openai".
+        keep_alive (int | str): How long Ollama keeps a model loaded after a request, -1 for ever.
+        options (dict): The Ollama model options sent with every chat request.
+        timeout (float): The timeout of a request, in seconds.
+    """
+
+    # the answers always come from the configured server (a resilient wrapper may answer with a fallback instead)
+    last_stream_degraded = False
+
+    def __init__(
+        self,
+        base_url: str,
+        api: str = "ollama",
+        keep_alive: int | str = -1,
+        options: Dict | None = None,
+        api_key: str | None = None,
+        pool_size: int = 16,
+        timeout: float = 120,
+    ):
+        """
+        Initializes the client.
+
+        Parameters:
+            base_url (str): The URL of the server, with or without "/v1".
+            api (str): "ollama" for the native Ollama API, "openai" for an OpenAI-compatible server.
+            keep_alive (int | str): How long Ollama keeps a model loaded after a request, -1 for ever.
+            options (dict, optional): The Ollama model options sent with every chat request.
+            api_key (str, optional): The bearer token of an OpenAI-compatible server.
+            pool_size (int): The maximum number of connections kept open.
+            timeout (float): The timeout of a request, in seconds.
+        """
+        if api not in ("ollama", "openai"):
+            raise ValueError(f"Unsupported API: {api}")
+        self.api = api
+        self.base_url = server_root(base_url)
+        if api == "openai":
+            self.base_url += "/v1"
+        self.keep_alive = keep_alive
+        self.options = dict(options or {})
+        self.timeout = timeout
+        self._session = requests.Session()
+        if api_key:
+            self._session.headers["Authorization"] = f"Bearer {api_key}"
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(1, pool_size)
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._batch_embed = True
+
+    def _chat_payload(self, model: str, messages: Sequence[Dict], stream: bool) -> Dict:
+        payload = {"model": model, "messages": list(messages), "stream": stream}
+        if self.api == "ollama":
+            payload["keep_alive"] = self.keep_alive
+            if self.options:
+                payload["options"] = self.options
+        return payload
+
+    def chat_stream(self, model: str, messages: Sequence[Dict]) -> Iterator[str]:
+        """
+        Stream a chat response.
+
+        Parameters:
+            model (str): The model.
+            messages (Sequence[Dict]): The messages (role and content).
+
+        Returns:
+            Iterator[str]: The pieces of the response, as they arrive. The request is sent on the first `next`.
+        """
+        path = "/api/chat" if self.api == "ollama" else "/chat/completions"
+        with self._session.post(
+            self.base_url + path,
+            json=self._chat_payload(model, messages, stream=True),
+            stream=True,
+            timeout=self.timeout,
+        ) as response:
+            response.raise_for_status()
+            # read the body to its end, so the connection goes back to the pool.
+            # chunk_size=None hands over each piece as it arrives, instead of waiting for a full buffer
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+                if self.api == "ollama":
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise RuntimeError(chunk["error"])
+                    yield chunk.get("message", {}).get("content") or ""
+                else:
+                    # server-sent events: "data: {...}", then "data: [DONE]"
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[len(b"data:") :].strip()
+                    if data == b"[DONE]":
+                        continue
+                    choices = json.loads(data).get("choices") or [{}]
+                    yield choices[0].get("delta", {}).get("content") or ""
+
+    def chat(self, model: str, messages: Sequence[Dict]) -> str:
+        """The full response to a chat, without streaming."""
+        path = "/api/chat" if self.api == "ollama" else "/chat/completions"
+        response = self._session.post(
+            self.base_url + path,
+            json=self._chat_payload(model, messages, stream=False),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        result = response.json()
+        if self.api == "ollama":
+            return result["message"]["content"]
+        return result["choices"][0]["message"]["content"]
+
+    def embed(self, model: str, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Embed texts in one request. Servers older than `/api/embed` get one `/api/embeddings` request per text instead.
+
+        Parameters:
+            model (str): The embedding model.
+            texts (Sequence[str]): The texts.
+
+        Returns:
+            List[List[float]]: The embeddings, in the order of the texts.
+        """
+        if self.api == "openai":
+            response = self._session.post(
+                self.base_url + "/embeddings",
+                json={"model": model, "input": list(texts)},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return [item["embedding"] for item in response.json()["data"]]
+        if self._batch_embed:
+            response = self._session.post(
+                self.base_url + "/api/embed",
+                json={"model": model, "input": list(texts), "keep_alive": self.keep_alive},
+                timeout=self.timeout,
+            )
+            if response.status_code != 404:
+                response.raise_for_status()
+                return response.json()["embeddings"]
+            print("The Ollama server has no /api/embed, embedding one text per request.")
+            self._batch_embed = False
+        embeddings = []
+        for text in texts:
+            response = self._session.post(
+                self.base_url + "/api/embeddings",
+                json={"model": model, "prompt": text, "keep_alive": self.keep_alive},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            embeddings.append(response.json()["embedding"])
+        return embeddings
+
+    def health(self, timeout: float = 3) -> bool:
+        """Whether the server answers (lists its models)."""
+        path = "/api/tags" if self.api == "ollama" else "/models"
+        try:
+            return self._session.get(self.base_url + path, timeout=timeout).ok
+        except requests.RequestException:
+            return False
+
+    def warm_up(self, model: str, embedding: bool = False) -> float:
+        """
+        Load a model (chat or embedding) and open a connection before the first turn needs them.
+        Only the "ollama" API can load a model without running it.
+
+        Parameters:
+            model (str): The model to load.
+            embedding (bool): Whether it is an embedding model, which can't be loaded through the generate endpoint.
+
+        Returns:
+            float: The seconds it took.
+        """
+        start_time = time.time()
+        if self.api == "ollama" and embedding:
+            # an embedding model has no generate endpoint: embed a word
+            self.embed(model, ["warm up"])
+            return time.time() - start_time
+        if self.api == "ollama":
+            # a request without a prompt only loads the model
+            response = self._session.post(
+                self.base_url + "/api/generate",
+                json={"model": model, "keep_alive": self.keep_alive},
+                timeout=self.timeout,
+            )
+        else:
+            response = self._session.get(self.base_url + "/models", timeout=self.timeout)
+        response.raise_for_status()
+        return time.time() - start_time
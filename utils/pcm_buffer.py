@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class PCMBuffer:
+    """
+    A growable float32 buffer that collects microphone audio sent by the frontend.
+
+    The backing array is preallocated and doubled whenever it runs out of space, so appending
+    a chunk only copies that chunk (amortized O(1) per sample) instead of re-allocating the whole
+    buffer like `np.append` does.
+
+    Attributes:
+        SAMPLE_FORMATS (dict): Supported binary sample formats and their little-endian numpy dtypes.
+    """
+
+    SAMPLE_FORMATS = {
+        "float32": np.dtype("<f4"),
+        "int16": np.dtype("<i2"),
+    }
+
+    def __init__(self, initial_capacity: int = 16000 * 10):
+        """
+        Initializes the buffer.
+
+        Parameters:
+            initial_capacity (int): Number of samples to preallocate. Defaults to 10 seconds at 16kHz.
+        """
+        self._data = np.empty(max(1, initial_capacity), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, extra: int) -> None:
+        """Grow the backing array (by doubling) so that `extra` more samples fit."""
+        required = self._size + extra
+        if required <= len(self._data):
+            return
+        capacity = len(self._data)
+        while capacity < required:
+            capacity *= 2
+        new_data = np.empty(capacity, dtype=np.float32)
+        new_data[: self._size] = self._data[: self._size]
+        self._data = new_data
+
+    def append(self, samples: np.ndarray) -> None:
+        """
+        Append float samples in the range [-1, 1] to the buffer.
+
+        Parameters:
+            samples (np.ndarray): One dimensional array of samples.
+        """
+        count = len(samples)
+        if count == 0:
+            return
+        self._reserve(count)
+        self._data[self._size : self._size + count] = samples
+        self._size += count
+
+    def append_bytes(self, data: bytes, sample_format: str = "float32") -> None:
+        """
+        Append a binary frame of raw little-endian PCM to the buffer.
+
+        Parameters:
+            data (bytes): The raw PCM bytes.
+            sample_format (str): One of the keys of `SAMPLE_FORMATS`.
+
+        Raises:
+            ValueError if the sample format is unknown or the frame is not a whole number of samples.
+        """
+        dtype = self.SAMPLE_FORMATS.get(sample_format)
+        if dtype is None:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        if len(data) % dtype.itemsize != 0:
+            raise ValueError(
+                f"Binary audio frame of {len(data)} bytes is not aligned to {sample_format} samples."
+            )
+        samples = np.frombuffer(data, dtype=dtype)
+        if sample_format == "int16":
+            samples = samples.astype(np.float32) / 32768.0
+        self.append(samples)
+
+    def pop_all(self) -> np.ndarray:
+        """
+        Return a copy of the buffered audio and reset the buffer, keeping its allocation for the next utterance.
+
+        Returns:
+            np.ndarray: The buffered float32 audio.
+        """
+        audio = self._data[: self._size].copy()
+        self._size = 0
+        return audio
@@ -0,0 +1,238 @@
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Iterator
+
+# the calls and streams under a deadline run on these workers, so a backend that hangs holds a worker, not the caller
+_workers = ThreadPoolExecutor(max_workers=32, thread_name_prefix="deadline")
+
+
+class DeadlineExceeded(TimeoutError):
+    """A call to a backend didn't finish before its deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """A backend is skipped because its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker. After `failure_threshold` failed calls in a row, the breaker opens and calls are
+    rejected for `reset_timeout` seconds. Then it lets one call through (half-open): the breaker closes if it
+    succeeds and opens again if it fails.
+
+    Attributes:
+        name (str): The backend, used in the messages.
+        failure_threshold (int): The failed calls in a row that open the breaker.
+        reset_timeout (float): Seconds the breaker stays open before a call is let through.
+        failures (int): The failed calls in a row.
+        opened_count (int): How many times the breaker opened.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_count = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """ "closed", "open" or "half_open"."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def is_open(self) -> bool:
+        return self.state != "closed"
+
+    def allow(self) -> bool:
+        """Whether a call may go to the backend now. Half-open, only the first caller gets through."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"{self.name} is back, closing its circuit breaker")
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+                if not self._probing:
+                    self.opened_count += 1
+                    print(f"{self.name} failed {self.failures} times in a row, opening its circuit breaker")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+def call_with_deadline(
+    function: Callable[..., Any],
+    seconds: float | None,
+    *args,
+    on_late_result: Callable[[Any], None] | None = None,
+) -> Any:
+    """
+    Call `function(*args)` and wait at most `seconds` for it (None for no limit).
+
+    The call runs on a worker thread, so a backend that hangs can't block the caller: past the deadline,
+    `DeadlineExceeded` is raised and the call is left to finish on its own. If it finishes later,
+    its result is handed to `on_late_result` (to close a stream or remove a file, for example).
+    """
+    if seconds is None:
+        return function(*args)
+    future = _workers.submit(function, *args)
+    try:
+        return future.result(timeout=max(0.0, seconds))
+    except FutureTimeoutError:
+        if not future.cancel() and on_late_result is not None:
+
+            def _hand_over(late: Future) -> None:
+                if late.exception() is None:
+                    on_late_result(late.result())
+
+            # called right away if the call finished in the meantime
+            future.add_done_callback(_hand_over)
+        raise DeadlineExceeded(f"No answer within {seconds:.1f}s") from None
+
+
+_END = object()
+
+
+def iter_with_deadline(iterator: Iterator, seconds: float | None) -> Iterator:
+    """
+    Yield the items of `iterator`, waiting at most `seconds` for each one (None for no limit).
+
+    The iterator is read on a worker thread, which it holds until the end of the stream, so a stream that stalls can't
+    block the caller: past the deadline, `DeadlineExceeded` is raised. Once the caller stops, the iterator is closed
+    by the reading thread as soon as its current read returns.
+    """
+    if seconds is None:
+        yield from iterator
+        return
+    items: queue.Queue = queue.Queue()
+    stop = threading.Event()
+
+    def read() -> None:
+        try:
+            for item in iterator:
+                items.put((item, None))
+                if stop.is_set():
+                    break
+            else:
+                items.put((_END, None))
+        except Exception as e:
+            items.put((None, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    _workers.submit(read)
+    try:
+        while True:
+            try:
+                item, error = items.get(timeout=seconds)
+            except queue.Empty:
+                raise DeadlineExceeded(f"Nothing received for {seconds:.1f}s") from None
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+class ResiliencePolicy:
+    """
+    Calls a remote backend with a deadline, bounded retries and a circuit breaker.
+
+    A call gets `timeout` seconds in all, retries included: each attempt gets the time left, and a failed attempt is
+    retried at most `retries` times after an exponential backoff with full jitter (a random delay between 0 and
+    `base_delay * 2**attempt`, at most `max_delay`), so sessions that fail together don't retry together.
+    An attempt that runs out of time is not retried. A call that fails in the end counts as one failure of the breaker.
+
+    Attributes:
+        breaker (CircuitBreaker): The circuit breaker of the backend.
+        timeout (float | None): Seconds a call may take, retries included. None or 0 for no limit.
+        retries (int): The retries after a failed attempt.
+        base_delay (float): The backoff before the first retry, before jitter, in seconds.
+        max_delay (float): The longest backoff, in seconds.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        timeout: float | None = 10,
+        retries: int = 1,
+        base_delay: float = 0.2,
+        max_delay: float = 2,
+    ):
+        self.breaker = breaker
+        self.timeout = timeout or None
+        self.retries = max(0, retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """The jittered delay before retry number `attempt` (from 0)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def call(
+        self,
+        function: Callable[..., Any],
+        *args,
+        on_late_result: Callable[[Any], None] | None = None,
+    ) -> Any:
+        """
+        Call `function(*args)` under the policy.
+
+        Raises:
+            CircuitOpenError: If the breaker is open. The backend isn't called.
+            DeadlineExceeded: If the call ran out of time.
+            Exception: The error of the last attempt.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.breaker.name} is unavailable (circuit breaker open)")
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                result = call_with_deadline(
+                    function, remaining, *args, on_late_result=on_late_result
+                )
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                delay = self.backoff(attempt)
+                out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+                if attempt >= self.retries or out_of_time:
+                    self.breaker.record_failure()
+                    raise
+                print(f"{self.breaker.name} failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
@@ -0,0 +1,290 @@
+import time
+from typing import List
+
+
+class SentenceSegmenter:
+    """
+    An incremental sentence segmenter for streamed LLM output.
+    Feed it the token deltas as they arrive and it returns the sentences that are complete.
+    Each character is looked at once, and the abbreviation check walks back a bounded number of characters
+    through a precompiled (reversed) abbreviation trie, so the work per character is O(1) amortized.
+
+    A sentence ends at `.`, `?` or `!` (plus closing quotes or brackets) followed by whitespace, or right after
+    CJK sentence punctuation like `。` or `！`. The decision for `.` and `...` waits for the next word:
+    if it starts with a lowercase letter, the sentence goes on. Known abbreviations (`Dr.`, `U.S.A.`...),
+    decimal numbers (`3.14`) and emotion tags (`[joy]`) never end a sentence.
+
+    With `first_clause` on, the first chunk of a response is emitted as soon as a clause is complete (at a comma or a dash,
+    or after `first_clause_max_tokens` deltas), so TTS can start early. After that, it goes back to whole sentences.
+
+    Attributes:
+        min_length (int): Sentences shorter than this are merged with the next one. 0 to disable.
+        max_length (int): Sentences are force-split (at the last space or comma if possible) when they reach this length. 0 to disable.
+        first_clause (bool): Emit the first clause of the response early.
+        first_clause_min_length (int): The first clause must be at least this long.
+        first_clause_max_tokens (int): Emit the first clause after this many deltas even without a comma or dash. 0 to disable.
+        early_flush_time (float | None): When (`time.monotonic()`) the first clause was emitted early, if it was.
+        first_sentence_time (float | None): When the first full sentence was complete, after an early flush.
+    """
+
+    DEFAULT_ABBREVIATIONS = (
+        "Dr.", "Mr.", "Ms.", "Mrs.", "Jr.", "Sr.", "St.", "Ave.", "Rd.", "Blvd.",
+        "Dept.", "Univ.", "Prof.", "Ph.D.", "M.D.", "U.S.", "U.K.", "U.N.", "E.U.",
+        "U.S.A.", "U.S.S.R.", "U.A.E.", "NY.", "e.g.", "i.e.", "vs.",
+    )
+    SENTENCE_END = frozenset(".?!")
+    CJK_SENTENCE_END = frozenset("。；？！…〰〜～")
+    CLOSERS = frozenset("\"')]”’）」』】*")
+    SOFT_BREAKS = frozenset(",，、;:")
+    CLAUSE_BREAKS = frozenset(",:;")
+    # clause breaks that need no space after them
+    CJK_CLAUSE_BREAKS = frozenset("，、：—–")
+    MAX_TAG_LENGTH = 32
+
+    _TRIE_END = ""
+
+    def __init__(
+        self,
+        min_length: int = 0,
+        max_length: int = 0,
+        abbreviations=None,
+        first_clause: bool = False,
+        first_clause_min_length: int = 10,
+        first_clause_max_tokens: int = 0,
+    ):
+        """
+        Initializes the segmenter.
+
+        Parameters:
+            min_length (int): Sentences shorter than this are merged with the next one. 0 to disable.
+            max_length (int): Sentences are force-split when they reach this length. 0 to disable.
+            abbreviations (Iterable[str], optional): Words ending with a period that don't end a sentence. Defaults to `DEFAULT_ABBREVIATIONS`.
+            first_clause (bool): Emit the first clause of the response early.
+            first_clause_min_length (int): The first clause must be at least this long.
+            first_clause_max_tokens (int): Emit the first clause after this many deltas even without a comma or dash. 0 to disable.
+        """
+        self.min_length = min_length
+        self.max_length = max_length
+        self.first_clause = first_clause
+        self.first_clause_min_length = first_clause_min_length
+        self.first_clause_max_tokens = first_clause_max_tokens
+        if abbreviations is None:
+            abbreviations = self.DEFAULT_ABBREVIATIONS
+        self._abbreviation_trie: dict = {}
+        self._max_abbreviation_length = 0
+        for abbreviation in abbreviations:
+            node = self._abbreviation_trie
+            for char in reversed(abbreviation.lower()):
+                node = node.setdefault(char, {})
+            node[self._TRIE_END] = {}
+            self._max_abbreviation_length = max(
+                self._max_abbreviation_length, len(abbreviation)
+            )
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop the buffered text and start over, e.g. for a new response."""
+        self._clear_buffer()
+        # nothing has been emitted in this response yet
+        self._first_pending = self.first_clause
+        self._tokens = 0
+        self.early_flush_time: float | None = None
+        self.first_sentence_time: float | None = None
+
+    def first_clause_saving(self) -> float | None:
+        """
+        How much earlier the first chunk was emitted thanks to the first clause early flush.
+
+        Returns:
+            float | None: The seconds between the early flush and the end of the first full sentence, or None if there was no early flush.
+        """
+        if self.early_flush_time is None or self.first_sentence_time is None:
+            return None
+        return self.first_sentence_time - self.early_flush_time
+
+    def _clear_buffer(self) -> None:
+        self._chars: List[str] = []
+        # end of the candidate sentence, 0 if there is none
+        self._pending = 0
+        # "run": still in the punctuation after the candidate end, "space": waiting for the next word
+        self._pending_state = ""
+        # the candidate only holds if the next word doesn't start with a lowercase letter
+        self._pending_case_check = False
+        # the candidate holds even without whitespace after it
+        self._pending_no_space = False
+        self._in_tag = False
+        self._tag_start = 0
+        self._soft_break = 0
+        # end of the first clause, waiting for a space after the comma
+        self._clause_end = 0
+
+    def feed(self, delta: str) -> List[str]:
+        """
+        Consume a chunk of streamed text.
+
+        Parameters:
+            delta (str): The new text.
+
+        Returns:
+            List[str]: The sentences completed by this chunk, in order. Usually empty or one sentence.
+        """
+        sentences = []
+        for char in delta:
+            self._push(char, sentences)
+
+        if self._first_pending and self.first_clause_max_tokens:
+            self._tokens += 1
+            if (
+                self._tokens >= self.first_clause_max_tokens
+                and not self._pending
+                and not self._in_tag
+                and self._soft_break >= self.first_clause_min_length
+            ):
+                # no clause break in sight, cut at the last space
+                self._early_flush(self._soft_break, sentences)
+        return sentences
+
+    def flush(self) -> str | None:
+        """
+        End of the stream: return whatever is left as the last sentence.
+
+        Returns:
+            str | None: The last sentence, or None if nothing but whitespace is left.
+        """
+        sentence = "".join(self._chars).strip()
+        self._clear_buffer()
+        self._sentence_complete()
+        return sentence or None
+
+    def _push(self, char: str, sentences: List[str]) -> None:
+        if self._clause_end:
+            if char.isspace():
+                self._early_flush(self._clause_end, sentences)
+            else:
+                # "1,000"
+                self._clause_end = 0
+
+        if self._pending:
+            if self._pending_state == "run":
+                if char in self.SENTENCE_END or char in self.CJK_SENTENCE_END or char in self.CLOSERS:
+                    # more punctuation, like "?!", "..." or a closing quote
+                    self._chars.append(char)
+                    self._pending = len(self._chars)
+                    if char != "." and char not in self.CLOSERS:
+                        self._pending_case_check = False
+                    return
+                if char.isspace() and self._pending_case_check:
+                    self._chars.append(char)
+                    self._pending_state = "space"
+                    return
+                if char.isspace():
+                    self._confirm(sentences)
+                elif self._pending_no_space:
+                    self._confirm(sentences)
+                else:
+                    # not followed by a space: "3.14", "U.S", "example.com"
+                    self._pending = 0
+            else:
+                if char.isspace():
+                    self._chars.append(char)
+                    return
+                if char.islower():
+                    # "... and then", "approx. three"
+                    self._pending = 0
+                else:
+                    self._confirm(sentences)
+
+        if not self._chars and char.isspace():
+            return
+        self._chars.append(char)
+
+        if self._in_tag:
+            if char == "]":
+                self._in_tag = False
+            elif len(self._chars) - self._tag_start > self.MAX_TAG_LENGTH:
+                # not an emotion tag after all
+                self._in_tag = False
+            return
+
+        if char == "[":
+            self._in_tag = True
+            self._tag_start = len(self._chars) - 1
+        elif char in self.SENTENCE_END:
+            if char != "." or not self._is_abbreviation():
+                self._start_pending(case_check=char == ".", no_space=False)
+        elif char in self.CJK_SENTENCE_END:
+            self._start_pending(case_check=char == "…", no_space=True)
+        elif char.isspace() or char in self.SOFT_BREAKS:
+            self._soft_break = len(self._chars)
+
+        if self._first_pending and len(self._chars) >= self.first_clause_min_length:
+            if char in self.CJK_CLAUSE_BREAKS:
+                self._early_flush(len(self._chars), sentences)
+            elif char in self.CLAUSE_BREAKS:
+                self._clause_end = len(self._chars)
+
+        if self.max_length and not self._pending and len(self._chars) >= self.max_length:
+            self._split_long_sentence(sentences)
+
+    def _start_pending(self, case_check: bool, no_space: bool) -> None:
+        self._pending = len(self._chars)
+        self._pending_state = "run"
+        self._pending_case_check = case_check
+        self._pending_no_space = no_space
+
+    def _confirm(self, sentences: List[str]) -> None:
+        """The candidate sentence end holds: emit the sentence (unless it's too short to stand alone)."""
+        sentence = "".join(self._chars[: self._pending]).strip()
+        self._pending = 0
+        if len(sentence) < self.min_length:
+            # keep it in the buffer and let it merge with the next sentence
+            self._soft_break = len(self._chars)
+            return
+        sentences.append(sentence)
+        self._chars = []
+        self._soft_break = 0
+        self._sentence_complete()
+
+    def _sentence_complete(self) -> None:
+        self._first_pending = False
+        if self.early_flush_time is not None and self.first_sentence_time is None:
+            self.first_sentence_time = time.monotonic()
+
+    def _early_flush(self, cut: int, sentences: List[str]) -> None:
+        """Emit the first clause of the response."""
+        self._first_pending = False
+        self._clause_end = 0
+        self.early_flush_time = time.monotonic()
+        self._split_at(cut, sentences)
+
+    def _split_long_sentence(self, sentences: List[str]) -> None:
+        self._split_at(
+            self._soft_break if self._soft_break > 0 else len(self._chars), sentences
+        )
+        self._sentence_complete()
+
+    def _split_at(self, cut: int, sentences: List[str]) -> None:
+        sentence = "".join(self._chars[:cut]).strip()
+        rest = self._chars[cut:]
+        while rest and rest[0].isspace():
+            rest.pop(0)
+        self._chars = rest
+        self._soft_break = 0
+        if sentence:
+            sentences.append(sentence)
+
+    def _is_abbreviation(self) -> bool:
+        """Check if the buffer ends with a known abbreviation, by walking back through the reversed trie."""
+        node = self._abbreviation_trie
+        index = len(self._chars) - 1
+        stop = max(-1, index - self._max_abbreviation_length)
+        while index > stop:
+            node = node.get(self._chars[index].lower())
+            if node is None:
+                return False
+            if self._TRIE_END in node and (
+                index == 0 or not self._chars[index - 1].isalpha()
+            ):
+                return True
+            index -= 1
+        return False
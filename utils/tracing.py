@@ -0,0 +1,222 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Callable, Dict, Iterator, List
+
+
+class Tracer:
+    """
+    Records the latency of the stages of each conversation turn as spans.
+    A span is a flat dict: the stage name, the session and turn ids, the wall-clock start (epoch seconds),
+    the duration in milliseconds and any extra attributes (sentence index, text length...).
+
+    Finished spans are handed to a background thread that appends them, one JSON object per line,
+    to a rotating file, so the threads of the conversation never wait for the disk.
+    Listeners are called synchronously with every span (e.g. to feed metrics) and must be cheap.
+
+    Attributes:
+        file_path (str | None): The JSONL file the spans are written to, or None to not write them.
+    """
+
+    def __init__(
+        self,
+        file_path: str | None = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        """
+        Initializes the tracer and starts the writer thread.
+
+        Parameters:
+            file_path (str, optional): The JSONL file to write the spans to. None to only call the listeners.
+            max_bytes (int): The file is rotated when it reaches this size.
+            backup_count (int): The number of rotated files to keep (`trace.jsonl.1`, `trace.jsonl.2`...).
+        """
+        self.file_path = file_path
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._turn_counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue | None = None
+        self._writer: QueueListener | None = None
+
+        if file_path:
+            directory = os.path.dirname(file_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(
+                file_path,
+                maxBytes=max_bytes,
+                backupCount=backup_count,
+                encoding="utf-8",
+                delay=True,
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._queue = queue.SimpleQueue()
+            self._writer = QueueListener(self._queue, handler)
+            self._writer.start()
+            atexit.register(self.close)
+
+    @property
+    def active(self) -> bool:
+        """Whether spans go anywhere. When not, spans are not even built."""
+        return self._queue is not None or bool(self._listeners)
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Call `listener` with every finished span."""
+        self._listeners.append(listener)
+
+    def start_turn(self, session_id: str) -> "Turn":
+        """
+        Start a new turn of a session. Turns are numbered from 1 within each session.
+
+        Parameters:
+            session_id (str): The id of the session.
+
+        Returns:
+            Turn: The handle to record the spans of the turn with.
+        """
+        with self._lock:
+            turn_id = self._turn_counters.get(session_id, 0) + 1
+            self._turn_counters[session_id] = turn_id
+        return Turn(self, session_id, turn_id)
+
+    def emit(self, span: Dict[str, Any]) -> None:
+        """Hand a finished span to the listeners and the writer thread."""
+        for listener in self._listeners:
+            try:
+                listener(span)
+            except Exception as e:
+                print(f"Error in trace listener: {e}")
+        if self._queue is not None:
+            self._queue.put(
+                logging.makeLogRecord({"msg": json.dumps(span, ensure_ascii=False)})
+            )
+
+    def close(self) -> None:
+        """Write out the queued spans and stop the writer thread."""
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
+            self._queue = None
+
+
+class Turn:
+    """
+    The spans of one conversation turn. Safe to use from several threads (the LLM, TTS workers, the audio consumer...).
+    Turn 0 of a session holds what happens outside of a conversation, like the welcome note.
+
+    Attributes:
+        session_id (str): The id of the session.
+        turn_id (int): The number of the turn within the session.
+    """
+
+    def __init__(self, tracer: Tracer, session_id: str, turn_id: int):
+        self.tracer = tracer
+        self.session_id = session_id
+        self.turn_id = turn_id
+
+    def record(self, name: str, start: float, end: float, **attributes) -> None:
+        """
+        Record a span that has already finished.
+
+        Parameters:
+            name (str): The name of the stage, like "asr" or "tts".
+            start (float): When the stage started, from `time.time()`.
+            end (float): When the stage ended, from `time.time()`.
+            **attributes: Extra fields of the span.
+        """
+        if not self.tracer.active:
+            return
+        span = {
+            "span": name,
+            "session_id": self.session_id,
+            "turn_id": self.turn_id,
+            "start": round(start, 6),
+            "duration_ms": round((end - start) * 1000, 3),
+        }
+        span.update(attributes)
+        self.tracer.emit(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Dict[str, Any]]:
+        """
+        Time the enclosed block as a span. The yielded dict can be filled with more attributes.
+        If the block raises, the span gets an `error` attribute with the exception type.
+
+        Parameters:
+            name (str): The name of the stage.
+            **attributes: Extra fields of the span.
+        """
+        start = time.time()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, start, time.time(), **attributes)
+
+    def trace_stream(
+        self,
+        name: str,
+        stream: Iterator[str],
+        start: float | None = None,
+        on_first_chunk: Callable[[float], None] | None = None,
+        handled_error: Callable[[], str | None] | None = None,
+    ) -> Iterator[str]:
+        """
+        Wrap a streamed response (like the lazy generator of `chat_iter`) and record two spans:
+        `<name>_ttft` until the first chunk arrives and `<name>` until the stream is exhausted (or closed).
+
+        Parameters:
+            name (str): The name of the stage.
+            stream (Iterator[str]): The stream to wrap.
+            start (float, optional): When the request was made, from `time.time()`. Defaults to the time of this call.
+            on_first_chunk (Callable[[float], None], optional): Called with the time to the first chunk, in seconds.
+            handled_error (Callable[[], str | None], optional): Called when the stream ends, for the error the stream
+                handled itself (e.g. answered with an error message), if any. It is recorded like a raised one.
+
+        Returns:
+            Iterator[str]: The same chunks.
+        """
+        # captured now, not when the (lazy) stream is first iterated
+        start = time.time() if start is None else start
+        return self._traced_stream(name, stream, start, on_first_chunk, handled_error)
+
+    def _traced_stream(
+        self,
+        name: str,
+        stream: Iterator[str],
+        start: float,
+        on_first_chunk: Callable[[float], None] | None,
+        handled_error: Callable[[], str | None] | None,
+    ) -> Iterator[str]:
+        first_chunk = True
+        chunks = 0
+        error = None
+        try:
+            for chunk in stream:
+                if first_chunk:
+                    first_chunk_time = time.time()
+                    self.record(f"{name}_ttft", start, first_chunk_time)
+                    if on_first_chunk is not None:
+                        on_first_chunk(first_chunk_time - start)
+                    first_chunk = False
+                chunks += 1
+                yield chunk
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            if error is None and handled_error is not None:
+                error = handled_error()
+            attributes = {"chunks": chunks}
+            if error is not None:
+                attributes["error"] = error
+            self.record(name, start, time.time(), **attributes)
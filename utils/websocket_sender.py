@@ -0,0 +1,218 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Callable
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+
+@dataclass
+class _OutboundMessage:
+    data: str | bytes
+    hold: float
+    cancellable: bool
+    generation: int
+    on_sent: Callable[[], None] | None = None
+
+
+class WebSocketSender:
+    """
+    An ordered, bounded outbound message queue for one websocket.
+    The queue is drained by a single task on the server's own event loop, so every message is sent in order
+    by the loop that owns the socket. Worker threads hand messages over with `asyncio.run_coroutine_threadsafe`
+    and block while the queue is full (backpressure).
+
+    A message can hold the queue for some time after it is sent (e.g. the duration of an audio clip), so the frontend
+    receives audio at playback speed. `cancel_pending` drops the queued cancellable messages and ends the current hold,
+    which is what happens on an `interrupt-signal`. A producer that sends several messages for one sentence reads
+    `generation` before the first one and passes it with every message, so the rest of the sentence is dropped too,
+    even the messages it queues after the interrupt.
+
+    Attributes:
+        websocket (WebSocket): The websocket to send to.
+        loop (asyncio.AbstractEventLoop): The event loop that owns the websocket.
+    """
+
+    def __init__(self, websocket: WebSocket, maxsize: int = 4):
+        """
+        Initializes the sender. Must be called from the event loop that owns the websocket.
+
+        Parameters:
+            websocket (WebSocket): The websocket to send to.
+            maxsize (int): The maximum number of queued messages before senders block.
+        """
+        self.websocket = websocket
+        self.loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[_OutboundMessage] = asyncio.Queue(maxsize)
+        self._interrupted = asyncio.Event()
+        self._generation = 0
+        self._closed = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start draining the queue."""
+        self._task = self.loop.create_task(self._drain())
+
+    async def stop(self) -> None:
+        """Stop draining and drop whatever is still queued."""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def generation(self) -> int:
+        """The number of `cancel_pending` calls so far. Cancellable messages of an older generation are dropped."""
+        return self._generation
+
+    def _message(self, data, hold, cancellable, on_sent, generation) -> _OutboundMessage:
+        if generation is None:
+            generation = self._generation
+        return _OutboundMessage(data, hold, cancellable, generation, on_sent)
+
+    async def send_text(
+        self,
+        text: str,
+        hold: float = 0.0,
+        cancellable: bool = False,
+        on_sent: Callable[[], None] | None = None,
+        generation: int | None = None,
+    ) -> None:
+        """
+        Queue a text message. Waits while the queue is full.
+
+        Parameters:
+            text (str): The message to send.
+            hold (float): Seconds to wait after sending before the next message is sent.
+            cancellable (bool): Whether `cancel_pending` may drop this message.
+            on_sent (Callable[[], None], optional): Called on the event loop once the message is sent (not if it is dropped).
+            generation (int, optional): The `generation` the message belongs to. Defaults to the current one.
+        """
+        if self._closed:
+            return
+        await self._queue.put(self._message(text, hold, cancellable, on_sent, generation))
+
+    async def send_json(
+        self,
+        data: dict,
+        hold: float = 0.0,
+        cancellable: bool = False,
+        on_sent: Callable[[], None] | None = None,
+        generation: int | None = None,
+    ) -> None:
+        """Queue a JSON message. See `send_text`."""
+        await self.send_text(
+            json.dumps(data),
+            hold=hold,
+            cancellable=cancellable,
+            on_sent=on_sent,
+            generation=generation,
+        )
+
+    async def send_bytes(
+        self,
+        data: bytes,
+        hold: float = 0.0,
+        cancellable: bool = False,
+        on_sent: Callable[[], None] | None = None,
+        generation: int | None = None,
+    ) -> None:
+        """Queue a binary message. See `send_text`."""
+        if self._closed:
+            return
+        await self._queue.put(self._message(data, hold, cancellable, on_sent, generation))
+
+    def send_text_threadsafe(
+        self,
+        text: str,
+        hold: float = 0.0,
+        cancellable: bool = True,
+        on_sent: Callable[[], None] | None = None,
+        generation: int | None = None,
+    ) -> None:
+        """
+        Queue a text message from a thread that doesn't run the event loop.
+        Blocks the calling thread while the queue is full.
+        A cancellable message of a `generation` that was already cancelled is dropped without being queued.
+        """
+        if self._closed or self._is_stale(cancellable, generation):
+            return
+        asyncio.run_coroutine_threadsafe(
+            self.send_text(
+                text,
+                hold=hold,
+                cancellable=cancellable,
+                on_sent=on_sent,
+                generation=generation,
+            ),
+            self.loop,
+        ).result()
+
+    def send_bytes_threadsafe(
+        self,
+        data: bytes,
+        hold: float = 0.0,
+        cancellable: bool = True,
+        on_sent: Callable[[], None] | None = None,
+        generation: int | None = None,
+    ) -> None:
+        """Queue a binary message from another thread. See `send_text_threadsafe`."""
+        if self._closed or self._is_stale(cancellable, generation):
+            return
+        asyncio.run_coroutine_threadsafe(
+            self.send_bytes(
+                data,
+                hold=hold,
+                cancellable=cancellable,
+                on_sent=on_sent,
+                generation=generation,
+            ),
+            self.loop,
+        ).result()
+
+    def _is_stale(self, cancellable: bool, generation: int | None) -> bool:
+        return cancellable and generation is not None and generation != self._generation
+
+    def cancel_pending(self) -> None:
+        """
+        Drop every queued cancellable message and end the current hold. Must be called on the event loop.
+        Messages queued after this call are sent normally, unless they carry the `generation` of before the call.
+        """
+        self._generation += 1
+        self._interrupted.set()
+
+    async def _drain(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                # once the socket is gone, keep draining so blocked senders are released
+                if self._closed:
+                    continue
+                if message.cancellable and message.generation != self._generation:
+                    continue
+                if isinstance(message.data, bytes):
+                    await self.websocket.send_bytes(message.data)
+                else:
+                    await self.websocket.send_text(message.data)
+                if message.on_sent is not None:
+                    message.on_sent()
+                if message.hold > 0 and message.generation == self._generation:
+                    self._interrupted.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._interrupted.wait(), timeout=message.hold
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+            except (WebSocketDisconnect, RuntimeError) as e:
+                print(f"Websocket closed, dropping outbound messages. {e}")
+                self._closed = True
+            finally:
+                self._queue.task_done()